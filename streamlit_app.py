@@ -1,14 +1,29 @@
+import time
+
+# 脚本开始执行的时刻，用于统计导入和首次渲染耗时
+SCRIPT_START = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
-import requests
 import traceback
-import base64
-from io import BytesIO
+from collections import OrderedDict
+import os
+import threading
+
+# 首屏只导入不依赖 pandas 的模块（界面常量都在 constants 中）。pandas、requests 以及各功能的计算模块
+# 在点击按钮或显示对应结果时才导入；scikit-learn、pyarrow 等可选依赖也由对应模块在用到时加载
+from trading_strategy.constants import (BUY_THRESHOLD, FIRST_BAR, LOCK_DAYS, METRIC_NAMES, MODELS,
+                                        PARAM_NAMES, ROLLING_WINDOWS, SELL_THRESHOLD, STRATEGY_LABELS,
+                                        STRATEGY_NAMES, available_models, param_range)
+from trading_strategy.downsample import MAX_POINTS, downsample
+from trading_strategy.export import EXPORT_FORMATS, available_formats, export_bundle, export_bytes
+from trading_strategy import perf
+from trading_strategy.sources import DATA_SOURCES, DEFAULT_ITEMS_FILE, load_sources
+from trading_strategy.store import DEFAULT_RESULT_DIR, KlineStore
+
+# 模块导入完成的时刻
+IMPORTS_DONE = time.perf_counter()
 
 # 设置页面配置
 st.set_page_config(
@@ -18,247 +33,82 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 数据源库
-DATA_SOURCES = {
-    "AK47 | 血腥运动": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553370749&platform=YOUPIN&specialStyle",
-    "蝴蝶刀": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=22779&platform=YOUPIN&specialStyle",
-    "流浪者匕首op": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553486392&platform=YOUPIN&specialStyle",
-    "树篱迷宫": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=525873303&platform=YOUPIN&specialStyle",
-    "水栽竹": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24283&platform=YOUPIN&specialStyle",
-    "怪兽在b": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315999843394654208&platform=YOUPIN&specialStyle",
-    "金刚犬": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315844312734502912&platform=YOUPIN&specialStyle",
-    "tyloo": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=925497374167523328&platform=YOUPIN&specialStyle",
-    "克拉考": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315936965627445248&platform=YOUPIN&specialStyle",
-    "迈阿密人士": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808805648347430912&platform=YOUPIN&specialStyle",
-    
-}
+# 本地K线存储，已下载的K线不再重复请求
+KLINE_STORE = KlineStore()
+# 全市场扫描前更新K线时下载的历史天数
+SCAN_SYNC_DAYS = 60
 
-# 新的get_kline函数，包含成交量数据
-def get_kline(url, start_date=None, end_date=None):
-    """爬取网站K线数据（包含成交量）"""
-    kline_ls = []
-    
-    # 处理时间范围
-    end_ts = int(datetime.now().timestamp()) if end_date is None else int(datetime.strptime(end_date, '%Y-%m-%d').timestamp())
-    start_ts = 0 if start_date is None else int(datetime.strptime(start_date, '%Y-%m-%d').timestamp())
-    
-    while True:
-        ts = int(datetime.now().timestamp() * 1000)
-        try:
-            # 构造请求URL
-            request_url = url.format(ts, end_ts)
-            response = requests.get(request_url)
-            data = response.json()['data']
-            
-            if len(data) == 0:
-                break
-                
-            kline_ls += data
-            end_ts = int(data[0][0]) - 86400  # 获取前一天的数据
-            
-            # 检查是否达到开始时间
-            if start_date and end_ts < start_ts:
-                break
-                
-        except Exception as e:
-            st.error(f"获取数据出错: {e}")
-            st.caption("可能的原因包括：网络问题、数据源链接不合法或数据源暂时不可用。")
-            st.caption("建议：检查网络连接，确认数据源链接正确性，或稍后重试。")
-            break
-    
-    if not kline_ls:
-        return pd.DataFrame(columns=['close', 'volume']).set_index('date')
-        
-    # 整理数据
-    kline_df = pd.DataFrame(kline_ls)[[0, 2, 5]]
-    kline_df.columns = ['date', 'close', 'volume']
-    kline_df['date'] = kline_df['date'].apply(lambda x: datetime.fromtimestamp(int(x)))
-    
-    # 应用时间范围筛选
-    if start_date or end_date:
-        mask = True
-        if start_date:
-            mask = mask & (kline_df['date'] >= datetime.strptime(start_date, '%Y-%m-%d'))
-        if end_date:
-            mask = mask & (kline_df['date'] <= datetime.strptime(end_date, '%Y-%m-%d'))
-        kline_df = kline_df[mask]
-    
-    return kline_df.set_index('date').sort_index()
-
-# 其他函数保持不变（t7_adjust, backtest, analyze_positions, get_risk）
-def t7_adjust(flag):
-    """t+7模式调整"""
-    for i in range(1, len(flag)):
-        if flag.iloc[i] > flag.iloc[i - 1]:
-            start = i
-        elif flag.iloc[i] < flag.iloc[i - 1] and i - start < 7:
-            flag.iloc[i] = 1
-    return flag
-
-def backtest(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
-    """回测函数，增加仓位记录和买卖信号"""
-    # 计算指标
-    ret = kline_df['close'].pct_change()
-    ma5 = kline_df['close'].rolling(5).mean()
-    ma10 = kline_df['close'].rolling(10).mean()
-    ma20 = kline_df['close'].rolling(20).mean()
-    ma30 = kline_df['close'].rolling(30).mean()
-    # 执行回测
-    pos = {}
-    ret_ls = []
-    
-    for i in range(19, len(kline_df)):
-        close = kline_df['close'].iloc[i]
-        bias = close / ma5.iloc[i] - 1
-        
-        # 计算价格跌幅
-        price_drop = 0
-        ma10_break = False
-        if i >= sell_days:
-            drop_cal = kline_df['close'].iloc[i-sell_days]
-            price_drop = close / drop_cal - 1
-            ma10_break = close < ma10.iloc[i]
-        
-        current_pos = sum(list(pos.values()))
-        buy = 0
-        sell = 0
-        sold_pos = 0
-        
-        # 买入逻辑
-        if ma5.iloc[i] > ma20.iloc[i] and close > ma10.iloc[i] and bias < bias_th:
-            if not pos:
-                pos[i] = 0.3
-                buy = 0.3
-            elif current_pos < 1:
-                pos[i] = 0.1
-                buy = 0.1
-        # 卖出逻辑
-        else:
-            # 清仓条件：3日跌幅超5%且跌破MA10
-            if i >= sell_days and price_drop < sell_drop_th and ma10_break:
-                sell_pos = current_pos  # 全额卖出
-                for k in list(pos.keys()):  # 清空所有持仓
-                    sold_pos += pos[k]
-                    del pos[k]
-            else:
-                # 保持原有止盈逻辑
-                sell_pos = current_pos * (1 - np.exp(-k0 * bias_th)) if bias >= bias_th else 0
-                for k in list(pos.keys()):
-                    if i - k >= 7:
-                        sold_pos += pos[k]
-                        del pos[k]
-                        if sold_pos >= sell_pos:
-                            break
-            
-            sell = sold_pos
-        
-        # 记录当日结果
-        ret_ls.append({
-            'date': kline_df.index[i],
-            'pos': current_pos + buy - sell,
-            'ret': (current_pos + buy - sell) * ret.iloc[i],
-            'buy': buy,
-            'sell': sell
-        })
+@st.cache_resource
+def get_result_cache():
+    """回测结果缓存，相同K线和参数的回测直接复用，在多次脚本重跑之间共享"""
+    from trading_strategy.result_cache import DEFAULT_CACHE_DIR, ResultCache
     
-    return pd.DataFrame(ret_ls).set_index('date')
+    return ResultCache(disk_dir=DEFAULT_CACHE_DIR)
+
+@st.cache_resource
+def get_kline_fetcher():
+    """带连接池的并发下载器，在多次脚本重跑之间共享"""
+    from trading_strategy.fetch import KlineFetcher
+    
+    return KlineFetcher(max_concurrency=4, timeout=10, retries=3, rate_limit=10)
+
+@st.cache_resource
+def get_startup_times():
+    """进程内第一次完整运行脚本的导入和渲染耗时（冷启动），在多次脚本重跑之间共享"""
+    return {}
+
+def cancel_button(label, name):
+    """显示取消按钮，返回保存在会话状态 name 中的取消事件
 
+    事件在每次开始计算时清除，点击按钮时由 on_click 置位并传给计算函数；
+    点击同时会触发脚本重跑，正在进行的计算在下一次进度回调时中断，未开始的任务被丢弃、不再等待。
+    """
+    if name not in st.session_state:
+        st.session_state[name] = threading.Event()
+    event = st.session_state[name]
+    event.clear()
+    st.button(label, on_click=event.set)
+    return event
 
-    """分析MA趋势及交叉，提供仓位建议"""
-    # 计算移动平均线
-    ma5 = kline_df['close'].rolling(5).mean()
-    ma10 = kline_df['close'].rolling(10).mean()
-    ma20 = kline_df['close'].rolling(20).mean()
-    ma30 = kline_df['close'].rolling(30).mean()
+def was_cancelled(name):
+    """上一次计算是否被取消按钮中断，返回 True 后清除事件"""
+    event = st.session_state.get(name)
+    if event is None or not event.is_set():
+        return False
+    event.clear()
+    return True
 
-    # 初始化信号列
-    kline_df['position_signal'] = 0  # 默认无信号
-    kline_df['signal_type'] = ''  # 信号类型描述
+def sync_klines(urls, start_ts, end_ts, store=KLINE_STORE, fetcher=None):
+    """并发下载本地存储中缺失的K线，出错时在页面上提示"""
+    from trading_strategy.fetch import sync_store
+    from trading_strategy.indicators import INDICATOR_CACHE
     
-    # 添加MA列到DataFrame
-    kline_df['ma5'] = ma5
-    kline_df['ma10'] = ma10
-    kline_df['ma20'] = ma20
-    kline_df['ma30'] = ma30
+    if fetcher is None:
+        fetcher = get_kline_fetcher()
+    errors = sync_store(store, fetcher, urls, start_ts, end_ts, on_update=INDICATOR_CACHE.invalidate)
+    for e in errors.values():
+        st.error(f"获取数据出错: {e}")
+        st.caption("可能的原因包括：网络问题、数据源链接不合法或数据源暂时不可用。")
+        st.caption("建议：检查网络连接，确认数据源链接正确性，或稍后重试。")
+
+# 新的get_kline函数，包含成交量数据
+def get_kline(url, start_date=None, end_date=None, store=KLINE_STORE, fetcher=None):
+    """爬取网站K线数据（包含成交量），已下载的部分直接从本地存储读取"""
+    from trading_strategy.data import load_kline, parse_date_range
+    
+    start_ts, end_ts = parse_date_range(start_date, end_date)
+    # 只请求本地存储中缺失的区间
+    sync_klines([url], start_ts, end_ts, store, fetcher)
+    return load_kline(store, url, start_ts, end_ts)
+
+def get_klines(sources, start_date=None, end_date=None, store=KLINE_STORE, fetcher=None):
+    """同时获取多个数据源的K线，sources 为 {名称: url}，返回 {名称: K线DataFrame}"""
+    from trading_strategy.data import load_kline, parse_date_range
+    
+    start_ts, end_ts = parse_date_range(start_date, end_date)
+    sync_klines(list(sources.values()), start_ts, end_ts, store, fetcher)
+    return {name: load_kline(store, url, start_ts, end_ts) for name, url in sources.items()}
 
-    # 判断MA30趋势和交叉信号
-    for i in range(1, len(kline_df)):
-        # 判断MA30趋势
-        ma30_trend_up = kline_df['ma30'].iloc[i] > kline_df['ma30'].iloc[i - 1]
-        
-        if ma30_trend_up:
-            # 判断MA5与MA10的交叉
-            ma5_cross_ma10 = (ma5.iloc[i] > ma10.iloc[i]) and (ma5.iloc[i - 1] <= ma10.iloc[i - 1])
-            
-            # 判断MA5与MA20的交叉
-            ma5_cross_ma20 = (ma5.iloc[i] > ma20.iloc[i]) and (ma5.iloc[i - 1] <= ma20.iloc[i - 1])
-            
-            # 设置信号
-            if ma5_cross_ma20:
-                kline_df.iloc[i, kline_df.columns.get_loc('position_signal')] = 4  # 买入4仓
-                kline_df.iloc[i, kline_df.columns.get_loc('signal_type')] = 'MA5上穿MA20，建议买入4仓'
-            elif ma5_cross_ma10:
-                kline_df.iloc[i, kline_df.columns.get_loc('position_signal')] = 2  # 买入2仓
-                kline_df.iloc[i, kline_df.columns.get_loc('signal_type')] = 'MA5上穿MA10，建议买入2仓'
-                
-    return kline_df
-
-def analyze_positions(kline_df):
-    """分析MA趋势及交叉，提供仓位建议"""
-    # 计算移动平均线
-    ma5 = kline_df['close'].rolling(5).mean()
-    ma10 = kline_df['close'].rolling(10).mean()
-    ma20 = kline_df['close'].rolling(20).mean()
-    ma30 = kline_df['close'].rolling(30).mean()
-
-    # 初始化信号列
-    kline_df['position_signal'] = 0  # 默认无信号
-    kline_df['signal_type'] = ''  # 信号类型描述
-    
-    # 添加MA列到DataFrame
-    kline_df['ma5'] = ma5
-    kline_df['ma10'] = ma10
-    kline_df['ma20'] = ma20
-    kline_df['ma30'] = ma30
-
-    # 判断MA30趋势和交叉信号
-    for i in range(1, len(kline_df)):
-        # 判断MA30趋势
-        ma30_trend_up = kline_df['ma30'].iloc[i] > kline_df['ma30'].iloc[i - 1]
-        
-        if ma30_trend_up:
-            # 判断MA5与MA10的交叉
-            ma5_cross_ma10 = (ma5.iloc[i] > ma10.iloc[i]) and (ma5.iloc[i - 1] <= ma10.iloc[i - 1])
-            
-            # 判断MA5与MA20的交叉
-            ma5_cross_ma20 = (ma5.iloc[i] > ma20.iloc[i]) and (ma5.iloc[i - 1] <= ma20.iloc[i - 1])
-            
-            # 设置信号
-            if ma5_cross_ma20:
-                kline_df.iloc[i, kline_df.columns.get_loc('position_signal')] = 4  # 买入4仓
-                kline_df.iloc[i, kline_df.columns.get_loc('signal_type')] = 'MA5上穿MA20，建议买入4仓'
-            elif ma5_cross_ma10:
-                kline_df.iloc[i, kline_df.columns.get_loc('position_signal')] = 2  # 买入2仓
-                kline_df.iloc[i, kline_df.columns.get_loc('signal_type')] = 'MA5上穿MA10，建议买入2仓'
-                
-    return kline_df
-
-def get_risk(df, num=365):
-    """计算策略收益情况"""
-    value_df = (1 + df).cumprod()
-    annual_ret = value_df.iloc[-1] ** (num / len(df)) - 1
-    vol = df.std() * np.sqrt(num)
-    sharpe = annual_ret / vol
-    max_dd = (1 - value_df / value_df.cummax()).max()
-    calmar = annual_ret / max_dd
-    return {
-        '总收益率': (value_df.iloc[-1] - 1).tolist(),
-        '年化收益': annual_ret.tolist(),
-        '波动率': vol.tolist(),
-        'Sharpe': sharpe.tolist(),
-        '最大回撤': max_dd.tolist(),
-        'Calmar': calmar.tolist()
-    }
 # 自定义CSS样式
 st.markdown("""
 <style>
@@ -293,6 +143,18 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def range_input(label, start, stop, step, fmt):
+    """侧边栏中输入参数取值范围（起始、结束、步长）"""
+    st.markdown(f'<p class="param-title">{label}</p>', unsafe_allow_html=True)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        start = st.number_input("起始", value=start, step=step, format=fmt, key=f"{label}_start")
+    with col2:
+        stop = st.number_input("结束", value=stop, step=step, format=fmt, key=f"{label}_stop")
+    with col3:
+        step = st.number_input("步长", value=step, step=step, format=fmt, key=f"{label}_step")
+    return param_range(start, stop, step)
+
 # 应用标题
 st.markdown('<h1 class="main-header">交易策略回测</h1>', unsafe_allow_html=True)
 
@@ -342,247 +204,709 @@ with st.sidebar:
                                   step=0.01, 
                                   format="%.2f")
     
+    t_plus_enabled = st.checkbox("T+N 交易锁定", value=False,
+                                 help="买入满 N 天后才能卖出：基本策略至少持有 N 天，拓展策略的止盈和清仓只卖出满 N 天的仓位")
+    t_plus = int(st.number_input("锁定天数 N", value=LOCK_DAYS, min_value=1, step=1)) if t_plus_enabled else None
+    
+    engine = st.selectbox("回测引擎",
+                          options=['fast', 'legacy'],
+                          format_func=lambda x: '向量化引擎' if x == 'fast' else '逐行回测（旧）')
+    
     # 显示设置
     st.subheader("显示设置")
     show_benchmark = st.checkbox("大盘走势", value=True)
     show_basic = st.checkbox("5/20基本策略", value=True)
     show_extended = st.checkbox("5/20拓展策略", value=True)
+    show_rolling = st.checkbox("显示滚动指标", value=True)
     show_position_signals = st.checkbox("显示仓位建议信号", value=True)
     show_volume = st.checkbox("显示成交量", value=True)  # 新增成交量显示选项
+    chart_mode = st.selectbox("图表渲染",
+                              options=['auto', 'full'],
+                              format_func=lambda x: '自适应（WebGL+降采样）' if x == 'auto' else '完整（逐点绘制）',
+                              help=f"自适应模式下，显示区间内超过 {MAX_POINTS} 个点的曲线会降采样并用 WebGL 绘制")
+    export_format = st.selectbox("导出格式",
+                                 options=available_formats(),
+                                 format_func=lambda x: EXPORT_FORMATS[x][0],
+                                 help="Parquet 和 Arrow IPC 保留列类型并压缩，需要安装 pyarrow")
     
     # 运行按钮
+    profile_run = st.checkbox("记录 cProfile 性能分析", value=False)
     run_button = st.button("运行回测", use_container_width=True)
+    
+    # 参数扫描
+    with st.expander("参数扫描"):
+        k_range = range_input("止盈参数 k", 4.0, 9.0, 0.5, "%.1f")
+        bias_range = range_input("止盈阈值", 0.03, 0.11, 0.01, "%.2f")
+        sell_days_range = range_input("止损天数", 2, 5, 1, "%d")
+        sell_drop_range = range_input("止损阈值", -0.09, -0.03, 0.01, "%.2f")
+        sweep_workers = st.number_input("进程数", value=os.cpu_count() or 1, min_value=1, step=1)
+        st.caption(f"共 {len(k_range) * len(bias_range) * len(sell_days_range) * len(sell_drop_range)} 组参数")
+        sweep_button = st.button("运行参数扫描", use_container_width=True)
+    
+    # 滚动优化
+    with st.expander("滚动优化"):
+        st.caption("参数取值范围与“参数扫描”相同")
+        col1, col2 = st.columns(2)
+        with col1:
+            train_days = st.number_input("训练窗口(天)", value=365, min_value=FIRST_BAR + 1, step=30)
+        with col2:
+            test_days = st.number_input("测试窗口(天)", value=90, min_value=1, step=30)
+        wf_objective = st.selectbox("优化目标", METRIC_NAMES, index=METRIC_NAMES.index('Sharpe'))
+        walkforward_button = st.button("运行滚动优化", use_container_width=True)
+    
+    # 稳健性检验
+    with st.expander("稳健性检验"):
+        st.caption("对日收益做块自助重采样，在全部模拟路径上执行策略")
+        col1, col2 = st.columns(2)
+        with col1:
+            mc_paths = st.number_input("模拟路径数", value=1000, min_value=10, step=500)
+            mc_noise = st.number_input("进出场扰动", value=0.0, min_value=0.0, step=0.005, format="%.3f")
+        with col2:
+            mc_block = st.number_input("块长度(天)", value=20, min_value=1, step=5)
+            mc_confidence = st.number_input("置信水平", value=0.95, min_value=0.5, max_value=0.99, step=0.01, format="%.2f")
+        montecarlo_button = st.button("运行稳健性检验", use_container_width=True)
+    
+    # 机器学习策略
+    with st.expander("机器学习策略"):
+        ml_models = available_models()
+        if ml_models:
+            ml_model = st.selectbox("模型", ml_models, format_func=lambda x: MODELS[x])
+            col1, col2 = st.columns(2)
+            with col1:
+                ml_train_days = st.number_input("训练窗口(天)", value=365, min_value=FIRST_BAR + 1, step=30, key="ml_train_days")
+            with col2:
+                ml_test_days = st.number_input("重新训练间隔(天)", value=90, min_value=1, step=30, key="ml_test_days")
+            st.caption(f"次日上涨概率 ≥ {BUY_THRESHOLD:.0%} 时买入，≤ {SELL_THRESHOLD:.0%} 时清仓，仓位管理与拓展策略相同")
+        else:
+            st.caption("需要安装 scikit-learn")
+        ml_button = st.button("运行机器学习策略", use_container_width=True, disabled=not ml_models)
+    
+    # 组合回测
+    with st.expander("组合回测"):
+        portfolio_assets = st.multiselect("组合资产", options=list(DATA_SOURCES.keys()),
+                                          default=list(DATA_SOURCES.keys()))
+        # 每个资产一个数字输入框，首屏不需要为表格编辑器加载 pandas
+        portfolio_weights = {
+            name: st.number_input(f"{name} 资金权重", value=1.0, min_value=0.0, step=0.1, key=f"weight_{name}")
+            for name in portfolio_assets
+        }
+        portfolio_button = st.button("运行组合回测", use_container_width=True)
+    
+    # 全市场扫描
+    with st.expander("全市场扫描"):
+        scan_items_file = st.text_input("饰品清单文件", value=DEFAULT_ITEMS_FILE,
+                                        help="JSON 文件 {名称: 接口地址或饰品编号}，文件不存在时扫描内置数据源")
+        scan_sync = st.checkbox("扫描前更新K线", value=False, help=f"下载最近 {SCAN_SYNC_DAYS} 天缺失的K线")
+        scan_button = st.button("运行扫描", use_container_width=True)
 
 # 初始化会话状态
-if 'result_data' not in st.session_state:
-    st.session_state.result_data = None
-if 'kline_data' not in st.session_state:
-    st.session_state.kline_data = None
-if 'bt_df' not in st.session_state:
-    st.session_state.bt_df = None
-if 'metrics' not in st.session_state:
-    st.session_state.metrics = None
-if 'position_df' not in st.session_state:
-    st.session_state.position_df = None
+# result 为当前显示的回测结果：结果缓存中的条目加上K线、数据源和缓存键
+if 'result' not in st.session_state:
+    st.session_state.result = None
+if 'charts' not in st.session_state:
+    st.session_state.charts = OrderedDict()
+if 'sweep_result' not in st.session_state:
+    st.session_state.sweep_result = None
+if 'portfolio_result' not in st.session_state:
+    st.session_state.portfolio_result = None
+if 'walkforward_result' not in st.session_state:
+    st.session_state.walkforward_result = None
+if 'montecarlo_result' not in st.session_state:
+    st.session_state.montecarlo_result = None
+if 'scan_result' not in st.session_state:
+    st.session_state.scan_result = None
+if 'ml_result' not in st.session_state:
+    st.session_state.ml_result = None
+if 'perf_recorder' not in st.session_state:
+    st.session_state.perf_recorder = None
+
+def record_figure(name, start):
+    """把图表构建耗时记入本次回测的性能统计"""
+    recorder = st.session_state.perf_recorder
+    if recorder is not None:
+        recorder.add_span('figure', start, time.perf_counter() - start, {'figure': name})
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def export_file(df, fmt):
+    """生成导出文件，按表内容和格式缓存，重跑脚本时不重新生成"""
+    return export_bytes(df, fmt)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_zip(tables, fmt):
+    """把多张表打包为 zip，同样按内容和格式缓存"""
+    return export_bundle(tables, fmt)
+
+def export_button(label, df, name, key=None):
+    """按侧边栏选择的格式下载一张表"""
+    _, ext, mime = EXPORT_FORMATS[export_format]
+    st.download_button(label=label, data=export_file(df, export_format), file_name=name + ext, mime=mime, key=key)
+
+# 最多缓存的曲线数据和图表数（所有回测结果合计）
+CHART_CACHE_SIZE = 128
+
+def chart_cached(key, build):
+    """图表缓存：同一份回测结果、同一组显示选项下的曲线和图表只构建一次，切换回之前的结果时也可以复用"""
+    cache = st.session_state.charts
+    key = (st.session_state.result['key'],) + key
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = cache[key] = build()
+    while len(cache) > CHART_CACHE_SIZE:
+        cache.popitem(last=False)
+    return value
+
+def chart_points(key, series, view, method):
+    """显示区间内的 (日期, 数值)，method 为 None 时不降采样"""
+    def build():
+        data = series.loc[view[0]:view[1]]
+        if method is None:
+            return data.index, data.to_numpy()
+        return downsample(data, MAX_POINTS, method)
+    return chart_cached(('points', key, view, method), build)
+
+def line_trace(key, series, view, adaptive, **kwargs):
+    """折线：自适应模式下做 LTTB 降采样，用 WebGL 绘制"""
+    x, y = chart_points(key, series, view, 'lttb' if adaptive else None)
+    return (go.Scattergl if adaptive else go.Scatter)(x=x, y=y, mode='lines', **kwargs)
+
+def bar_trace(key, series, view, adaptive, color, **kwargs):
+    """柱状图：自适应模式下每个桶保留最小和最大值，画成 WebGL 阶梯面积图"""
+    x, y = chart_points(key, series, view, 'minmax' if adaptive else None)
+    if adaptive:
+        return go.Scattergl(x=x, y=y, mode='lines', fill='tozeroy', fillcolor=color,
+                            line=dict(color=color, width=1, shape='hv'), **kwargs)
+    return go.Bar(x=x, y=y, marker_color=color, **kwargs)
 
 # 运行回测
 if run_button:
     try:
-        st.markdown('<h2 class="sub-header">回测进度</h2>', unsafe_allow_html=True)
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        # 记录各阶段耗时，结果显示在“性能统计”中
+        with perf.recording(profile=profile_run) as recorder:
+            st.session_state.perf_recorder = recorder
+            st.markdown('<h2 class="sub-header">回测进度</h2>', unsafe_allow_html=True)
+            progress_bar = st.progress(0)
+            status_text = st.empty()
         
-        # 获取数据URL
-        data_url = DATA_SOURCES.get(data_source, "")
-        if not data_url:
-            st.error("数据URL不能为空")
-            st.stop()
+            # 获取数据URL
+            data_url = DATA_SOURCES.get(data_source, "")
+            if not data_url:
+                st.error("数据URL不能为空")
+                st.stop()
         
-        # 转换日期为字符串格式
-        start_date_str = start_date.strftime('%Y-%m-%d')
-        end_date_str = end_date.strftime('%Y-%m-%d')
+            # 转换日期为字符串格式
+            start_date_str = start_date.strftime('%Y-%m-%d')
+            end_date_str = end_date.strftime('%Y-%m-%d')
         
-        # 获取K线数据
-        status_text.text("正在获取K线数据...（可能需要一些时间）")
-        progress_bar.progress(10)
+            # 获取K线数据
+            status_text.text("正在获取K线数据...（可能需要一些时间）")
+            progress_bar.progress(10)
         
-        kline_df = get_kline(data_url, start_date_str, end_date_str)
-        st.session_state.kline_data = kline_df
+            kline_df = get_kline(data_url, start_date_str, end_date_str)
         
-        if kline_df.empty:
-            st.error("指定时间范围内没有K线数据，请调整日期范围")
-            st.caption("可能的原因包括：数据源无数据、网络问题或数据源链接不合法。")
-            st.stop()
+            if kline_df.empty:
+                st.error("指定时间范围内没有K线数据，请调整日期范围")
+                st.caption("可能的原因包括：数据源无数据、网络问题或数据源链接不合法。")
+                st.stop()
         
-        status_text.text(f"已获取 {len(kline_df)} 条数据记录，包含价格和成交量数据")
-        progress_bar.progress(40)
+            status_text.text(f"已获取 {len(kline_df)} 条数据记录，包含价格和成交量数据")
+            progress_bar.progress(40)
         
-        # 计算指标
-        status_text.text("计算技术指标...")
-        progress_bar.progress(50)
+            # 策略计算：大盘走势、5/20基本策略、5/20拓展策略（仓位管理）、仓位建议和绩效指标
+            # 相同K线和参数的结果直接从缓存中读取
+            status_text.text("执行策略回测...")
+            progress_bar.progress(60)
         
-        ret = kline_df['close'].pct_change()
-        ma5 = kline_df['close'].rolling(5).mean()
-        ma10 = kline_df['close'].rolling(10).mean()
-        ma20 = kline_df['close'].rolling(20).mean()
+            result_key, result, cache_hit = get_result_cache().get_or_compute(
+                kline_df, k_value, bias_threshold, sell_days, sell_drop_th, engine, t_plus=t_plus
+            )
+            st.session_state.result = dict(result, kline=kline_df, source=data_source, key=result_key)
         
-        # 策略计算
-        status_text.text("执行策略回测...")
-        progress_bar.progress(60)
+            progress_bar.progress(100)
+            status_text.text("回测完成！")
         
-        ret_map = {
-            'benchmark': ret  # 大盘走势
-        }
+            # 显示成功消息
+            st.markdown(f"""
+            <div class="success-box">
+                <h3>回测完成</h3>
+                <p>数据源: {data_source}</p>
+                <p>参数: K={k_value}, 阈值={bias_threshold}, 止损天数={sell_days}, 止损阈值={sell_drop_th}{f', T+{t_plus}' if t_plus else ''}</p>
+                <p>数据范围: {start_date_str} 至 {end_date_str}, 共 {len(kline_df)} 条记录</p>
+                {'<p>结果来自缓存</p>' if cache_hit else ''}
+            </div>
+            """, unsafe_allow_html=True)
         
-        # ma5/20策略
-        flag = ((ma5 > ma20) & (kline_df['close'] > ma10)).apply(int).shift()
-        # flag = t7_adjust(flag)  # 如果需要调整T+7逻辑，可以取消注释
-        ret_map['basic'] = ret * flag  # 5/20基本策略
+    except Exception as e:
+        st.error(f"回测过程出错: {str(e)}")
+        st.caption("可能的原因包括：网络问题、数据源链接不合法或数据格式变化。")
+        st.caption("建议：检查网络连接，确认数据源链接正确性，或稍后重试。")
+        st.text(traceback.format_exc())
+
+# 运行参数扫描
+if was_cancelled('sweep_cancel'):
+    st.info("参数扫描已取消")
+if sweep_button:
+    from trading_strategy.sweep import param_grid, run_sweep
+    
+    try:
+        st.markdown('<h2 class="sub-header">参数扫描进度</h2>', unsafe_allow_html=True)
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        sweep_cancel = cancel_button("取消扫描", 'sweep_cancel')
         
-        # ma5/20策略（仓位管理）
-        bt_df = backtest(kline_df, k_value, bias_threshold, sell_days, sell_drop_th)
-        ret_map['extended'] = bt_df['ret']  # 5/20拓展策略
-        st.session_state.bt_df = bt_df
+        status_text.text("正在获取K线数据...")
+        kline_df = get_kline(DATA_SOURCES[data_source], start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        if len(kline_df) <= 20:
+            st.error("指定时间范围内K线数据不足，请调整日期范围")
+            st.stop()
         
-        # 分析仓位信号
-        status_text.text("正在分析仓位建议...")
-        position_df = analyze_positions(kline_df.copy())
-        st.session_state.position_df = position_df
-
-        # 转换为DataFrame
-        ret_df = pd.DataFrame(ret_map)
+        grid = param_grid(k_range, bias_range, sell_days_range, sell_drop_range)
         
-        # 计算风险/收益指标
-        status_text.text("计算绩效指标...")
-        progress_bar.progress(80)
+        def report_progress(done, total):
+            progress_bar.progress(done / total)
+            status_text.text(f"已完成 {done}/{total} 组参数")
         
-        risk_metrics = get_risk(ret_df)
-        st.session_state.metrics = risk_metrics
+        sweep_df = run_sweep(kline_df, grid, max_workers=int(sweep_workers), progress=report_progress,
+                             cancel=sweep_cancel)
+        st.session_state.sweep_result = {'table': sweep_df, 'source': data_source}
+        status_text.text(f"参数扫描完成，共 {len(sweep_df)} 组参数")
+        
+    except Exception as e:
+        st.error(f"参数扫描出错: {str(e)}")
+        st.text(traceback.format_exc())
+
+# 显示参数扫描结果
+if st.session_state.sweep_result is not None:
+    st.markdown('<h2 class="sub-header">参数扫描结果</h2>', unsafe_allow_html=True)
+    sweep_df = st.session_state.sweep_result['table']
+    st.caption(f"数据源: {st.session_state.sweep_result['source']}，共 {len(sweep_df)} 组参数")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        x_param = st.selectbox("横轴参数", PARAM_NAMES, index=0)
+    with col2:
+        y_param = st.selectbox("纵轴参数", PARAM_NAMES, index=1)
+    
+    if x_param != y_param:
+        # 其余参数取最优值
+        col1, col2 = st.columns(2)
+        for col, metric in ((col1, 'Sharpe'), (col2, 'Calmar')):
+            heat_df = sweep_df.pivot_table(index=y_param, columns=x_param, values=metric, aggfunc='max')
+            fig_heat = go.Figure(go.Heatmap(
+                z=heat_df.values,
+                x=heat_df.columns.astype(str),
+                y=heat_df.index.astype(str),
+                colorscale='RdYlGn',
+                colorbar=dict(title=metric)
+            ))
+            fig_heat.update_layout(
+                title=f"{metric}（其余参数取最优）",
+                xaxis_title=x_param,
+                yaxis_title=y_param,
+                template='plotly_white',
+                height=450
+            )
+            with col:
+                st.plotly_chart(fig_heat, use_container_width=True)
+    else:
+        st.info("📌 横轴与纵轴请选择不同的参数")
+    
+    st.dataframe(sweep_df.sort_values('Sharpe', ascending=False), height=300)
+    export_button("下载参数扫描结果", sweep_df, 'sweep_results', key='export_sweep')
+
+# 运行滚动优化
+if was_cancelled('walkforward_cancel'):
+    st.info("滚动优化已取消")
+if walkforward_button:
+    from trading_strategy.sweep import param_grid
+    from trading_strategy.walkforward import walk_forward
+    
+    try:
+        st.markdown('<h2 class="sub-header">滚动优化进度</h2>', unsafe_allow_html=True)
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        walkforward_cancel = cancel_button("取消滚动优化", 'walkforward_cancel')
         
-        # 累积收益
-        value_df = (ret_df + 1).cumprod() - 1
+        status_text.text("正在获取K线数据...")
+        kline_df = get_kline(DATA_SOURCES[data_source], start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        if len(kline_df) <= train_days:
+            st.error(f"K线数据不足：共 {len(kline_df)} 条，训练窗口需要 {int(train_days)} 条以上，请调整日期范围")
+            st.stop()
         
-        # 保存结果
-        st.session_state.result_data = {
-            'returns': ret_df,
-            'cumulative': value_df,
-            'metrics': risk_metrics,
-            'source': data_source
-        }
+        grid = param_grid(k_range, bias_range, sell_days_range, sell_drop_range)
         
-        progress_bar.progress(100)
-        status_text.text("回测完成！")
-        
-        # 显示成功消息
-        st.markdown(f"""
-        <div class="success-box">
-            <h3>回测完成</h3>
-            <p>数据源: {data_source}</p>
-            <p>参数: K={k_value}, 阈值={bias_threshold}, 止损天数={sell_days}, 止损阈值={sell_drop_th}</p>
-            <p>数据范围: {start_date_str} 至 {end_date_str}, 共 {len(kline_df)} 条记录</p>
-        </div>
-        """, unsafe_allow_html=True)
+        def report_window(done, total):
+            progress_bar.progress(done / total)
+            status_text.text(f"已完成 {done}/{total} 个窗口")
+        
+        st.session_state.walkforward_result = dict(
+            walk_forward(kline_df, grid, int(train_days), int(test_days), objective=wf_objective,
+                         max_workers=int(sweep_workers), progress=report_window, cancel=walkforward_cancel),
+            source=data_source, objective=wf_objective
+        )
+        status_text.text(f"滚动优化完成，共 {len(st.session_state.walkforward_result['windows'])} 个窗口")
         
     except Exception as e:
-        st.error(f"回测过程出错: {str(e)}")
-        st.caption("可能的原因包括：网络问题、数据源链接不合法或数据格式变化。")
-        st.caption("建议：检查网络连接，确认数据源链接正确性，或稍后重试。")
+        st.error(f"滚动优化出错: {str(e)}")
         st.text(traceback.format_exc())
 
-# 显示结果
-if st.session_state.result_data is not None:
-    # 显示图表
-    st.markdown('<h2 class="sub-header">回测结果图表</h2>', unsafe_allow_html=True)
+# 显示滚动优化结果
+if st.session_state.walkforward_result is not None:
+    import pandas as pd
     
-    # 使用Plotly创建交互式图表
-    cum_returns = st.session_state.result_data['cumulative']
-    bt_df = st.session_state.bt_df
-    
-    fig = make_subplots(
-        rows=4 if show_volume else 3, cols=1, 
-        shared_xaxes=True,
-        vertical_spacing=0.05,
-        subplot_titles=('策略累积收益', '总仓位分布', '买卖明细') + ('成交量',) if show_volume else (),
-        row_heights=[0.4, 0.2, 0.2, 0.2] if show_volume else [0.4, 0.2, 0.2]
-    )
+    st.markdown('<h2 class="sub-header">滚动优化结果（样本外）</h2>', unsafe_allow_html=True)
+    walkforward = st.session_state.walkforward_result
+    st.caption(f"数据源: {walkforward['source']}，优化目标: {walkforward['objective']}，"
+               f"每个测试窗口使用前一训练窗口选出的参数，从空仓开始")
     
-    # 第一个子图：累积收益率
-    if show_benchmark:
-        fig.add_trace(
-            go.Scatter(
-                x=cum_returns.index, 
-                y=cum_returns['benchmark'],
+    if walkforward['metrics'] is not None:
+        cum_oos = (walkforward['returns'] + 1).cumprod() - 1
+        fig_oos = go.Figure()
+        for name, label, color in (('benchmark', '大盘走势', '#4E79A7'), ('extended', '5/20拓展策略（样本外）', '#59A14F')):
+            fig_oos.add_trace(go.Scatter(
+                x=cum_oos.index,
+                y=cum_oos[name],
                 mode='lines',
-                name='大盘走势',
-                line=dict(color='#4E79A7', width=2)
-            ),
-            row=1, col=1
+                name=label,
+                line=dict(color=color, width=2)
+            ))
+        fig_oos.update_layout(
+            title='样本外累积收益',
+            height=450,
+            template='plotly_white',
+            hovermode="x unified"
         )
+        fig_oos.update_yaxes(tickformat='.1%')
+        st.plotly_chart(fig_oos, use_container_width=True)
+        
+        st.subheader("样本外绩效指标")
+        st.dataframe(pd.DataFrame(walkforward['metrics'], index=['大盘走势', '5/20拓展策略']).style.format('{:.2%}'))
     
-    if show_basic:
-        fig.add_trace(
-            go.Scatter(
-                x=cum_returns.index, 
-                y=cum_returns['basic'],
-                mode='lines',
-                name='5/20基本策略',
-                line=dict(color='#F28E2B', width=2)
-            ),
-            row=1, col=1
-        )
+    st.subheader("各窗口最优参数")
+    window_table = walkforward['windows'].copy()
+    for col in ('训练开始', '训练结束', '测试开始', '测试结束'):
+        window_table[col] = window_table[col].dt.strftime('%Y-%m-%d')
+    st.dataframe(window_table, hide_index=True, height=300)
+
+# 运行机器学习策略
+if ml_button:
+    from trading_strategy.ml import ml_backtest
     
-    if show_extended:
-        fig.add_trace(
-            go.Scatter(
-                x=cum_returns.index, 
-                y=cum_returns['extended'],
-                mode='lines',
-                name='5/20拓展策略',
-                line=dict(color='#59A14F', width=2)
-            ),
-            row=1, col=1
+    try:
+        st.markdown('<h2 class="sub-header">机器学习策略进度</h2>', unsafe_allow_html=True)
+        status_text = st.empty()
+        
+        status_text.text("正在获取K线数据...")
+        kline_df = get_kline(DATA_SOURCES[data_source], start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        if len(kline_df) <= ml_train_days:
+            st.error(f"K线数据不足：共 {len(kline_df)} 条，训练窗口需要 {int(ml_train_days)} 条以上，请调整日期范围")
+            st.stop()
+        
+        status_text.text(f"滚动训练{MODELS[ml_model]}模型...")
+        ml_bt = ml_backtest(kline_df, ml_model, int(ml_train_days), int(ml_test_days), t_plus=t_plus)
+        _, base, _ = get_result_cache().get_or_compute(
+            kline_df, k_value, bias_threshold, sell_days, sell_drop_th, engine, t_plus=t_plus
         )
+        ml_returns = base['returns'][['benchmark', 'extended']].copy()
+        ml_returns['ml'] = ml_bt['ret']
+        st.session_state.ml_result = {'returns': ml_returns, 'backtest': ml_bt, 'model': ml_model,
+                                      'source': data_source}
+        status_text.text("机器学习策略回测完成")
+        
+    except Exception as e:
+        st.error(f"机器学习策略出错: {str(e)}")
+        st.text(traceback.format_exc())
+
+# 显示机器学习策略结果
+if st.session_state.ml_result is not None:
+    from trading_strategy.risk import risk_matrix
     
-    # 第二个子图：仓位分布
-    fig.add_trace(
-        go.Bar(
-            x=bt_df.index,
-            y=bt_df['pos'],
-            name='持仓',
-            marker_color='steelblue'
-        ),
-        row=2, col=1
-    )
+    st.markdown('<h2 class="sub-header">机器学习策略结果</h2>', unsafe_allow_html=True)
+    ml_result = st.session_state.ml_result
+    st.caption(f"数据源: {ml_result['source']}，模型: {MODELS[ml_result['model']]}，"
+               f"第一个训练窗口之后的每天按前一天收盘后的预测交易")
+    ml_labels = {'benchmark': '大盘走势', 'extended': '5/20拓展策略', 'ml': f"机器学习（{MODELS[ml_result['model']]}）"}
     
-    # 第三个子图：买卖明细
-    fig.add_trace(
-        go.Bar(
-            x=bt_df.index,
-            y=bt_df['buy'],
-            name='买入',
-            marker_color='green'
-        ),
-        row=3, col=1
+    cum_ml = (ml_result['returns'] + 1).cumprod() - 1
+    fig_ml = go.Figure()
+    for name, color in (('benchmark', '#4E79A7'), ('extended', '#59A14F'), ('ml', '#E15759')):
+        fig_ml.add_trace(go.Scatter(
+            x=cum_ml.index,
+            y=cum_ml[name],
+            mode='lines',
+            name=ml_labels[name],
+            line=dict(color=color, width=2)
+        ))
+    fig_ml.update_layout(
+        title='机器学习策略累积收益',
+        height=450,
+        template='plotly_white',
+        hovermode="x unified"
     )
+    fig_ml.update_yaxes(tickformat='.1%')
+    st.plotly_chart(fig_ml, use_container_width=True)
     
-    fig.add_trace(
-        go.Bar(
-            x=bt_df.index,
-            y=-bt_df['sell'],
-            name='卖出',
-            marker_color='red'
-        ),
-        row=3, col=1
+    st.dataframe(risk_matrix(ml_result['returns']).rename(index=ml_labels).style.format('{:.2%}'))
+    export_button("下载机器学习策略明细", ml_result['backtest'], 'ml_backtest', key='export_ml')
+
+# 运行稳健性检验
+if was_cancelled('montecarlo_cancel'):
+    st.info("稳健性检验已取消")
+if montecarlo_button:
+    from trading_strategy.montecarlo import monte_carlo
+    
+    try:
+        st.markdown('<h2 class="sub-header">稳健性检验进度</h2>', unsafe_allow_html=True)
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        montecarlo_cancel = cancel_button("取消稳健性检验", 'montecarlo_cancel')
+        
+        status_text.text("正在获取K线数据...")
+        kline_df = get_kline(DATA_SOURCES[data_source], start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        if len(kline_df) <= 20:
+            st.error("指定时间范围内K线数据不足，请调整日期范围")
+            st.stop()
+        
+        def report_paths(done, total):
+            progress_bar.progress(done / total)
+            status_text.text(f"已完成 {done}/{total} 条路径")
+        
+        st.session_state.montecarlo_result = dict(
+            monte_carlo(kline_df, int(mc_paths), int(mc_block), mc_noise, k_value, bias_threshold, sell_days,
+                        sell_drop_th, confidence=mc_confidence, max_workers=int(sweep_workers),
+                        progress=report_paths, cancel=montecarlo_cancel),
+            source=data_source, confidence=mc_confidence
+        )
+        status_text.text(f"稳健性检验完成，共 {st.session_state.montecarlo_result['paths']} 条路径")
+        
+    except Exception as e:
+        st.error(f"稳健性检验出错: {str(e)}")
+        st.text(traceback.format_exc())
+
+# 显示稳健性检验结果
+if st.session_state.montecarlo_result is not None:
+    from trading_strategy.montecarlo import MC_METRICS
+    
+    st.markdown('<h2 class="sub-header">稳健性检验结果</h2>', unsafe_allow_html=True)
+    montecarlo = st.session_state.montecarlo_result
+    st.caption(f"数据源: {montecarlo['source']}，共 {montecarlo['paths']} 条模拟路径，"
+               f"上下限为 {montecarlo['confidence']:.0%} 置信区间")
+    
+    mc_metric = st.selectbox("分布指标", MC_METRICS, index=0)
+    fig_mc = go.Figure()
+    for name, color in (('benchmark', '#4E79A7'), ('basic', '#F28E2B'), ('extended', '#59A14F')):
+        fig_mc.add_trace(go.Histogram(
+            x=montecarlo['distributions'][name][mc_metric],
+            name=STRATEGY_LABELS[name],
+            marker_color=color,
+            opacity=0.6,
+            nbinsx=60
+        ))
+    fig_mc.update_layout(
+        title=f'{mc_metric} 分布',
+        barmode='overlay',
+        height=400,
+        template='plotly_white'
     )
+    st.plotly_chart(fig_mc, use_container_width=True)
     
-    # 如果显示成交量，添加第四个子图
-    if show_volume and st.session_state.kline_data is not None:
-        fig.add_trace(
-            go.Bar(
-                x=st.session_state.kline_data.index,
-                y=st.session_state.kline_data['volume'],
-                name='成交量',
-                marker_color='rgba(0,0,0,0.2)'
-            ),
-            row=4, col=1
+    summary = montecarlo['summary'].rename(index=STRATEGY_LABELS, level=0)
+    st.dataframe(summary.style.format('{:.3f}'))
+
+# 运行组合回测
+if portfolio_button:
+    from trading_strategy.portfolio import align_closes, backtest_portfolio
+    
+    try:
+        if not portfolio_assets:
+            st.error("请至少选择一个组合资产")
+            st.stop()
+        
+        st.markdown('<h2 class="sub-header">组合回测进度</h2>', unsafe_allow_html=True)
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        
+        status_text.text(f"正在获取 {len(portfolio_assets)} 个资产的K线数据...")
+        kline_dfs = get_klines({name: DATA_SOURCES[name] for name in portfolio_assets},
+                               start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        kline_dfs = {name: df for name, df in kline_dfs.items() if not df.empty}
+        if not kline_dfs:
+            st.error("指定时间范围内没有K线数据，请调整日期范围")
+            st.stop()
+        progress_bar.progress(50)
+        
+        status_text.text("执行组合回测...")
+        prices = align_closes(kline_dfs)
+        st.session_state.portfolio_result = backtest_portfolio(
+            prices, portfolio_weights, k_value, bias_threshold, sell_days, sell_drop_th
         )
+        progress_bar.progress(100)
+        status_text.text(f"组合回测完成，共 {prices.shape[1]} 个资产、{prices.shape[0]} 个交易日")
+        
+    except Exception as e:
+        st.error(f"组合回测出错: {str(e)}")
+        st.text(traceback.format_exc())
+
+# 显示组合回测结果
+if st.session_state.portfolio_result is not None:
+    import pandas as pd
+    
+    st.markdown('<h2 class="sub-header">组合回测结果</h2>', unsafe_allow_html=True)
+    portfolio = st.session_state.portfolio_result
     
-    # 更新布局
-    fig.update_layout(
-        height=1000 if show_volume else 800,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
+    cum_portfolio = (portfolio['returns'] + 1).cumprod() - 1
+    fig_portfolio = go.Figure()
+    for name, color in (('benchmark', '#4E79A7'), ('basic', '#F28E2B'), ('extended', '#59A14F')):
+        fig_portfolio.add_trace(go.Scatter(
+            x=cum_portfolio.index,
+            y=cum_portfolio[name],
+            mode='lines',
+            name=STRATEGY_LABELS[name],
+            line=dict(color=color, width=2)
+        ))
+    fig_portfolio.update_layout(
+        title='组合累积收益',
+        height=450,
         template='plotly_white',
         hovermode="x unified"
     )
+    fig_portfolio.update_yaxes(tickformat='.1%')
+    st.plotly_chart(fig_portfolio, use_container_width=True)
+    
+    st.subheader("组合绩效指标")
+    portfolio_metrics = pd.DataFrame(portfolio['metrics'], index=[STRATEGY_LABELS[n] for n in STRATEGY_NAMES])
+    st.dataframe(portfolio_metrics.style.format('{:.2%}'))
+    
+    st.subheader("各资产绩效指标")
+    asset_strategy = st.selectbox("策略", STRATEGY_NAMES, index=2, format_func=lambda x: STRATEGY_LABELS[x])
+    asset_table = portfolio['asset_metrics'][asset_strategy].copy()
+    asset_table.insert(0, '资金权重', portfolio['weights'])
+    st.dataframe(asset_table.style.format('{:.2%}'), height=300)
+    export_button("下载组合日收益", portfolio['returns'], 'portfolio_returns', key='export_portfolio')
+
+# 运行全市场扫描
+if scan_button:
+    from trading_strategy.scanner import scan
+    
+    try:
+        scan_sources = load_sources(scan_items_file)
+        if scan_sync:
+            with st.spinner(f"正在更新 {len(scan_sources)} 个饰品的K线..."):
+                now = int(time.time())
+                sync_klines(list(scan_sources.values()), now - SCAN_SYNC_DAYS * 86400, now)
+        st.session_state.scan_result = {
+            'table': scan(KLINE_STORE, scan_sources, bias_threshold),
+            'count': len(scan_sources),
+        }
+    except Exception as e:
+        st.error(f"全市场扫描出错: {str(e)}")
+        st.text(traceback.format_exc())
+
+# 显示全市场扫描结果
+if st.session_state.scan_result is not None:
+    from trading_strategy.scanner import SCAN_LABELS
+    
+    st.markdown('<h2 class="sub-header">全市场扫描</h2>', unsafe_allow_html=True)
+    scan_df = st.session_state.scan_result['table']
+    st.caption(f"共 {st.session_state.scan_result['count']} 个饰品，{len(scan_df)} 个有本地K线；"
+               f"按建议仓位、乖离率、成交量排序，点击表头可重新排序")
+    st.dataframe(
+        scan_df.rename(columns=SCAN_LABELS).rename_axis('饰品').style.format({
+            '日期': lambda d: f'{d:%Y-%m-%d}',
+            '涨跌幅': '{:.2%}',
+            '乖离率': '{:.2%}',
+            '量比': '{:.2f}',
+        }, na_rep='-'),
+        height=400,
+        use_container_width=True
+    )
+    export_button("下载扫描结果", scan_df, 'scan_results', key='export_scan')
+
+# 显示结果
+if st.session_state.result is not None:
+    import pandas as pd
+    from plotly.subplots import make_subplots
+    
+    from trading_strategy.risk import rolling_risk
+    
+    result = st.session_state.result
+    
+    # 显示图表
+    st.markdown('<h2 class="sub-header">回测结果图表</h2>', unsafe_allow_html=True)
+    
+    # 使用Plotly创建交互式图表
+    cum_returns = result['cumulative']
+    bt_df = result['backtest']
+    
+    # 显示区间：缩小区间后按新区间重新降采样，可以看到更多细节
+    view = (cum_returns.index[0], cum_returns.index[-1])
+    if len(cum_returns) > 1:
+        view = st.slider("显示区间",
+                         min_value=view[0].to_pydatetime(),
+                         max_value=view[1].to_pydatetime(),
+                         value=(view[0].to_pydatetime(), view[1].to_pydatetime()),
+                         step=timedelta(hours=1),
+                         format="YYYY-MM-DD HH:mm")
+    visible_bars = cum_returns.index.slice_indexer(view[0], view[1])
+    adaptive = chart_mode == 'auto' and len(cum_returns.index[visible_bars]) > MAX_POINTS
+    
+    def build_main_figure():
+        fig = make_subplots(
+            rows=4 if show_volume else 3, cols=1, 
+            shared_xaxes=True,
+            vertical_spacing=0.05,
+            subplot_titles=('策略累积收益', '总仓位分布', '买卖明细') + ('成交量',) if show_volume else (),
+            row_heights=[0.4, 0.2, 0.2, 0.2] if show_volume else [0.4, 0.2, 0.2]
+        )
+        
+        # 第一个子图：累积收益率
+        for name, color, shown in (('benchmark', '#4E79A7', show_benchmark),
+                                   ('basic', '#F28E2B', show_basic),
+                                   ('extended', '#59A14F', show_extended)):
+            if shown:
+                fig.add_trace(
+                    line_trace(f'cumulative.{name}', cum_returns[name], view, adaptive,
+                               name=STRATEGY_LABELS[name], line=dict(color=color, width=2)),
+                    row=1, col=1
+                )
+        
+        # 第二个子图：仓位分布
+        fig.add_trace(bar_trace('pos', bt_df['pos'], view, adaptive, 'steelblue', name='持仓'), row=2, col=1)
+        
+        # 第三个子图：买卖明细
+        fig.add_trace(bar_trace('buy', bt_df['buy'], view, adaptive, 'green', name='买入'), row=3, col=1)
+        fig.add_trace(bar_trace('sell', -bt_df['sell'], view, adaptive, 'red', name='卖出'), row=3, col=1)
+        
+        # 如果显示成交量，添加第四个子图
+        if show_volume:
+            fig.add_trace(
+                bar_trace('volume', result['kline']['volume'], view, adaptive, 'rgba(0,0,0,0.2)',
+                          name='成交量'),
+                row=4, col=1
+            )
+        
+        # 更新布局
+        fig.update_layout(
+            height=1000 if show_volume else 800,
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            ),
+            template='plotly_white',
+            hovermode="x unified"
+        )
+        
+        # 格式化y轴为百分比
+        fig.update_yaxes(tickformat='.1%', row=1, col=1)
+        return fig
     
-    # 格式化y轴为百分比
-    fig.update_yaxes(tickformat='.1%', row=1, col=1)
+    figure_start = time.perf_counter()
+    fig = chart_cached(('main', show_benchmark, show_basic, show_extended, show_volume, view, adaptive),
+                       build_main_figure)
+    record_figure('回测结果图表', figure_start)
     
     # 显示图表
     st.plotly_chart(fig, use_container_width=True)
@@ -590,184 +914,130 @@ if st.session_state.result_data is not None:
     # 显示绩效指标
     st.markdown('<h2 class="sub-header">绩效指标</h2>', unsafe_allow_html=True)
     
-    metrics = st.session_state.metrics
+    metrics = result['metrics']
     
-    # 使用列布局
-    col1, col2, col3 = st.columns(3)
+    # 使用列布局，每张卡片列出 ret_df 中的全部策略
+    cols = st.columns(3)
+    labels = [STRATEGY_LABELS.get(name, name) for name in result['returns'].columns]
     
-    # 显示各项指标
-    metrics_list = list(metrics.keys())
+    for i, (metric, values) in enumerate(metrics.items()):
+        rows = ''.join(f'<p>{label}: {value:.2%}</p>' for label, value in zip(labels, values))
+        with cols[i % 3]:
+            st.markdown(f"""
+            <div class="metric-card">
+                <p class="param-title">{metric}</p>
+                {rows}
+            </div>
+            """, unsafe_allow_html=True)
     
-    for i, metric in enumerate(metrics_list):
-        col_idx = i % 3
-        values = metrics[metric]
-        
-        if col_idx == 0:
-            with col1:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <p class="param-title">{metric}</p>
-                    <p>大盘走势: {values[0]:.2%}</p>
-                    <p>5/20基本策略: {values[1]:.2%}</p>
-                    <p>5/20拓展策略: {values[2]:.2%}</p>
-                </div>
-                """, unsafe_allow_html=True)
-        elif col_idx == 1:
-            with col2:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <p class="param-title">{metric}</p>
-                    <p>大盘走势: {values[0]:.2%}</p>
-                    <p>5/20基本策略: {values[1]:.2%}</p>
-                    <p>5/20拓展策略: {values[2]:.2%}</p>
-                </div>
-                """, unsafe_allow_html=True)
-        else:
-            with col3:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <p class="param-title">{metric}</p>
-                    <p>大盘走势: {values[0]:.2%}</p>
-                    <p>5/20基本策略: {values[1]:.2%}</p>
-                    <p>5/20拓展策略: {values[2]:.2%}</p>
-                </div>
-                """, unsafe_allow_html=True)
+    # 滚动指标（隐藏时不计算滚动指标、不构建图表）
+    if show_rolling:
+        st.markdown('<h2 class="sub-header">滚动指标</h2>', unsafe_allow_html=True)
+        rolling_window = st.radio("滚动窗口（天）", ROLLING_WINDOWS, horizontal=True)
+        visible = [(name, color) for name, color, shown in (('benchmark', '#4E79A7', show_benchmark),
+                                                            ('basic', '#F28E2B', show_basic),
+                                                            ('extended', '#59A14F', show_extended)) if shown]
+    
+        def build_rolling_figure():
+            rolling = rolling_risk(result['returns'][[name for name, _ in visible]], rolling_window)
+            rolling_fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                                        subplot_titles=(f'{rolling_window}日滚动Sharpe', f'{rolling_window}日滚动回撤'))
+            for name, color in visible:
+                rolling_fig.add_trace(
+                    line_trace(f'rolling{rolling_window}.sharpe.{name}', rolling['Sharpe'][name], view, adaptive,
+                               name=STRATEGY_LABELS[name], line=dict(color=color, width=1.5)),
+                    row=1, col=1
+                )
+                rolling_fig.add_trace(
+                    line_trace(f'rolling{rolling_window}.drawdown.{name}', -rolling['回撤'][name], view, adaptive,
+                               name=STRATEGY_LABELS[name], line=dict(color=color, width=1.5), showlegend=False),
+                    row=2, col=1
+                )
+            rolling_fig.update_layout(height=500, template='plotly_white', hovermode="x unified")
+            rolling_fig.update_yaxes(tickformat='.1%', row=2, col=1)
+            return rolling_fig
+    
+        figure_start = time.perf_counter()
+        rolling_fig = chart_cached(('rolling', rolling_window, tuple(visible), view, adaptive), build_rolling_figure)
+        record_figure('滚动指标图表', figure_start)
+        st.plotly_chart(rolling_fig, use_container_width=True)
     
     # 显示仓位建议
-    if st.session_state.position_df is not None and show_position_signals:
+    if show_position_signals:
         st.markdown('<h2 class="sub-header">仓位建议分析</h2>', unsafe_allow_html=True)
         
         # 过滤出有信号的日期
-        signal_df = st.session_state.position_df[st.session_state.position_df['position_signal'] > 0]
+        position_df = result['positions']
+        signal_df = position_df[position_df['position_signal'] > 0]
         
         if not signal_df.empty:
             # 创建带有信号标记的价格图表
-            fig_signals = make_subplots(
-                rows=2 if show_volume else 1, cols=1,
-                subplot_titles=('均线趋势与交叉信号',) + ('成交量',) if show_volume else (),
-                vertical_spacing=0.1
-            )
-            
-            # 添加价格
-            fig_signals.add_trace(
-                go.Scatter(
-                    x=st.session_state.position_df.index,
-                    y=st.session_state.position_df['close'],
-                    mode='lines',
-                    name='价格',
-                    line=dict(color='#4E79A7', width=2)
-                ),
-                row=1, col=1
-            )
-            
-            # 添加MA线
-            fig_signals.add_trace(
-                go.Scatter(
-                    x=st.session_state.position_df.index,
-                    y=st.session_state.position_df['ma5'],
-                    mode='lines',
-                    name='5日均线',
-                    line=dict(color='#F28E2B', width=1.5)
-                ),
-                row=1, col=1
-            )
-            
-            fig_signals.add_trace(
-                go.Scatter(
-                    x=st.session_state.position_df.index,
-                    y=st.session_state.position_df['ma10'],
-                    mode='lines',
-                    name='10日均线',
-                    line=dict(color='#59A14F', width=1.5)
-                ),
-                row=1, col=1
-            )
-            
-            fig_signals.add_trace(
-                go.Scatter(
-                    x=st.session_state.position_df.index,
-                    y=st.session_state.position_df['ma20'],
-                    mode='lines',
-                    name='20日均线',
-                    line=dict(color='#B6992D', width=1.5)
-                ),
-                row=1, col=1
-            )
-            
-            fig_signals.add_trace(
-                go.Scatter(
-                    x=st.session_state.position_df.index,
-                    y=st.session_state.position_df['ma30'],
-                    mode='lines',
-                    name='30日均线',
-                    line=dict(color='#499894', width=1.5)
-                ),
-                row=1, col=1
-            )
-            
-            # 添加买入2仓信号
-            buy_2_df = signal_df[signal_df['position_signal'] == 2]
-            if not buy_2_df.empty:
-                fig_signals.add_trace(
-                    go.Scatter(
-                        x=buy_2_df.index,
-                        y=buy_2_df['close'],
-                        mode='markers',
-                        name='买入2仓信号',
-                        marker=dict(
-                            color='green',
-                            size=12,
-                            symbol='triangle-up',
-                            line=dict(color='green', width=1)
-                        )
-                    ),
-                    row=1, col=1
+            def build_signals_figure():
+                fig_signals = make_subplots(
+                    rows=2 if show_volume else 1, cols=1,
+                    subplot_titles=('均线趋势与交叉信号',) + ('成交量',) if show_volume else (),
+                    vertical_spacing=0.1
                 )
-            
-            # 添加买入4仓信号
-            buy_4_df = signal_df[signal_df['position_signal'] == 4]
-            if not buy_4_df.empty:
-                fig_signals.add_trace(
-                    go.Scatter(
-                        x=buy_4_df.index,
-                        y=buy_4_df['close'],
-                        mode='markers',
-                        name='买入4仓信号',
-                        marker=dict(
-                            color='darkgreen',
-                            size=15,
-                            symbol='triangle-up',
-                            line=dict(color='darkgreen', width=2)
+                
+                # 添加价格及MA线
+                for column, name, color, width in (('close', '价格', '#4E79A7', 2),
+                                                   ('ma5', '5日均线', '#F28E2B', 1.5),
+                                                   ('ma10', '10日均线', '#59A14F', 1.5),
+                                                   ('ma20', '20日均线', '#B6992D', 1.5),
+                                                   ('ma30', '30日均线', '#499894', 1.5)):
+                    fig_signals.add_trace(
+                        line_trace(f'signals.{column}', position_df[column], view, adaptive,
+                                   name=name, line=dict(color=color, width=width)),
+                        row=1, col=1
+                    )
+                
+                # 添加买入2仓、买入4仓信号（信号点很少，不降采样）
+                visible_signals = signal_df.loc[view[0]:view[1]]
+                for level, color, size, width in ((2, 'green', 12, 1), (4, 'darkgreen', 15, 2)):
+                    buy_df = visible_signals[visible_signals['position_signal'] == level]
+                    if not buy_df.empty:
+                        fig_signals.add_trace(
+                            go.Scatter(
+                                x=buy_df.index,
+                                y=buy_df['close'],
+                                mode='markers',
+                                name=f'买入{level}仓信号',
+                                marker=dict(
+                                    color=color,
+                                    size=size,
+                                    symbol='triangle-up',
+                                    line=dict(color=color, width=width)
+                                )
+                            ),
+                            row=1, col=1
                         )
+                
+                # 如果显示成交量，添加第二个子图
+                if show_volume and 'volume' in position_df.columns:
+                    fig_signals.add_trace(
+                        bar_trace('signals.volume', position_df['volume'], view, adaptive, 'rgba(0,0,0,0.2)',
+                                  name='成交量'),
+                        row=2, col=1
+                    )
+                
+                # 更新布局
+                fig_signals.update_layout(
+                    height=600 if show_volume else 500,
+                    legend=dict(
+                        orientation="h",
+                        yanchor="bottom",
+                        y=1.02,
+                        xanchor="right",
+                        x=1
                     ),
-                    row=1, col=1
-                )
-            
-            # 如果显示成交量，添加第二个子图
-            if show_volume and 'volume' in st.session_state.position_df.columns:
-                fig_signals.add_trace(
-                    go.Bar(
-                        x=st.session_state.position_df.index,
-                        y=st.session_state.position_df['volume'],
-                        name='成交量',
-                        marker_color='rgba(0,0,0,0.2)'
-                    ),
-                    row=2, col=1
+                    template='plotly_white',
+                    hovermode="x unified"
                 )
+                return fig_signals
             
-            # 更新布局
-            fig_signals.update_layout(
-                height=600 if show_volume else 500,
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                ),
-                template='plotly_white',
-                hovermode="x unified"
-            )
+            figure_start = time.perf_counter()
+            fig_signals = chart_cached(('signals', show_volume, view, adaptive), build_signals_figure)
+            record_figure('仓位建议图表', figure_start)
             
             # 显示信号图表
             st.plotly_chart(fig_signals, use_container_width=True)
@@ -787,47 +1057,94 @@ if st.session_state.result_data is not None:
         else:
             st.info("📌 在选定的时间范围内没有检测到仓位建议信号")
         
+    # 性能统计
+    recorder = st.session_state.perf_recorder
+    if recorder is not None:
+        with st.expander("性能统计"):
+            perf_df = pd.DataFrame(recorder.summary(), columns=['name', 'calls', 'total_ms', 'mean_ms', 'max_ms'])
+            perf_df['name'] = perf_df['name'].map(lambda x: perf.SPAN_LABELS.get(x, x))
+            perf_df.columns = ['阶段', '次数', '总耗时(ms)', '平均(ms)', '最长(ms)']
+            st.dataframe(perf_df.style.format(precision=2), hide_index=True)
+            
+            if recorder.counters:
+                counter_df = pd.DataFrame({
+                    '计数': [perf.COUNTER_LABELS.get(k, k) for k in recorder.counters],
+                    '数值': list(recorder.counters.values())
+                })
+                st.dataframe(counter_df, hide_index=True)
+            
+            st.caption("HTTP请求在下载线程中并发进行，各阶段耗时之和可能大于总耗时；trace 文件可在 chrome://tracing 或 ui.perfetto.dev 中打开")
+            st.download_button(
+                label="下载 trace 文件",
+                data=recorder.trace_json().encode('utf-8'),
+                file_name='trace.json',
+                mime='application/json',
+            )
+            if recorder.profile_text:
+                st.code(recorder.profile_text, language=None)
+    
     # 导出功能
     st.markdown('<h2 class="sub-header">数据导出</h2>', unsafe_allow_html=True)
     
-    # 将数据转换为CSV
-    @st.cache_data
-    def convert_df_to_csv(df):
-        return df.to_csv().encode('utf-8')
+    metrics_df = pd.DataFrame(result['metrics'], index=[STRATEGY_LABELS.get(c, c) for c in result['returns'].columns])
     
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        if st.session_state.kline_data is not None:
-            csv = convert_df_to_csv(st.session_state.kline_data)
-            st.download_button(
-                label="下载原始K线数据",
-                data=csv,
-                file_name='kline_data.csv',
-                mime='text/csv',
-            )
+        export_button("下载原始K线数据", result['kline'], 'kline_data')
     
     with col2:
-        if st.session_state.bt_df is not None:
-            csv = convert_df_to_csv(st.session_state.bt_df)
-            st.download_button(
-                label="下载交易记录",
-                data=csv,
-                file_name='trade_data.csv',
-                mime='text/csv',
-            )
+        export_button("下载交易记录", result['backtest'], 'trade_data')
     
     with col3:
-        if st.session_state.result_data is not None:
-            csv = convert_df_to_csv(st.session_state.result_data['cumulative'])
-            st.download_button(
-                label="下载累积收益数据",
-                data=csv,
-                file_name='cumulative_returns.csv',
-                mime='text/csv',
-            )
+        export_button("下载累积收益数据", result['cumulative'], 'cumulative_returns')
+    
+    with col4:
+        st.download_button(
+            label="打包下载全部结果",
+            data=export_zip({'kline_data': result['kline'], 'trade_data': result['backtest'],
+                             'cumulative_returns': result['cumulative'], 'metrics': metrics_df}, export_format),
+            file_name=f'backtest_{export_format}.zip',
+            mime='application/zip',
+        )
+
+# 后台监控结果（由 python -m trading_strategy.worker 定时刷新，这里只读取预计算结果）
+# 没有运行过后台任务时结果目录不存在，不需要加载 pandas
+monitor_rows = []
+if os.path.isdir(DEFAULT_RESULT_DIR):
+    import pandas as pd
+    
+    from trading_strategy.results import ResultStore
+    from trading_strategy.signals import SIGNAL_LABELS
+    
+    monitor_store = ResultStore()
+    for name, url in DATA_SOURCES.items():
+        meta = monitor_store.meta(url)
+        if meta is None:
+            continue
+        signals = monitor_store.signals(url)
+        monitor_rows.append({
+            '数据源': name,
+            '最新K线': meta['last_bar'][:10],
+            '当前仓位': meta['pos'],
+            '最近信号': (f"{datetime.fromtimestamp(int(signals['ts'][-1])):%Y-%m-%d} {SIGNAL_LABELS[signals['code'][-1]]}"
+                         if len(signals) else ''),
+            '更新时间': f"{datetime.fromtimestamp(meta['updated_at']):%Y-%m-%d %H:%M}",
+        })
+
+if monitor_rows:
+    st.markdown('<h2 class="sub-header">后台监控</h2>', unsafe_allow_html=True)
+    st.caption("由后台任务 python -m trading_strategy.worker 定时刷新")
+    st.dataframe(pd.DataFrame(monitor_rows), hide_index=True)
 
 # 应用底部信息
 st.markdown("---")
 st.markdown("📊 交易策略回测工具 - 可在手机和电脑上使用的轻量级应用")
 st.caption("数据来源：OKskins API | 注意：市场有风险，投资需谨慎")
+
+# 启动耗时：冷启动时模块导入占大部分，之后的重跑不再导入
+run_seconds = time.perf_counter() - SCRIPT_START
+startup = get_startup_times()
+if not startup:
+    startup.update(imports=IMPORTS_DONE - SCRIPT_START, render=run_seconds)
+st.caption(f"冷启动：导入模块 {startup['imports']:.2f}s，首次渲染 {startup['render']:.2f}s | 本次运行 {run_seconds:.2f}s")
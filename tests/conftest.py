@@ -0,0 +1,35 @@
+"""测试共用的模拟数据"""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _make_kline(n, seed=0, nan_every=None):
+    """n 根日K线：随机游走的收盘价（保留两位小数）和整数成交量，nan_every 不为空时每隔若干根缺一个收盘价"""
+    rng = np.random.default_rng(seed)
+    close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.03, n))), 2)
+    if nan_every:
+        close[::nan_every] = np.nan
+    volume = rng.integers(0, 1000, n).astype(float)
+    index = pd.date_range('2015-01-01', periods=n, freq='D', name='date')
+    return pd.DataFrame({'close': close, 'volume': volume}, index=index)
+
+
+def _random_params(rng):
+    """随机的拓展策略参数，范围覆盖不交易、频繁止盈和频繁清仓的情形"""
+    return {
+        'k0': float(rng.uniform(0, 15)),
+        'bias_th': float(rng.uniform(-0.05, 0.2)),
+        'sell_days': int(rng.integers(0, 10)),
+        'sell_drop_th': float(rng.uniform(-0.2, 0.05)),
+    }
+
+
+@pytest.fixture
+def make_kline():
+    return _make_kline
+
+
+@pytest.fixture
+def random_params():
+    return _random_params
@@ -0,0 +1,47 @@
+"""向量化回测引擎与逐行回测逐位一致"""
+import itertools
+
+import numpy as np
+import pytest
+
+from trading_strategy.backtest import backtest, backtest_fast, backtest_legacy, run_strategies
+
+# 参数网格：与界面上参数扫描的默认范围相当
+PARAM_GRID = list(itertools.product([4.0, 6.7, 9.0], [0.03, 0.07, 0.11], [2, 3, 5], [-0.09, -0.05]))
+
+
+def assert_same_backtest(fast, legacy):
+    assert fast.equals(legacy)
+    for col in ('pos', 'ret', 'buy', 'sell'):
+        assert np.array_equal(fast[col].to_numpy(), legacy[col].to_numpy(), equal_nan=True), col
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_random_paths(seed, make_kline, random_params):
+    rng = np.random.default_rng(seed)
+    kline_df = make_kline(int(rng.integers(20, 600)), seed=seed, nan_every=37 if seed % 5 == 0 else None)
+    params = random_params(rng)
+    assert_same_backtest(backtest_fast(kline_df, **params), backtest_legacy(kline_df, **params))
+
+
+@pytest.mark.parametrize('k0, bias_th, sell_days, sell_drop_th', PARAM_GRID)
+def test_param_grid(k0, bias_th, sell_days, sell_drop_th, make_kline):
+    kline_df = make_kline(400, seed=1)
+    params = dict(k0=k0, bias_th=bias_th, sell_days=sell_days, sell_drop_th=sell_drop_th)
+    assert_same_backtest(backtest_fast(kline_df, **params), backtest_legacy(kline_df, **params))
+
+
+# 逐行回测要求至少 20 根K线（第一根 MA20）
+@pytest.mark.parametrize('n', [20, 21, 22])
+def test_short_histories(n, make_kline):
+    kline_df = make_kline(n, seed=n)
+    assert_same_backtest(backtest_fast(kline_df), backtest_legacy(kline_df))
+
+
+def test_engine_switch(make_kline):
+    kline_df = make_kline(300, seed=2)
+    assert backtest(kline_df, engine='fast').equals(backtest(kline_df, engine='legacy'))
+    fast_ret, fast_bt = run_strategies(kline_df, engine='fast')
+    legacy_ret, legacy_bt = run_strategies(kline_df, engine='legacy')
+    assert fast_ret.equals(legacy_ret)
+    assert fast_bt.equals(legacy_bt)
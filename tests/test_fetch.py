@@ -0,0 +1,189 @@
+"""K线下载器对本地模拟接口的分页、重试和增量同步"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+
+from trading_strategy.fetch import DAY_SECONDS, KlineFetchError, KlineFetcher, sync_store
+from trading_strategy.store import KlineStore, day_start, pages_to_array
+
+
+class KlineStub:
+    """本地模拟K线接口：按 maxTime 返回之前最多 page 根日K线
+
+    faults 中的每一项依次作用于之后的请求：'error' 返回503，'slow' 延迟 delay 秒后才响应。
+    """
+
+    def __init__(self, n=300, page=40, end_ts=None, delay=1.0):
+        end_ts = day_start() if end_ts is None else end_ts
+        rng = np.random.default_rng(0)
+        self.ts = end_ts - DAY_SECONDS * np.arange(n)[::-1]
+        self.close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.03, n))), 2)
+        self.volume = rng.integers(0, 1000, n)
+        self.page = page
+        self.delay = delay
+        self.faults = []
+        self.requests = []
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                max_time = int(parse_qs(urlparse(self.path).query)['maxTime'][0])
+                with stub._lock:
+                    stub.requests.append(max_time)
+                    fault = stub.faults.pop(0) if stub.faults else None
+                if fault == 'error':
+                    self.send_error(503)
+                    return
+                if fault == 'slow':
+                    time.sleep(stub.delay)
+                sel = np.flatnonzero(stub.ts <= max_time)[-stub.page:]
+                rows = [[str(int(stub.ts[i])), 0, float(stub.close[i]), 0, 0, int(stub.volume[i])] for i in sel]
+                body = json.dumps({'data': rows}).encode('utf-8')
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    # 客户端已超时断开
+                    pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.url = 'http://127.0.0.1:%d/kline?timestamp={}&maxTime={}' % self.server.server_address[1]
+
+    def expected(self, start_ts, end_ts):
+        sel = (self.ts >= start_ts) & (self.ts <= end_ts)
+        return self.ts[sel], self.close[sel], self.volume[sel]
+
+    def close_server(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    stub = KlineStub()
+    yield stub
+    stub.close_server()
+
+
+@pytest.fixture
+def fetcher():
+    with KlineFetcher(max_concurrency=4, timeout=0.3, retries=2, backoff=0) as fetcher:
+        yield fetcher
+
+
+def assert_klines(arr, expected):
+    ts, close, volume = expected
+    assert np.array_equal(arr['ts'], ts)
+    assert np.array_equal(arr['close'], close)
+    assert np.array_equal(arr['volume'], volume)
+
+
+def merged(pages):
+    arr = pages_to_array(pages)
+    _, idx = np.unique(arr['ts'], return_index=True)
+    return arr[idx]
+
+
+@pytest.mark.parametrize('max_concurrency', [1, 4])
+@pytest.mark.parametrize('days', [10, 40, 41, 250])
+def test_fetch_range_pages(stub, max_concurrency, days):
+    end_ts = int(stub.ts[-1])
+    start_ts = end_ts - days * DAY_SECONDS
+    with KlineFetcher(max_concurrency=max_concurrency, retries=0) as fetcher:
+        pages, covered_lo = fetcher.fetch_range(stub.url, start_ts, end_ts)
+    assert covered_lo == start_ts
+    arr = merged(pages)
+    assert_klines(arr[arr['ts'] >= start_ts], stub.expected(start_ts, end_ts))
+    # 每个并发窗口至多多请求一页
+    assert len(stub.requests) <= (days + 1) // stub.page + 1 + max_concurrency
+
+
+def test_fetch_range_stops_at_history_start(stub, fetcher):
+    end_ts = int(stub.ts[-1])
+    pages, covered_lo = fetcher.fetch_range(stub.url, end_ts - 1000 * DAY_SECONDS, end_ts)
+    assert_klines(merged(pages), stub.expected(0, end_ts))
+
+
+def test_retry_on_server_error(stub, fetcher):
+    stub.faults = ['error']
+    page = fetcher.get_page(stub.url, int(stub.ts[-1]))
+    assert_klines(page, (stub.ts[-stub.page:], stub.close[-stub.page:], stub.volume[-stub.page:]))
+    assert fetcher.stats == {'requests': 2, 'retries': 1}
+
+
+def test_retry_on_timeout(stub, fetcher):
+    stub.faults = ['slow']
+    page = fetcher.get_page(stub.url, int(stub.ts[-1]))
+    assert len(page) == stub.page
+    assert fetcher.stats == {'requests': 2, 'retries': 1}
+
+
+def test_gives_up_after_retries(stub, fetcher):
+    stub.faults = ['error'] * 3
+    with pytest.raises(KlineFetchError):
+        fetcher.get_page(stub.url, int(stub.ts[-1]))
+    assert len(stub.requests) == 3
+
+
+def test_partial_pages_on_failure(stub):
+    end_ts = int(stub.ts[-1])
+    start_ts = end_ts - 200 * DAY_SECONDS
+    stub.faults = [None, 'error']
+    with KlineFetcher(max_concurrency=1, retries=0) as fetcher:
+        with pytest.raises(KlineFetchError) as info:
+            fetcher.fetch_range(stub.url, start_ts, end_ts)
+    error = info.value
+    assert len(error.pages) == 1
+    assert error.covered_lo == int(error.pages[0]['ts'][0]) - DAY_SECONDS + 1
+
+
+def test_sync_store_warm(stub, fetcher, tmp_path):
+    store = KlineStore(str(tmp_path))
+    end_ts = int(time.time())
+    start_ts = int(stub.ts[0])
+    updated = []
+    assert sync_store(store, fetcher, [stub.url], start_ts, end_ts, on_update=updated.append) == {}
+    assert updated == [stub.url]
+    assert_klines(store.read(stub.url, start_ts, end_ts), stub.expected(start_ts, end_ts))
+
+    # 已下载过的区间不再请求，只重新拉取当天的最新一页
+    stub.requests.clear()
+    assert sync_store(store, fetcher, [stub.url], start_ts, end_ts) == {}
+    assert len(stub.requests) <= 1
+    assert_klines(store.read(stub.url, start_ts, end_ts), stub.expected(start_ts, end_ts))
+
+    # 不含当天的区间完全不请求
+    stub.requests.clear()
+    assert sync_store(store, fetcher, [stub.url], start_ts, day_start() - 1) == {}
+    assert stub.requests == []
+
+
+def test_sync_store_keeps_partial_download(stub, tmp_path):
+    store = KlineStore(str(tmp_path))
+    end_ts = day_start() - 1
+    start_ts = int(stub.ts[0])
+    stub.faults = [None, 'error']
+    with KlineFetcher(max_concurrency=1, retries=0) as fetcher:
+        errors = sync_store(store, fetcher, [stub.url], start_ts, end_ts)
+        assert list(errors) == [stub.url]
+        # 出错前下载的一页已写入，下次只请求剩余的区间
+        assert len(store.read(stub.url)) == stub.page
+        stub.requests.clear()
+        assert sync_store(store, fetcher, [stub.url], start_ts, end_ts) == {}
+    assert min(stub.requests) < int(stub.ts[-stub.page])
+    assert_klines(store.read(stub.url, start_ts, end_ts), stub.expected(start_ts, end_ts))
@@ -0,0 +1,42 @@
+"""机器学习策略的模型缓存"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from trading_strategy.ml import ModelStore, walk_forward_predict
+
+
+def test_concurrent_put_same_key(tmp_path):
+    """多个会话同时写入同一个模型时都能成功，且不留下临时文件"""
+    key = ('fingerprint', 'logistic', 1)
+    model = {'coef': list(range(1000))}
+    stores = [ModelStore(str(tmp_path)) for _ in range(8)]
+    with ThreadPoolExecutor(8) as pool:
+        for _ in range(20):
+            list(pool.map(lambda store: store.put(key, model), stores))
+    assert os.listdir(tmp_path) == [os.path.basename(stores[0]._path(key))]
+    assert ModelStore(str(tmp_path)).get(key) == model
+
+
+def test_windows_with_same_history_do_not_share_models(make_kline):
+    """训练窗口 [10, 110) 与 [0, 110) 的历史K线相同（都从第一根开始），但训练行不同，不能共用模型"""
+    pytest.importorskip('sklearn')
+    kline_df = make_kline(200, seed=5)
+    fresh = walk_forward_predict(kline_df, train_bars=110, test_bars=10, store=ModelStore())
+    shared = ModelStore()
+    walk_forward_predict(kline_df, train_bars=100, test_bars=10, store=shared)
+    assert np.array_equal(walk_forward_predict(kline_df, train_bars=110, test_bars=10, store=shared), fresh,
+                          equal_nan=True)
+
+
+def test_reuses_models_after_append(make_kline):
+    """K线追加新数据后，历史窗口的模型直接复用"""
+    pytest.importorskip('sklearn')
+    kline_df = make_kline(400, seed=6)
+    store = ModelStore()
+    walk_forward_predict(kline_df.iloc[:300], train_bars=100, test_bars=50, store=store)
+    misses = store.misses
+    walk_forward_predict(kline_df, train_bars=100, test_bars=50, store=store)
+    assert store.misses - misses == 2
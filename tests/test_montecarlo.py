@@ -0,0 +1,39 @@
+"""蒙特卡洛稳健性检验"""
+import threading
+import time
+
+import pandas as pd
+
+from trading_strategy import montecarlo
+from trading_strategy.montecarlo import monte_carlo
+
+# 慢批次的耗时（秒），取消后 monte_carlo 应远早于此返回
+SLOW_SECONDS = 3
+_simulate_chunk = montecarlo._simulate_chunk
+
+
+def _simulate_chunk_slow(close0, ret, n_paths, *args):
+    """最后一批（路径数不足 chunk_size）模拟长时间运行"""
+    if n_paths < 100:
+        time.sleep(SLOW_SECONDS)
+    return _simulate_chunk(close0, ret, n_paths, *args)
+
+
+def test_workers_agree(make_kline):
+    kline_df = make_kline(400, seed=1)
+    serial = monte_carlo(kline_df, n_paths=300, chunk_size=100, max_workers=1)
+    parallel = monte_carlo(kline_df, n_paths=300, chunk_size=100, max_workers=2)
+    pd.testing.assert_frame_equal(parallel['summary'], serial['summary'])
+    assert parallel['paths'] == serial['paths'] == 300
+
+
+def test_cancel_does_not_wait(make_kline, monkeypatch):
+    monkeypatch.setattr(montecarlo, '_simulate_chunk', _simulate_chunk_slow)
+    kline_df = make_kline(400, seed=2)
+    cancel = threading.Event()
+
+    start = time.monotonic()
+    result = monte_carlo(kline_df, n_paths=150, chunk_size=100, max_workers=2,
+                         progress=lambda done, total: cancel.set(), cancel=cancel)
+    assert time.monotonic() - start < SLOW_SECONDS - 1
+    assert result['paths'] == 100
@@ -0,0 +1,31 @@
+"""回测结果缓存的磁盘读写"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from trading_strategy.result_cache import ResultCache, compute_result, result_key
+
+
+def test_disk_roundtrip(tmp_path, make_kline):
+    kline_df = make_kline(300, seed=1)
+    _, result, hit = ResultCache(disk_dir=str(tmp_path)).get_or_compute(kline_df, t_plus=7)
+    assert not hit
+    # 新的缓存对象（相当于进程重启）从磁盘命中
+    _, loaded, hit = ResultCache(disk_dir=str(tmp_path)).get_or_compute(kline_df, t_plus=7)
+    assert hit
+    pd.testing.assert_frame_equal(loaded['backtest'], result['backtest'])
+    pd.testing.assert_frame_equal(loaded['positions'], result['positions'])
+
+
+def test_concurrent_put_same_key(tmp_path, make_kline):
+    """多个会话同时写入同一个键时都能成功，且不留下临时文件"""
+    kline_df = make_kline(300, seed=2)
+    key = result_key(kline_df)
+    result = compute_result(kline_df)
+    caches = [ResultCache(disk_dir=str(tmp_path)) for _ in range(8)]
+    with ThreadPoolExecutor(8) as pool:
+        for _ in range(20):
+            list(pool.map(lambda cache: cache.put(key, result), caches))
+    assert os.listdir(tmp_path) == [os.path.basename(caches[0]._path(key))]
+    pd.testing.assert_frame_equal(ResultCache(disk_dir=str(tmp_path)).get(key)['returns'], result['returns'])
@@ -0,0 +1,86 @@
+"""批量绩效指标与原逐列 get_risk 逐位一致"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from trading_strategy.constants import METRIC_NAMES
+from trading_strategy.risk import get_risk, risk_matrix
+
+
+def get_risk_reference(df, num=365):
+    """原 get_risk（按列用 pandas 计算），用于核对 risk_matrix"""
+    value_df = (1 + df).cumprod()
+    annual_ret = value_df.iloc[-1] ** (num / len(df)) - 1
+    vol = df.std() * np.sqrt(num)
+    sharpe = annual_ret / vol
+    max_dd = (1 - value_df / value_df.cummax()).max()
+    calmar = annual_ret / max_dd
+    return {
+        '总收益率': (value_df.iloc[-1] - 1).tolist(),
+        '年化收益': annual_ret.tolist(),
+        '波动率': vol.tolist(),
+        'Sharpe': sharpe.tolist(),
+        '最大回撤': max_dd.tolist(),
+        'Calmar': calmar.tolist()
+    }
+
+
+def returns_frame(n, seed):
+    """各种形态的收益列：随机收益、开头空值（shift 产生）、全部空仓、只涨不跌、中间空值"""
+    rng = np.random.default_rng(seed)
+    random = rng.normal(0.0005, 0.02, n)
+    shifted = random.copy()
+    shifted[0] = np.nan
+    holes = random.copy()
+    holes[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame({
+        'random': random,
+        'shifted': shifted,
+        'flat': np.zeros(n),
+        'no_drawdown': np.abs(random),
+        'holes': holes,
+        'sparse': np.where(rng.random(n) < 0.8, 0.0, random),
+    }, index=pd.date_range('2015-01-01', periods=n, freq='D'))
+
+
+def assert_same_risk(df, num=365):
+    expected = get_risk_reference(df, num)
+    table = risk_matrix(df, num)
+    for i, col in enumerate(df.columns):
+        for name in METRIC_NAMES:
+            np.testing.assert_array_equal(table.loc[col, name], expected[name][i], err_msg=f'{col} {name}')
+    # 单列计算与整表批量计算相同
+    for col in df.columns:
+        pd.testing.assert_frame_equal(risk_matrix(df[[col]], num), table.loc[[col]])
+    return table
+
+
+@pytest.mark.parametrize('n', [2, 30, 365, 2000])
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_reference(n, seed):
+    assert_same_risk(returns_frame(n, seed))
+
+
+def test_chunked():
+    df = pd.concat([returns_frame(300, seed).add_suffix(f'_{seed}') for seed in range(10)], axis=1)
+    expected = risk_matrix(df)
+    pd.testing.assert_frame_equal(risk_matrix(df, chunk_size=7), expected)
+
+
+def test_edge_columns():
+    table = assert_same_risk(returns_frame(500, 0), num=252)
+    # 全部空仓：收益和回撤都为0，Sharpe、Calmar 为空
+    assert table.loc['flat', '最大回撤'] == 0
+    assert np.isnan(table.loc['flat', 'Sharpe'])
+    # 没有回撤时 Calmar 为无穷大
+    assert table.loc['no_drawdown', '最大回撤'] == 0
+    assert np.isinf(table.loc['no_drawdown', 'Calmar'])
+
+
+def test_get_risk_lists():
+    df = returns_frame(400, 1)
+    result = get_risk(df)
+    expected = get_risk_reference(df)
+    assert list(result) == METRIC_NAMES
+    for name in METRIC_NAMES:
+        np.testing.assert_array_equal(result[name], expected[name], err_msg=name)
@@ -0,0 +1,45 @@
+"""声明式策略与手写策略逐位一致"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from trading_strategy.backtest import backtest, run_strategies
+from trading_strategy.rules import BASIC_SPEC, EXTENDED_SPEC, Strategy, run_variants
+
+
+def assert_same_values(actual, expected):
+    assert actual.index.equals(expected.index)
+    assert np.array_equal(actual.to_numpy(dtype=float), expected.to_numpy(dtype=float), equal_nan=True)
+
+
+@pytest.mark.parametrize('t_plus', [None, 1, 3, 7])
+@pytest.mark.parametrize('seed', range(10))
+def test_specs_match_run_strategies(seed, t_plus, make_kline, random_params):
+    rng = np.random.default_rng(seed)
+    kline_df = make_kline(int(rng.integers(20, 600)), seed=seed, nan_every=43 if seed % 5 == 0 else None)
+    params = random_params(rng)
+    ret_df, bt_df = run_strategies(kline_df, **params, t_plus=t_plus)
+
+    assert_same_values(Strategy(BASIC_SPEC).returns(kline_df, t_plus), ret_df['basic'])
+    extended = Strategy(EXTENDED_SPEC, params)
+    assert_same_values(extended.returns(kline_df, t_plus), ret_df['extended'])
+    pd.testing.assert_frame_equal(extended.backtest(kline_df, t_plus), bt_df)
+
+
+def test_default_params_match_backtest(make_kline):
+    kline_df = make_kline(500, seed=11)
+    pd.testing.assert_frame_equal(Strategy(EXTENDED_SPEC).backtest(kline_df), backtest(kline_df))
+
+
+def test_run_variants(make_kline, random_params):
+    kline_df = make_kline(400, seed=12)
+    rng = np.random.default_rng(12)
+    variants = [random_params(rng) for _ in range(6)]
+    table = run_variants(kline_df, EXTENDED_SPEC, variants)
+    for i, params in enumerate(variants):
+        assert_same_values(table[i], run_strategies(kline_df, **params)[0]['extended'])
+
+
+def test_unknown_param():
+    with pytest.raises(ValueError):
+        Strategy(EXTENDED_SPEC, {'k1': 1})
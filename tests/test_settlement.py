@@ -0,0 +1,102 @@
+"""T+N 结算与逐行参考实现一致"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from trading_strategy.backtest import backtest_fast, backtest_legacy, run_strategies, settle_flags, t7_adjust
+
+LOCKS = [1, 2, 3, 7, 10]
+
+
+def random_flags(rng, n, leading_nan=False):
+    """随机0/1持仓信号：持仓段和空仓段长度随机，开头可带一个 shift 产生的空值"""
+    stay = rng.uniform(0.5, 0.95)
+    values = np.empty(n)
+    cur = float(rng.integers(0, 2))
+    for i in range(n):
+        if rng.random() > stay:
+            cur = 1.0 - cur
+        values[i] = cur
+    if leading_nan and n:
+        values[0] = np.nan
+    return pd.Series(values, index=pd.date_range('2015-01-01', periods=n, freq='D'))
+
+
+def settle_reference(flag, lock_days):
+    """t7_adjust 推广到任意 N：开头的空值视为空仓，开盘即持有时从第一根K线开始锁定"""
+    out = flag.to_numpy(dtype=float).copy()
+    start = 0
+    for i in range(len(out)):
+        prev = out[i - 1] if i > 0 and out[i - 1] == out[i - 1] else 0.0
+        if out[i] > prev:
+            start = i
+        elif out[i] < prev and i - start < lock_days:
+            out[i] = 1
+    return pd.Series(out, index=flag.index)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_matches_t7_adjust(seed):
+    rng = np.random.default_rng(seed)
+    flag = random_flags(rng, int(rng.integers(2, 300)))
+    # t7_adjust 要求序列从空仓开始
+    flag.iloc[0] = 0
+    expected = t7_adjust(flag.copy())
+    pd.testing.assert_series_equal(settle_flags(flag), expected)
+    pd.testing.assert_series_equal(settle_flags(flag, 7), expected)
+
+
+@pytest.mark.parametrize('lock_days', LOCKS)
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_reference(lock_days, seed):
+    rng = np.random.default_rng(seed)
+    flag = random_flags(rng, int(rng.integers(1, 300)), leading_nan=seed % 2 == 0)
+    pd.testing.assert_series_equal(settle_flags(flag, lock_days), settle_reference(flag, lock_days))
+
+
+@pytest.mark.parametrize('lock_days', LOCKS)
+@pytest.mark.parametrize('values', [
+    [0] * 20,
+    [1] * 20,
+    [np.nan] + [1] * 19,
+    [0] * 15 + [1, 0, 0, 0, 0],  # 最后一段持仓在序列结束时仍未满锁定期
+    [0] * 17 + [1, 1, 1],  # 以持仓结束
+    [1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0],
+])
+def test_edge_cases(lock_days, values):
+    flag = pd.Series(values, dtype=float)
+    settled = settle_flags(flag, lock_days)
+    pd.testing.assert_series_equal(settled, settle_reference(flag, lock_days))
+    assert np.array_equal(settle_flags(flag.to_numpy(), lock_days), settled.to_numpy(), equal_nan=True)
+
+
+def test_lock_one_is_identity():
+    flag = random_flags(np.random.default_rng(0), 100, leading_nan=True)
+    pd.testing.assert_series_equal(settle_flags(flag, 1), flag)
+
+
+def test_input_unchanged():
+    flag = random_flags(np.random.default_rng(1), 100)
+    before = flag.copy()
+    settle_flags(flag, 7)
+    pd.testing.assert_series_equal(flag, before)
+
+
+@pytest.mark.parametrize('t_plus', LOCKS)
+@pytest.mark.parametrize('seed', range(8))
+def test_backtest_engines_agree(t_plus, seed, make_kline, random_params):
+    rng = np.random.default_rng(seed)
+    kline_df = make_kline(int(rng.integers(20, 500)), seed=seed)
+    params = random_params(rng)
+    fast = backtest_fast(kline_df, **params, t_plus=t_plus)
+    legacy = backtest_legacy(kline_df, **params, t_plus=t_plus)
+    assert fast.equals(legacy)
+
+
+@pytest.mark.parametrize('t_plus', [None, 1, 7])
+def test_run_strategies_engines_agree(t_plus, make_kline):
+    kline_df = make_kline(400, seed=3)
+    fast_ret, fast_bt = run_strategies(kline_df, engine='fast', t_plus=t_plus)
+    legacy_ret, legacy_bt = run_strategies(kline_df, engine='legacy', t_plus=t_plus)
+    assert fast_ret.equals(legacy_ret)
+    assert fast_bt.equals(legacy_bt)
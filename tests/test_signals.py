@@ -0,0 +1,86 @@
+"""向量化仓位信号与逐行实现一致"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from trading_strategy.signals import SIGNAL_LABELS, analyze_positions
+
+
+def analyze_positions_reference(kline_df):
+    """原逐行实现（修改并返回 kline_df），用于核对 analyze_positions"""
+    ma5 = kline_df['close'].rolling(5).mean()
+    ma10 = kline_df['close'].rolling(10).mean()
+    ma20 = kline_df['close'].rolling(20).mean()
+    ma30 = kline_df['close'].rolling(30).mean()
+
+    kline_df['position_signal'] = 0
+    kline_df['signal_type'] = ''
+    kline_df['ma5'] = ma5
+    kline_df['ma10'] = ma10
+    kline_df['ma20'] = ma20
+    kline_df['ma30'] = ma30
+
+    for i in range(1, len(kline_df)):
+        ma30_trend_up = kline_df['ma30'].iloc[i] > kline_df['ma30'].iloc[i - 1]
+        if ma30_trend_up:
+            ma5_cross_ma10 = (ma5.iloc[i] > ma10.iloc[i]) and (ma5.iloc[i - 1] <= ma10.iloc[i - 1])
+            ma5_cross_ma20 = (ma5.iloc[i] > ma20.iloc[i]) and (ma5.iloc[i - 1] <= ma20.iloc[i - 1])
+            if ma5_cross_ma20:
+                kline_df.iloc[i, kline_df.columns.get_loc('position_signal')] = 4
+                kline_df.iloc[i, kline_df.columns.get_loc('signal_type')] = 'MA5上穿MA20，建议买入4仓'
+            elif ma5_cross_ma10:
+                kline_df.iloc[i, kline_df.columns.get_loc('position_signal')] = 2
+                kline_df.iloc[i, kline_df.columns.get_loc('signal_type')] = 'MA5上穿MA10，建议买入2仓'
+    return kline_df
+
+
+def expected_frame(kline_df):
+    """逐行实现的结果换成 analyze_positions 的紧凑列类型"""
+    expected = analyze_positions_reference(kline_df.copy())
+    expected['position_signal'] = expected['position_signal'].astype(np.int8)
+    expected['signal_type'] = pd.Categorical(expected['signal_type'], categories=SIGNAL_LABELS)
+    for col in ('ma5', 'ma10', 'ma20', 'ma30'):
+        expected[col] = expected[col].astype(np.float32)
+    return expected
+
+
+def assert_same_signals(kline_df):
+    before = kline_df.copy()
+    result = analyze_positions(kline_df)
+    pd.testing.assert_frame_equal(result, expected_frame(kline_df), check_exact=True)
+    assert isinstance(result['signal_type'].dtype, pd.CategoricalDtype)
+    assert list(result['signal_type'].cat.categories) == SIGNAL_LABELS
+    # 不修改输入
+    pd.testing.assert_frame_equal(kline_df, before)
+    return result
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_paths(seed, make_kline):
+    rng = np.random.default_rng(seed)
+    kline_df = make_kline(int(rng.integers(30, 800)), seed=seed, nan_every=53 if seed % 4 == 0 else None)
+    assert_same_signals(kline_df)
+
+
+def test_signals_present(make_kline):
+    result = assert_same_signals(make_kline(2000, seed=7))
+    # 随机游走足够长时两种信号都会出现
+    assert set(result['position_signal'].unique()) == {0, 2, 4}
+
+
+@pytest.mark.parametrize('n', [0, 1, 5, 29, 30, 31])
+def test_warmup(n, make_kline):
+    """均线尚未有值（NaN）的开头部分没有信号"""
+    result = assert_same_signals(make_kline(n, seed=n))
+    assert (result['position_signal'] == 0).all()
+
+
+def test_flat_prices(make_kline):
+    kline_df = make_kline(200)
+    kline_df['close'] = 10.0
+    result = assert_same_signals(kline_df)
+    assert (result['signal_type'] == '').all()
+
+
+def test_close_only(make_kline):
+    assert_same_signals(make_kline(300, seed=3)[['close']])
@@ -0,0 +1,77 @@
+"""本地K线存储的合并写入"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from trading_strategy.fetch import DAY_SECONDS
+from trading_strategy.store import KLINE_DTYPE, KlineStore, rows_to_array
+
+BASE_TS = 1_500_000_000
+BARS = 20
+ROUNDS = 15
+
+
+def rows_to_array_reference(rows):
+    """逐行构造元组的原实现"""
+    if not rows:
+        return np.empty(0, dtype=KLINE_DTYPE)
+    return np.array([(int(r[0]), float(r[2]), float(r[5])) for r in rows], dtype=KLINE_DTYPE)
+
+
+def _bars(lo, n):
+    arr = np.zeros(n, dtype=KLINE_DTYPE)
+    arr['ts'] = BASE_TS + (lo + np.arange(n)) * DAY_SECONDS
+    arr['close'] = lo + np.arange(n)
+    return arr
+
+
+def _write_rounds(root, writer):
+    """每个进程写入互不重叠的若干段K线"""
+    store = KlineStore(root)
+    for i in range(ROUNDS):
+        arr = _bars((writer * ROUNDS + i) * BARS, BARS)
+        store.write('u', arr, int(arr['ts'][0]), int(arr['ts'][-1]) + DAY_SECONDS - 1)
+
+
+def test_merge_and_overwrite(tmp_path):
+    store = KlineStore(str(tmp_path))
+    store.write('u', _bars(0, 10), BASE_TS, BASE_TS + 9 * DAY_SECONDS)
+    newer = _bars(5, 10)
+    newer['close'] += 0.5
+    store.write('u', newer, BASE_TS + 5 * DAY_SECONDS, BASE_TS + 14 * DAY_SECONDS)
+    arr = store.read('u')
+    assert np.array_equal(arr['ts'], _bars(0, 15)['ts'])
+    # 重复的时间戳以新数据为准
+    assert np.array_equal(arr['close'][5:], newer['close'])
+    assert store.gaps('u', BASE_TS, BASE_TS + 14 * DAY_SECONDS) == []
+
+
+def test_concurrent_writers_keep_all_bars(tmp_path):
+    root = str(tmp_path)
+    writers = 4
+    with ProcessPoolExecutor(writers) as pool:
+        list(pool.map(_write_rounds, [root] * writers, range(writers)))
+
+    store = KlineStore(root)
+    total = writers * ROUNDS * BARS
+    assert np.array_equal(store.read('u')['ts'], _bars(0, total)['ts'])
+    assert store.gaps('u', BASE_TS, BASE_TS + (total - 1) * DAY_SECONDS) == []
+    assert not [name for name in os.listdir(root) if name.endswith('.tmp')]
+
+
+@pytest.mark.parametrize('n', [0, 1, 7, 1000])
+def test_rows_to_array_matches_reference(n):
+    """按列解码与逐行解码的结果完全相同：时间戳为字符串或整数，成交量为整数，行可以有多余的列"""
+    rng = np.random.default_rng(n)
+    ts = BASE_TS + np.arange(n) * DAY_SECONDS
+    close = np.round(rng.uniform(0.01, 5000, n), 2)
+    volume = rng.integers(0, 10**6, n)
+    rows = [[str(t) if i % 3 else int(t), 0, float(c), 0, 0, int(v)] + [0] * (i % 2)
+            for i, (t, c, v) in enumerate(zip(ts.tolist(), close.tolist(), volume.tolist()))]
+    rows = json.loads(json.dumps(rows))
+    out = rows_to_array(rows)
+    assert out.dtype == KLINE_DTYPE
+    np.testing.assert_array_equal(out, rows_to_array_reference(rows))
@@ -0,0 +1,60 @@
+"""参数扫描：多进程结果与逐组计算一致，取消时不等待正在执行的任务"""
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from trading_strategy import sweep
+from trading_strategy.sweep import evaluate, param_grid, run_sweep
+
+# 慢任务的耗时（秒），取消后 run_sweep 应远早于此返回
+SLOW_SECONDS = 3
+
+
+def _run_chunk_slow(combos):
+    """sell_days 为 9 的组合所在批次模拟长时间运行"""
+    if any(combo[2] == 9 for combo in combos):
+        time.sleep(SLOW_SECONDS)
+    return [evaluate(sweep._worker_state['arrays'], *combo) for combo in combos]
+
+
+@pytest.fixture
+def grid():
+    return param_grid([4.0, 6.7], [0.03, 0.07], [2, 3, 5], [-0.09, -0.05])
+
+
+def test_workers_agree(grid, make_kline):
+    kline_df = make_kline(500, seed=1)
+    serial = run_sweep(kline_df, grid, max_workers=1)
+    parallel = run_sweep(kline_df, grid, max_workers=2, chunk_size=5)
+    pd.testing.assert_frame_equal(parallel, serial)
+    assert len(serial) == len(grid)
+
+
+def test_cancel_does_not_wait(make_kline, monkeypatch):
+    monkeypatch.setattr(sweep, '_run_chunk', _run_chunk_slow)
+    kline_df = make_kline(300, seed=2)
+    grid = param_grid([6.7], [0.07], [3, 9], [-0.05])
+    cancel = threading.Event()
+
+    start = time.monotonic()
+    table = run_sweep(kline_df, grid, max_workers=2, chunk_size=1, progress=lambda done, total: cancel.set(),
+                      cancel=cancel)
+    assert time.monotonic() - start < SLOW_SECONDS - 1
+    assert table['sell_days'].tolist() == [3]
+
+
+def test_interrupt_does_not_wait(make_kline, monkeypatch):
+    """界面重跑时进度回调抛出异常，同样不等待正在执行的任务"""
+    monkeypatch.setattr(sweep, '_run_chunk', _run_chunk_slow)
+    kline_df = make_kline(300, seed=3)
+    grid = param_grid([6.7], [0.07], [3, 9], [-0.05])
+
+    def interrupt(done, total):
+        raise KeyboardInterrupt
+
+    start = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        run_sweep(kline_df, grid, max_workers=2, chunk_size=1, progress=interrupt)
+    assert time.monotonic() - start < SLOW_SECONDS - 1
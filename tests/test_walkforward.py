@@ -0,0 +1,73 @@
+"""滚动优化"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from trading_strategy import walkforward
+from trading_strategy.backtest import expand_trades, ledger_signals, strategy_arrays, trade_ledger
+from trading_strategy.constants import FIRST_BAR
+from trading_strategy.sweep import param_grid
+from trading_strategy.walkforward import run_window, walk_forward, window_returns
+
+# 慢窗口的耗时（秒），取消后 walk_forward 应远早于此返回
+SLOW_SECONDS = 3
+
+
+def _run_window_slow(window, grid, objective):
+    """第二个窗口模拟长时间运行"""
+    if window[0] > 0:
+        time.sleep(SLOW_SECONDS)
+    return run_window(walkforward._worker_state['arrays'], window, grid, objective)
+
+
+def window_reference(arrays, start, end, k0, bias_th, sell_days, sell_drop_th):
+    """整段历史上执行拓展策略、但 start 之前不买入，取 [start, end) 的日收益"""
+    close, ret, ma5, ma10, ma20 = (a[:end] for a in arrays)
+    buy_signal, take_profit, liquidate = ledger_signals(close, ma5, ma10, ma20, bias_th, sell_days, sell_drop_th)
+    buy_signal[:start] = False
+    trades = trade_ledger(buy_signal, take_profit, liquidate, 1 - np.exp(-k0 * bias_th))
+    full = np.full(end, np.nan)
+    full[FIRST_BAR:] = expand_trades(trades, ret)[1]
+    return full[start:end]
+
+
+@pytest.fixture
+def grid():
+    return param_grid([4.0, 6.7], [0.03, 0.07], [2, 3], [-0.05])
+
+
+@pytest.mark.parametrize('sell_days', [0, 3, 19, 20, 25, 40])
+@pytest.mark.parametrize('seed', range(5))
+def test_window_matches_full_history(seed, sell_days, make_kline, random_params):
+    """测试窗口从空仓开始，之后的交易与整段回测一致（包括 sell_days 大于 FIRST_BAR 时开头的清仓判断）"""
+    rng = np.random.default_rng(seed)
+    kline_df = make_kline(500, seed=seed)
+    arrays = strategy_arrays(kline_df)
+    params = dict(random_params(rng), sell_days=sell_days, sell_drop_th=-0.02)
+    for start in (0, 10, FIRST_BAR, 30, 100, 333):
+        end = start + int(rng.integers(1, 150))
+        assert np.array_equal(window_returns(arrays, start, end, **params),
+                              window_reference(arrays, start, end, **params), equal_nan=True), start
+
+
+def test_workers_agree(grid, make_kline):
+    kline_df = make_kline(600, seed=1)
+    serial = walk_forward(kline_df, grid, 200, 100, max_workers=1)
+    parallel = walk_forward(kline_df, grid, 200, 100, max_workers=2)
+    pd.testing.assert_frame_equal(parallel['returns'], serial['returns'])
+    pd.testing.assert_frame_equal(parallel['windows'], serial['windows'])
+
+
+def test_cancel_does_not_wait(grid, make_kline, monkeypatch):
+    monkeypatch.setattr(walkforward, '_run_window_task', _run_window_slow)
+    kline_df = make_kline(400, seed=2)
+    cancel = threading.Event()
+
+    start = time.monotonic()
+    result = walk_forward(kline_df, grid, 200, 100, max_workers=2, progress=lambda done, total: cancel.set(),
+                          cancel=cancel)
+    assert time.monotonic() - start < SLOW_SECONDS - 1
+    assert len(result['windows']) == 1
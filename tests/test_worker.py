@@ -0,0 +1,137 @@
+"""后台刷新任务：中途退出后重跑不重复写入，webhook 推送失败的信号保留到下次"""
+import json
+
+import numpy as np
+import pytest
+import requests
+
+from trading_strategy import worker
+from trading_strategy.backtest import backtest
+from trading_strategy.data import load_kline
+from trading_strategy.fetch import DAY_SECONDS
+from trading_strategy.results import ResultStore
+from trading_strategy.store import KLINE_DTYPE, KlineStore, day_start
+from trading_strategy.streaming import StrategyState
+from trading_strategy.worker import WebhookSink, process_source
+
+URL = 'http://example.invalid/kline?timestamp={}&maxTime={}'
+PARAMS = {'k0': 6.7, 'bias_th': 0.07, 'sell_days': 3, 'sell_drop_th': -0.05}
+
+
+def write_bars(store, kline_df, days_ago):
+    """把模拟K线写入存储，最后一根K线为 days_ago 天前"""
+    arr = np.empty(len(kline_df), dtype=KLINE_DTYPE)
+    arr['ts'] = day_start() - DAY_SECONDS * np.arange(len(kline_df) + days_ago - 1, days_ago - 1, -1)
+    arr['close'] = kline_df['close'].to_numpy()
+    arr['volume'] = kline_df['volume'].to_numpy()
+    store.write(URL, arr, int(arr['ts'][0]), int(arr['ts'][-1]) + DAY_SECONDS - 1)
+
+
+@pytest.fixture
+def stores(tmp_path):
+    return KlineStore(str(tmp_path / 'kline')), ResultStore(str(tmp_path / 'results'))
+
+
+def assert_results_complete(kline_store, result_store):
+    kline_df = load_kline(kline_store, URL, 0, day_start() - 1)
+    expected = backtest(kline_df, **PARAMS)
+    stored = result_store.backtest(URL)
+    assert stored.index.equals(expected.index)
+    for col in ('pos', 'ret', 'buy', 'sell'):
+        assert np.array_equal(stored[col].to_numpy(), expected[col].to_numpy(dtype=float), equal_nan=True), col
+
+
+def test_incremental_matches_backtest(stores, make_kline):
+    kline_store, result_store = stores
+    kline_df = make_kline(400, seed=1)
+    write_bars(kline_store, kline_df.iloc[:300], 101)
+    assert process_source('demo', URL, kline_store, result_store, PARAMS) == []
+    write_bars(kline_store, kline_df, 1)
+    process_source('demo', URL, kline_store, result_store, PARAMS)
+    assert_results_complete(kline_store, result_store)
+
+
+def test_crash_before_state_save(stores, make_kline, monkeypatch):
+    """追加结果之后、保存状态之前退出，重跑时不会重复追加"""
+    kline_store, result_store = stores
+    kline_df = make_kline(400, seed=2)
+    write_bars(kline_store, kline_df.iloc[:300], 101)
+    process_source('demo', URL, kline_store, result_store, PARAMS)
+    write_bars(kline_store, kline_df, 1)
+
+    def crash(self, path):
+        raise RuntimeError('进程退出')
+
+    with monkeypatch.context() as m:
+        m.setattr(StrategyState, 'save', crash)
+        with pytest.raises(RuntimeError):
+            process_source('demo', URL, kline_store, result_store, PARAMS)
+    signals = result_store.signals(URL)
+
+    events = process_source('demo', URL, kline_store, result_store, PARAMS)
+    assert_results_complete(kline_store, result_store)
+    # 信号同样不重复；重跑时第二批K线上的信号重新推送
+    assert np.array_equal(result_store.signals(URL), signals)
+    assert len(np.unique(signals['ts'])) == len(signals)
+    assert len(events) == int((signals['ts'] > day_start() - 101 * DAY_SECONDS).sum()) > 0
+
+
+def test_append_skips_stored_rows(stores, make_kline):
+    _, result_store = stores
+    bt_df = backtest(make_kline(200, seed=3))
+    result_store.append_backtest(URL, bt_df.iloc[:150])
+    result_store.append_backtest(URL, bt_df.iloc[100:])
+    result_store.append_backtest(URL, bt_df)
+    assert result_store.backtest(URL).index.equals(bt_df.index)
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'HTTP {self.status_code}')
+
+
+def fake_post(statuses, posted):
+    def post(url, json=None, timeout=None):
+        posted.append(json['signals'])
+        return FakeResponse(statuses.pop(0))
+    return post
+
+
+def test_webhook_retries(monkeypatch):
+    posted = []
+    monkeypatch.setattr(worker.requests, 'post', fake_post([500, 200], posted))
+    sink = WebhookSink('http://127.0.0.1:9/signals', retries=2, backoff=0)
+    sink.send([{'source': 'a'}])
+    assert posted == [[{'source': 'a'}]] * 2
+    assert sink.pending == []
+
+
+def test_webhook_keeps_failed_events(monkeypatch, tmp_path):
+    pending_path = str(tmp_path / 'pending.json')
+    posted = []
+    monkeypatch.setattr(worker.requests, 'post', fake_post([503, 503, 200], posted))
+    sink = WebhookSink('http://127.0.0.1:9/signals', retries=1, backoff=0, pending_path=pending_path)
+    with pytest.raises(requests.HTTPError):
+        sink.send([{'source': 'a'}])
+    with open(pending_path, encoding='utf-8') as f:
+        assert json.load(f) == [{'source': 'a'}]
+
+    # 进程重启后，保存的信号与新信号一起推送
+    sink = WebhookSink('http://127.0.0.1:9/signals', retries=1, backoff=0, pending_path=pending_path)
+    sink.send([{'source': 'b'}])
+    assert posted[-1] == [{'source': 'a'}, {'source': 'b'}]
+    assert sink.pending == []
+    assert not (tmp_path / 'pending.json').exists()
+
+
+def test_webhook_flushes_without_new_events(monkeypatch):
+    posted = []
+    monkeypatch.setattr(worker.requests, 'post', fake_post([200], posted))
+    sink = WebhookSink('http://127.0.0.1:9/signals', backoff=0)
+    sink.pending = [{'source': 'a'}]
+    sink.send([])
+    assert posted == [[{'source': 'a'}]]
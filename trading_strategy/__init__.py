@@ -0,0 +1,52 @@
+"""交易策略回测核心模块
+
+不依赖 Streamlit，可在批处理任务、测试或进程池中直接导入。子模块在首次访问对应名称时才加载，
+import trading_strategy 本身不会加载 pandas 等依赖。命令行用法见 python -m trading_strategy --help。
+"""
+import importlib
+
+# 公开名称 -> 所在子模块
+_EXPORTS = {
+    'KlineStore': 'store',
+    'KLINE_DTYPE': 'store',
+    'KlineFetcher': 'fetch',
+    'KlineFetchError': 'fetch',
+    'sync_store': 'fetch',
+    'get_kline': 'data',
+    'load_kline': 'data',
+    'parse_date_range': 'data',
+    'DATA_SOURCES': 'sources',
+    'load_sources': 'sources',
+    'backtest_fast': 'backtest',
+    'backtest_legacy': 'backtest',
+    'run_strategies': 'backtest',
+    't7_adjust': 'backtest',
+    'settle_flags': 'backtest',
+    'analyze_positions': 'signals',
+    'register_indicator': 'indicators',
+    'Strategy': 'rules',
+    'run_variants': 'rules',
+    'ml_backtest': 'ml',
+    'ModelStore': 'ml',
+    'get_risk': 'risk',
+    'risk_matrix': 'risk',
+    'rolling_risk': 'risk',
+    'METRIC_NAMES': 'constants',
+    'StrategyState': 'streaming',
+    'scan': 'scanner',
+    'ResultCache': 'result_cache',
+    'compute_result': 'result_cache',
+    'export_bytes': 'export',
+    'export_bundle': 'export',
+    'save_table': 'export',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
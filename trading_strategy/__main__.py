@@ -0,0 +1,129 @@
+"""命令行回测
+
+对一个数据源执行大盘走势、5/20基本策略和5/20拓展策略的回测，打印绩效指标，或写入 JSON/CSV 文件。
+
+用法：
+    python -m trading_strategy --source 水栽竹 --start 2024-01-01 --end 2024-06-30
+    python -m trading_strategy --url <K线接口地址> --k0 6.0 --output metrics.json
+    python -m trading_strategy --source 蝴蝶刀 --offline --returns returns.parquet
+    python -m trading_strategy --source 蝴蝶刀 --trace trace.json --profile
+    python -m trading_strategy --source 蝴蝶刀 --cache-dir data/result_cache
+    python -m trading_strategy --source 蝴蝶刀 --spec my_strategy.json
+    python -m trading_strategy --source 蝴蝶刀 --ml logistic --model-dir data/models
+"""
+import argparse
+import json
+import sys
+
+from . import perf
+from .constants import MODELS, STRATEGY_LABELS
+from .sources import DATA_SOURCES
+from .store import DEFAULT_STORE_DIR
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m trading_strategy', description='运行策略回测并输出绩效指标')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--source', choices=list(DATA_SOURCES), help='数据源名称')
+    source.add_argument('--url', help='K线接口地址（含 {} 占位符）')
+    parser.add_argument('--start', help='开始日期 YYYY-MM-DD，默认全部历史')
+    parser.add_argument('--end', help='结束日期 YYYY-MM-DD，默认今天')
+    parser.add_argument('--k0', type=float, default=6.7, help='止盈参数 k')
+    parser.add_argument('--bias-th', type=float, default=0.07, help='止盈阈值')
+    parser.add_argument('--sell-days', type=int, default=3, help='止损天数')
+    parser.add_argument('--sell-drop-th', type=float, default=-0.05, help='止损阈值')
+    parser.add_argument('--t-plus', type=int, metavar='N',
+                        help='按 T+N 结算：买入满 N 天后才能卖出（交易锁定期一般为 7），默认不启用')
+    parser.add_argument('--spec', action='append', default=[],
+                        help='声明式策略 JSON 文件（格式见 trading_strategy.rules），结果作为额外一列输出，可重复指定')
+    parser.add_argument('--ml', choices=list(MODELS),
+                        help='同时运行机器学习策略（需要 scikit-learn，keras 需要 TensorFlow），结果作为额外一列输出')
+    parser.add_argument('--ml-train-days', type=int, default=365, help='机器学习策略的训练窗口（K线数），默认 365')
+    parser.add_argument('--ml-test-days', type=int, default=90, help='机器学习策略的重新训练间隔（K线数），默认 90')
+    parser.add_argument('--model-dir', help='模型缓存目录，相同训练数据的模型直接读取（默认读取环境变量 MODEL_CACHE_DIR）')
+    parser.add_argument('--engine', choices=['fast', 'legacy'], default='fast', help='回测引擎')
+    parser.add_argument('--store-dir', default=DEFAULT_STORE_DIR, help='K线存储目录')
+    parser.add_argument('--cache-dir', help='回测结果缓存目录，相同K线和参数的回测直接读取缓存'
+                                               '（默认取环境变量 RESULT_CACHE_DIR，未设置时不缓存）')
+    parser.add_argument('--offline', action='store_true', help='只使用本地存储中的K线，不发起网络请求')
+    parser.add_argument('--output', help='把绩效指标写入文件，按扩展名选择 .json、.csv、.parquet 或 .arrow')
+    parser.add_argument('--returns', help='把三种策略的日收益写入该文件，按扩展名选择 .csv、.parquet 或 .arrow')
+    parser.add_argument('--trace', help='把各阶段耗时写入 Chrome trace 文件')
+    parser.add_argument('--profile', action='store_true', help='用 cProfile 分析本次运行，结果输出到 stderr')
+    return parser
+
+
+def metrics_table(ret_df):
+    """get_risk 指标整理为 策略 × 指标 的表"""
+    import pandas as pd
+
+    from .risk import get_risk
+
+    return pd.DataFrame(get_risk(ret_df), index=[STRATEGY_LABELS.get(c, c) for c in ret_df.columns])
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # 参数解析完成后再加载 pandas 等依赖，--help 可以立即返回
+    from .data import get_kline, load_kline, parse_date_range
+    from .export import save_table
+    from .fetch import KlineFetchError
+    from .result_cache import DEFAULT_CACHE_DIR, ResultCache
+    from .store import KlineStore
+
+    url = DATA_SOURCES[args.source] if args.source else args.url
+    store = KlineStore(args.store_dir)
+    with perf.recording(profile=args.profile) as recorder:
+        if args.offline:
+            kline_df = load_kline(store, url, *parse_date_range(args.start, args.end))
+        else:
+            try:
+                kline_df = get_kline(url, args.start, args.end, store)
+            except KlineFetchError as e:
+                raise SystemExit(f'获取数据出错: {e}')
+        if len(kline_df) <= 20:
+            raise SystemExit(f'K线数据不足（{len(kline_df)} 条），请调整日期范围')
+
+        cache = ResultCache(disk_dir=args.cache_dir or DEFAULT_CACHE_DIR)
+        _, result, _ = cache.get_or_compute(kline_df, args.k0, args.bias_th, args.sell_days, args.sell_drop_th,
+                                            args.engine, t_plus=args.t_plus)
+        ret_df = result['returns']
+        if args.spec:
+            from .rules import Strategy
+
+            ret_df = ret_df.copy()
+            for path in args.spec:
+                with open(path, encoding='utf-8') as f:
+                    strategy = Strategy(json.load(f))
+                ret_df[strategy.name] = strategy.returns(kline_df, args.t_plus)
+        if args.ml:
+            from .ml import MODEL_STORE, ModelStore, ml_returns
+
+            store = ModelStore(args.model_dir) if args.model_dir else MODEL_STORE
+            ret_df = ret_df.copy()
+            ret_df[f'机器学习（{MODELS[args.ml]}）'] = ml_returns(kline_df, args.ml, args.ml_train_days, args.ml_test_days,
+                                                            args.t_plus, store)
+        table = metrics_table(ret_df)
+
+    if args.trace:
+        recorder.save_trace(args.trace)
+    if args.profile:
+        print(recorder.profile_text, file=sys.stderr)
+
+    if args.returns:
+        save_table(ret_df, args.returns)
+    if args.output is None:
+        print(f'{args.source or url}：{kline_df.index[0]:%Y-%m-%d} 至 {kline_df.index[-1]:%Y-%m-%d}，共 {len(kline_df)} 条K线')
+        print(table.to_string(float_format=lambda x: f'{x:.2%}'))
+    elif args.output.endswith(('.csv', '.parquet', '.arrow')):
+        save_table(table, args.output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'source': args.source or url, 'bars': len(kline_df),
+                       'metrics': table.to_dict(orient='index')}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
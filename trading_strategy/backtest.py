@@ -0,0 +1,420 @@
+import numpy as np
+import pandas as pd
+
+from . import perf
+from .constants import FIRST_BAR, LOCK_DAYS
+from .indicators import INDICATOR_CACHE, moving_averages
+
+# 仓位管理参数：首次建仓、加仓（锁定天数 LOCK_DAYS 见 constants）
+ENTRY_LOT = 0.3
+ADD_LOT = 0.1
+# 持仓合计达到1后不再加仓，账本笔数有上限
+MAX_LOTS = int(np.ceil(1 / ADD_LOT)) + 2
+# 策略逻辑、参数含义或缓存结果的格式（列的类型）变化时加一，使缓存的旧回测结果失效
+# 2: positions 表改为分类 signal_type、int8 标志和 float32 均线
+STRATEGY_VERSION = 2
+
+
+def _ledger_sums(max_lots):
+    """预先计算持仓合计值
+
+    持仓账本只可能是"一笔0.3建仓 + 若干笔0.1加仓"，或者建仓已卖出后剩下的若干笔0.1加仓，
+    且卖出总是从最早的一笔开始。按旧实现 sum(list(pos.values())) 的相加顺序逐笔累加，
+    得到的浮点数与旧实现逐位相同。
+    """
+    with_entry = [0.0] * (max_lots + 1)
+    add_only = [0.0] * (max_lots + 1)
+    with_entry[0] = 0 + ENTRY_LOT
+    for m in range(1, max_lots + 1):
+        with_entry[m] = with_entry[m - 1] + ADD_LOT
+        add_only[m] = add_only[m - 1] + ADD_LOT if m > 1 else 0 + ADD_LOT
+    return with_entry, add_only
+
+
+# 交易账本：只记录发生买卖的K线。bar 为K线序号，pos 为当日仓位，hold 为之后没有交易时每天的仓位
+TRADE_DTYPE = np.dtype([('bar', '<i4'), ('buy', '<f8'), ('sell', '<f8'), ('pos', '<f8'), ('hold', '<f8')])
+
+
+def ledger_signals(close, ma5, ma10, ma20, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
+    """拓展策略的买入、止盈、清仓条件，返回三个布尔数组"""
+    idx = np.arange(len(close))
+
+    bias = close / ma5 - 1
+    # 清仓条件：sell_days 日跌幅超过阈值且跌破MA10
+    has_drop = idx >= sell_days
+    drop_ref = np.take(close, idx - sell_days, mode='wrap')
+    price_drop = np.where(has_drop, close / drop_ref - 1, 0)
+    liquidate = has_drop & (price_drop < sell_drop_th) & (close < ma10)
+
+    buy_signal = (ma5 > ma20) & (close > ma10) & (bias < bias_th)
+    take_profit = bias >= bias_th
+    return buy_signal, take_profit, liquidate
+
+
+def run_trades(close, ret, ma5, ma10, ma20, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, t_plus=None):
+    """在数组上执行拓展策略的仓位账本，返回交易账本（TRADE_DTYPE 结构化数组，只含有买卖的K线）"""
+    buy_signal, take_profit, liquidate = ledger_signals(close, ma5, ma10, ma20, bias_th, sell_days, sell_drop_th)
+    return trade_ledger(buy_signal, take_profit, liquidate, 1 - np.exp(-k0 * bias_th), t_plus)
+
+
+def trade_ledger(buy_signal, take_profit, liquidate, tp_ratio, t_plus=None):
+    """按买入/止盈/清仓条件执行仓位账本，返回交易账本（TRADE_DTYPE 结构化数组，只含有买卖的K线）
+
+    条件由调用方预先向量化计算，循环只维护仓位账本的状态；账本按K线数预先分配，
+    没有交易的K线不写入任何数据。止盈时卖出 tp_ratio 比例的仓位。
+    t_plus 为 None 时止盈只卖出满 LOCK_DAYS 天的仓位、清仓不受限制；
+    为 N 时按 T+N 结算，止盈和清仓都只能卖出满 N 天的仓位。
+    """
+    n = len(buy_signal)
+    buy_signal = np.asarray(buy_signal).tolist()
+    take_profit = np.asarray(take_profit).tolist()
+    liquidate = np.asarray(liquidate).tolist()
+
+    with_entry, add_only = _ledger_sums(MAX_LOTS)
+    lock_days = LOCK_DAYS if t_plus is None else t_plus
+
+    trades = np.empty(max(n - FIRST_BAR, 0), dtype=TRADE_DTYPE)
+    n_trades = 0
+
+    # 账本：lots 记录每笔仓位的买入日，head 之前的已卖出；has_entry 表示最早一笔是否为0.3建仓
+    lots = []
+    head = 0
+    has_entry = False
+    # 持仓合计只在交易后变化，按旧实现 sum(list(pos.values())) 的相加顺序取值
+    current_pos = 0
+
+    for i in range(FIRST_BAR, n):
+        count = len(lots) - head
+        buy = 0
+        sell = 0
+
+        if buy_signal[i]:
+            if count == 0:
+                lots.append(i)
+                has_entry = True
+                buy = ENTRY_LOT
+            elif current_pos < 1:
+                lots.append(i)
+                buy = ADD_LOT
+        elif count:
+            if liquidate[i] and t_plus is None:
+                sell = current_pos
+                head = len(lots)
+                has_entry = False
+            else:
+                # T+N 模式下清仓的目标为全部仓位，实际只卖出满 lock_days 天的部分
+                if liquidate[i]:
+                    sell_pos = current_pos
+                else:
+                    sell_pos = current_pos * tp_ratio if take_profit[i] else 0
+                # 从最早一笔开始卖出满 lock_days 天的仓位，直到卖出量达到 sell_pos
+                sold = 0
+                while head < len(lots) and i - lots[head] >= lock_days:
+                    sold = sold + (ENTRY_LOT if has_entry else ADD_LOT)
+                    has_entry = False
+                    head += 1
+                    if sold >= sell_pos:
+                        break
+                sell = sold
+
+        if buy or sell:
+            count = len(lots) - head
+            if count == 0:
+                hold = 0
+            elif has_entry:
+                hold = with_entry[count - 1]
+            else:
+                hold = add_only[count]
+            trades[n_trades] = (i, buy, sell, current_pos + buy - sell, hold)
+            n_trades += 1
+            current_pos = hold
+
+    return trades[:n_trades]
+
+
+def run_ledger(close, ret, ma5, ma10, ma20, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, t_plus=None):
+    """在数组上执行拓展策略的仓位账本，返回从第20根K线开始的 (pos, ret, buy, sell) 数组
+
+    由 run_trades 的交易账本展开为逐日数组：无交易日的仓位沿用上一笔交易之后的持仓。
+    """
+    trades = run_trades(close, ret, ma5, ma10, ma20, k0, bias_th, sell_days, sell_drop_th, t_plus)
+    return expand_trades(trades, ret)
+
+
+def expand_trades(trades, ret):
+    """把交易账本展开为从第20根K线开始的 (pos, ret, buy, sell) 逐日数组及是否有过买入/卖出"""
+    m = max(len(ret) - FIRST_BAR, 0)
+    rows = trades['bar'] - FIRST_BAR
+
+    previous = np.searchsorted(rows, np.arange(m)) - 1
+    pos_out = np.where(previous >= 0, trades['hold'][np.maximum(previous, 0)], 0.0) if len(rows) else np.zeros(m)
+    pos_out[rows] = trades['pos']
+    buy_out = np.zeros(m)
+    buy_out[rows] = trades['buy']
+    sell_out = np.zeros(m)
+    sell_out[rows] = trades['sell']
+    ret_out = pos_out * np.asarray(ret, dtype=float)[FIRST_BAR:]
+
+    return pos_out, ret_out, buy_out, sell_out, bool(buy_out.any()), bool(sell_out.any())
+
+
+def strategy_arrays(kline_df, cache=None):
+    """从指标缓存中取拓展策略用到的数组 (close, ret, ma5, ma10, ma20)"""
+    cache = INDICATOR_CACHE if cache is None else cache
+    ret, ma5, ma10, ma20 = cache.get_many(kline_df, [('ret', None), ('ma', 5), ('ma', 10), ('ma', 20)])
+    return kline_df['close'].to_numpy(dtype=float), ret, ma5, ma10, ma20
+
+
+def backtest_fast(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, t_plus=None):
+    """向量化回测，结果与逐行回测 backtest_legacy 逐位一致"""
+    return ledger_frame(kline_df, *run_ledger(*strategy_arrays(kline_df), k0, bias_th, sell_days, sell_drop_th, t_plus))
+
+
+def ledger_frame(kline_df, pos, ret_arr, buy, sell, any_buy, any_sell):
+    """把 run_ledger 的逐日数组整理为与 backtest_legacy 相同格式的DataFrame"""
+    index = kline_df.index[FIRST_BAR:].rename('date')
+    if isinstance(index, pd.DatetimeIndex):
+        # 与逐行回测一致，结果索引不带频率信息
+        index = pd.DatetimeIndex(index, freq=None)
+    result = pd.DataFrame({'pos': pos, 'ret': ret_arr, 'buy': buy, 'sell': sell}, index=index)
+    # 旧实现中从未买入/卖出时对应列为整数0
+    if not any_buy:
+        result['pos'] = result['pos'].astype('int64')
+        result['buy'] = result['buy'].astype('int64')
+    if not any_sell:
+        result['sell'] = result['sell'].astype('int64')
+    return result
+
+
+def t7_adjust(flag):
+    """t+7模式调整（逐行参考实现，用于核对 settle_flags）"""
+    for i in range(1, len(flag)):
+        if flag.iloc[i] > flag.iloc[i - 1]:
+            start = i
+        elif flag.iloc[i] < flag.iloc[i - 1] and i - start < 7:
+            flag.iloc[i] = 1
+    return flag
+
+
+def settle_flags(flag, lock_days=LOCK_DAYS):
+    """T+N 结算：买入后 lock_days 根K线内不能卖出，持仓信号提前变为0时顺延到锁定期满
+
+    lock_days=7 时与 t7_adjust 结果相同。按持仓段计算，不逐根K线循环：
+    每段持仓从买入日 s 一直持有到 s + lock_days 之后的第一个空仓信号；
+    锁定期内出现的新持仓段并入当前段，不重新计算锁定期。
+    flag 为0/1序列，开头的空值（shift 产生）视为空仓，开盘即持有时从第一根K线开始锁定；
+    空值位置原样保留。返回新的序列，不修改输入。
+    """
+    values = np.asarray(flag, dtype=float)
+    if lock_days <= 1 or len(values) == 0:
+        return flag.copy() if isinstance(flag, pd.Series) else values.copy()
+    held = values == 1
+    flat = values == 0
+    # 各持仓段的起点，以及锁定期满后的第一个空仓日（没有时为序列末尾）
+    starts = np.flatnonzero(held & ~np.concatenate([[False], held[:-1]]))
+    zeros = np.flatnonzero(flat)
+    ends = np.append(zeros, len(values))[np.searchsorted(zeros, starts + lock_days)]
+    # 每段结束后下一段的编号；被锁定期覆盖的段并入前一段，只沿段链跳转
+    following = np.searchsorted(starts, ends).tolist()
+    kept = []
+    k = 0
+    while k < len(starts):
+        kept.append(k)
+        k = following[k]
+    change = np.zeros(len(values) + 1, dtype=np.int64)
+    change[starts[kept]] += 1
+    change[ends[kept]] -= 1
+    locked = np.cumsum(change[:-1]) > 0
+    settled = np.where(locked & flat, 1.0, values)
+    if isinstance(flag, pd.Series):
+        return pd.Series(settled, index=flag.index, name=flag.name)
+    return settled
+
+
+@perf.timed('backtest')
+def backtest(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, engine='fast', t_plus=None):
+    """回测函数，增加仓位记录和买卖信号
+
+    engine='fast' 使用向量化回测引擎，engine='legacy' 使用逐行回测，两者结果一致。
+    t_plus=N 时按 T+N 结算，止盈和清仓都只能卖出买入满 N 天的仓位。
+    """
+    if engine == 'fast':
+        return backtest_fast(kline_df, k0, bias_th, sell_days, sell_drop_th, t_plus)
+    return backtest_legacy(kline_df, k0, bias_th, sell_days, sell_drop_th, t_plus)
+
+
+def backtest_legacy(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, t_plus=None):
+    """逐行回测（旧实现），用于核对向量化引擎的结果"""
+    lock_days = 7 if t_plus is None else t_plus
+    # 计算指标
+    ret = kline_df['close'].pct_change()
+    ma5 = kline_df['close'].rolling(5).mean()
+    ma10 = kline_df['close'].rolling(10).mean()
+    ma20 = kline_df['close'].rolling(20).mean()
+    # 执行回测
+    pos = {}
+    ret_ls = []
+
+    for i in range(19, len(kline_df)):
+        close = kline_df['close'].iloc[i]
+        bias = close / ma5.iloc[i] - 1
+
+        # 计算价格跌幅
+        price_drop = 0
+        ma10_break = False
+        if i >= sell_days:
+            drop_cal = kline_df['close'].iloc[i-sell_days]
+            price_drop = close / drop_cal - 1
+            ma10_break = close < ma10.iloc[i]
+
+        current_pos = sum(list(pos.values()))
+        buy = 0
+        sell = 0
+        sold_pos = 0
+
+        # 买入逻辑
+        if ma5.iloc[i] > ma20.iloc[i] and close > ma10.iloc[i] and bias < bias_th:
+            if not pos:
+                pos[i] = 0.3
+                buy = 0.3
+            elif current_pos < 1:
+                pos[i] = 0.1
+                buy = 0.1
+        # 卖出逻辑
+        else:
+            # 清仓条件：3日跌幅超5%且跌破MA10
+            if i >= sell_days and price_drop < sell_drop_th and ma10_break:
+                sell_pos = current_pos  # 全额卖出
+                for k in list(pos.keys()):  # 清空所有持仓
+                    if t_plus is not None and i - k < t_plus:  # T+N：未满 N 天的仓位不能卖出
+                        continue
+                    sold_pos += pos[k]
+                    del pos[k]
+            else:
+                # 保持原有止盈逻辑
+                sell_pos = current_pos * (1 - np.exp(-k0 * bias_th)) if bias >= bias_th else 0
+                for k in list(pos.keys()):
+                    if i - k >= lock_days:
+                        sold_pos += pos[k]
+                        del pos[k]
+                        if sold_pos >= sell_pos:
+                            break
+
+            sell = sold_pos
+
+        # 记录当日结果
+        ret_ls.append({
+            'date': kline_df.index[i],
+            'pos': current_pos + buy - sell,
+            'ret': (current_pos + buy - sell) * ret.iloc[i],
+            'buy': buy,
+            'sell': sell
+        })
+
+    return pd.DataFrame(ret_ls).set_index('date')
+
+
+def basic_returns(kline_df, cache=None, t_plus=None):
+    """ma5/20基本策略的日收益：前一日 MA5>MA20 且收盘价站上MA10 时持有
+
+    t_plus=N 时按 T+N 结算，买入后至少持有 N 天（见 settle_flags）。
+    """
+    ret = pd.Series((INDICATOR_CACHE if cache is None else cache).get(kline_df, 'ret'), index=kline_df.index)
+    ma5, ma10, ma20 = moving_averages(kline_df, [5, 10, 20], cache)
+    flag = ((ma5 > ma20) & (kline_df['close'] > ma10)).apply(int).shift()
+    if t_plus is not None:
+        flag = settle_flags(flag, t_plus)
+    return ret, ret * flag
+
+
+def run_strategies(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, engine='fast', t_plus=None):
+    """对一个数据源执行大盘走势、5/20基本策略和5/20拓展策略
+
+    返回 (ret_df, bt_df)：ret_df 为三种策略的日收益（列为 benchmark/basic/extended），
+    bt_df 为拓展策略的逐日仓位和买卖明细。t_plus=N 时两种策略都按 T+N 结算。
+    """
+    ret, basic = basic_returns(kline_df, t_plus=t_plus)
+    bt_df = backtest(kline_df, k0, bias_th, sell_days, sell_drop_th, engine, t_plus)
+    ret_df = pd.DataFrame({'benchmark': ret, 'basic': basic, 'extended': bt_df['ret']})
+    return ret_df, bt_df
+
+
+def run_ledger_panel(close, ret, ma5, ma10, ma20, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
+    """多资产版本的 run_ledger，输入为 (日期 × 资产) 二维数组
+
+    逐日循环，每一步在所有资产上向量化更新仓位账本，不按资产循环。
+    每一列的结果与对该列单独调用 run_ledger 逐位一致。返回 (pos, ret, buy, sell) 二维数组。
+    """
+    n, n_assets = close.shape
+    idx = np.arange(n)
+
+    bias = close / ma5 - 1
+    has_drop = (idx >= sell_days)[:, None]
+    drop_ref = np.take(close, idx - sell_days, axis=0, mode='wrap')
+    price_drop = np.where(has_drop, close / drop_ref - 1, 0)
+    liquidate = has_drop & (price_drop < sell_drop_th) & (close < ma10)
+    buy_signal = (ma5 > ma20) & (close > ma10) & (bias < bias_th)
+    take_profit = bias >= bias_th
+
+    tp_ratio = 1 - np.exp(-k0 * bias_th)
+    max_lots = MAX_LOTS
+    with_entry, add_only = (np.array(t) for t in _ledger_sums(max_lots))
+    # 从最早一笔开始卖出 k 笔(k=1..max_lots)时的卖出合计
+    sold_entry = with_entry[:max_lots]
+    sold_add = add_only[1:max_lots + 1]
+    lot_no = np.arange(1, max_lots + 1)
+    slots = np.arange(max_lots + 1)
+
+    m = max(n - FIRST_BAR, 0)
+    pos_out = np.zeros((m, n_assets))
+    ret_out = np.zeros((m, n_assets))
+    buy_out = np.zeros((m, n_assets))
+    sell_out = np.zeros((m, n_assets))
+
+    # 账本：days 每行左对齐记录该资产各笔仓位的买入日，count 为笔数
+    days = np.zeros((n_assets, max_lots + 1), dtype=np.int64)
+    count = np.zeros(n_assets, dtype=np.int64)
+    has_entry = np.zeros(n_assets, dtype=bool)
+    rows = np.arange(n_assets)
+
+    for j, i in enumerate(range(FIRST_BAR, n)):
+        current_pos = np.where(count == 0, 0.0,
+                               np.where(has_entry, with_entry[np.maximum(count - 1, 0)], add_only[count]))
+        signal = buy_signal[i]
+        selling = ~signal & (count > 0)
+
+        # 买入：空仓建仓0.3，未满仓加仓0.1
+        new_entry = signal & (count == 0)
+        adding = new_entry | (signal & (count > 0) & (current_pos < 1))
+        buy = np.where(new_entry, ENTRY_LOT, np.where(adding, ADD_LOT, 0.0))
+        days[rows[adding], count[adding]] = i
+        count = count + adding
+        has_entry = has_entry | new_entry
+
+        # 清仓
+        liq = selling & liquidate[i]
+        sell = np.where(liq, current_pos, 0.0)
+        count = np.where(liq, 0, count)
+        has_entry = has_entry & ~liq
+
+        # 止盈：从最早一笔开始卖出满 LOCK_DAYS 天的仓位，直到卖出量达到 sell_pos
+        tp = selling & ~liquidate[i]
+        if tp.any():
+            sell_pos = np.where(take_profit[i], current_pos * tp_ratio, 0)
+            eligible = ((days[:, :max_lots] <= i - LOCK_DAYS) & (slots[:max_lots] < count[:, None])).sum(axis=1)
+            sold_k = np.where(has_entry[:, None], sold_entry, sold_add)
+            enough = (lot_no <= eligible[:, None]) & (sold_k >= sell_pos[:, None])
+            k = np.where(tp, np.where(enough.any(axis=1), enough.argmax(axis=1) + 1, eligible), 0)
+            sold = np.where(k > 0, sold_k[rows, np.maximum(k - 1, 0)], 0.0)
+            sell = np.where(tp, sold, sell)
+            days = np.take_along_axis(days, np.minimum(slots + k[:, None], max_lots), axis=1)
+            count = count - k
+            has_entry = has_entry & (k == 0)
+
+        p = current_pos + buy - sell
+        pos_out[j] = p
+        ret_out[j] = p * ret[i]
+        buy_out[j] = buy
+        sell_out[j] = sell
+
+    return pos_out, ret_out, buy_out, sell_out
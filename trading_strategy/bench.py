@@ -0,0 +1,259 @@
+"""性能基准测试
+
+用可复现的合成数据（随机游走的收盘价和成交量）测量K线解析、回测、仓位信号、T+7调整和绩效指标计算，
+报告耗时、内存峰值和新增内存块数，并把结果追加到 JSON 历史文件，便于在不同提交之间比较。
+
+用法：
+    python -m trading_strategy.bench
+    python -m trading_strategy.bench --sizes 1k 10k --cases backtest get_risk --repeat 5
+    python -m trading_strategy.bench --compare   # 与历史文件中上一次的结果对比
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .backtest import backtest, run_strategies, settle_flags, t7_adjust
+from .data import kline_frame
+from .fetch import decode_page
+from .indicators import INDICATOR_CACHE, moving_averages
+from .risk import get_risk
+from .signals import analyze_positions
+from .store import DEFAULT_STORE_DIR, KLINE_DTYPE, pages_to_array, rows_to_array
+
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+DEFAULT_HISTORY = os.path.join(os.path.dirname(DEFAULT_STORE_DIR), 'bench_history.json')
+# 接口每页返回的K线数
+PAGE_SIZE = 100
+# 合成K线从 2000-01-01 开始、间隔1小时，100万根K线也在 pandas 可表示的日期范围内
+SYNTH_START = 946684800
+SYNTH_STEP = 3600
+MEAN_REVERSION = 0.001
+
+
+def synthetic_klines(n, seed=0, start_ts=SYNTH_START, step=SYNTH_STEP):
+    """生成 n 根随机游走K线，返回与本地存储相同格式的结构化数组"""
+    rng = np.random.default_rng(seed)
+    # 对数价格为缓慢均值回复的随机游走，规模很大时价格也不会漂移到0（收益为 inf）
+    log_price = 0.0
+    log_prices = []
+    for eps in rng.normal(0, 0.02, n).tolist():
+        log_price = (1 - MEAN_REVERSION) * log_price + eps
+        log_prices.append(log_price)
+    arr = np.empty(n, dtype=KLINE_DTYPE)
+    arr['ts'] = start_ts + step * np.arange(n, dtype=np.int64)
+    arr['close'] = np.round(100 * np.exp(log_prices), 2)
+    arr['volume'] = rng.poisson(rng.gamma(2.0, 200.0, n))
+    return arr
+
+
+def okskins_pages(arr, page_size=PAGE_SIZE):
+    """把K线整理为 OKskins 接口的 JSON 响应，按请求顺序（从最新一页往前）返回字节串列表
+
+    每页内按时间升序，每行为 [时间戳字符串, 0, 收盘价, 0, 0, 成交量]，与接口一致。
+    """
+    pages = []
+    for hi in range(len(arr), 0, -page_size):
+        chunk = arr[max(hi - page_size, 0):hi]
+        data = [[str(int(ts)), 0, float(close), 0, 0, int(volume)] for ts, close, volume in chunk.tolist()]
+        pages.append(json.dumps({'data': data}).encode('utf-8'))
+    return pages
+
+
+def parse_pages(pages, source=None):
+    """解析接口响应并构造K线DataFrame，与 get_kline 下载后的处理相同"""
+    return kline_frame(pages_to_array([decode_page(page) for page in pages]), source)
+
+
+def page_rows(pages):
+    """接口响应中的全部K线行，供单独测量 rows_to_array"""
+    return [row for page in pages for row in json.loads(page)['data']]
+
+
+def _fresh_frame(data):
+    """清空指标缓存后的K线DataFrame，每次测量都重新计算指标"""
+    INDICATOR_CACHE.invalidate()
+    return data['kline_df']
+
+
+# 测量项：名称 -> (准备函数, 被测函数, 默认的最大K线数)
+# 准备函数不计入耗时，返回被测函数的参数
+CASES = {
+    'get_kline': (lambda data: (data['pages'], data['source']), parse_pages, 1_000_000),
+    'rows_to_array': (lambda data: (page_rows(data['pages']),), rows_to_array, 1_000_000),
+    'backtest': (lambda data: (_fresh_frame(data),), backtest, 1_000_000),
+    'backtest_legacy': (lambda data: (_fresh_frame(data),),
+                        lambda df: backtest(df, engine='legacy'), 10_000),
+    'analyze_positions': (lambda data: (_fresh_frame(data),), analyze_positions, 1_000_000),
+    't7_adjust': (lambda data: (data['flag'].copy(),), t7_adjust, 100_000),
+    'settle_flags': (lambda data: (data['flag'],), settle_flags, 1_000_000),
+    'get_risk': (lambda data: (data['ret_df'],), get_risk, 1_000_000),
+}
+
+
+def prepare(n, seed=0):
+    """生成某一规模的全部输入数据"""
+    arr = synthetic_klines(n, seed)
+    source = f'synthetic-{n}-{seed}'
+    kline_df = kline_frame(arr, source)
+    INDICATOR_CACHE.invalidate()
+    ret_df, _ = run_strategies(kline_df)
+    # 与5/20基本策略相同的持仓标记，作为 t7_adjust / settle_flags 的输入
+    ma5, ma10, ma20 = moving_averages(kline_df, [5, 10, 20])
+    flag = ((ma5 > ma20) & (kline_df['close'] > ma10)).astype(int).shift()
+    INDICATOR_CACHE.invalidate()
+    return {
+        'source': source,
+        'pages': okskins_pages(arr),
+        'kline_df': kline_df,
+        'ret_df': ret_df,
+        'flag': flag,
+    }
+
+
+def measure(setup, func, data, repeat=3):
+    """测量一个用例：repeat 次耗时，再在 tracemalloc 下运行一次统计内存"""
+    times = []
+    for _ in range(repeat):
+        args = setup(data)
+        t0 = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - t0)
+
+    args = setup(data)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, 'filename')
+    del result
+
+    return {
+        'best_s': min(times),
+        'median_s': statistics.median(times),
+        'peak_bytes': peak,
+        # 运行结束后仍存活的新增内存块数及字节数（包括返回值）
+        'alloc_blocks': sum(s.count_diff for s in diff),
+        'alloc_bytes': sum(s.size_diff for s in diff),
+    }
+
+
+def run_benchmarks(sizes, cases, repeat=3, seed=0, max_bars=None, progress=None):
+    """按规模和用例运行基准测试，返回结果列表；超过用例最大K线数的组合跳过"""
+    results = []
+    for size in sizes:
+        n = SIZES[size]
+        data = None
+        for name in cases:
+            setup, func, limit = CASES[name]
+            limit = limit if max_bars is None else max_bars
+            if n > limit:
+                continue
+            if data is None:
+                data = prepare(n, seed)
+            # 规模很大时策略累积净值可能超出浮点范围，这里只关心耗时，不提示溢出
+            with np.errstate(over='ignore'):
+                row = {'case': name, 'size': size, 'bars': n, **measure(setup, func, data, repeat)}
+            results.append(row)
+            if progress is not None:
+                progress(row)
+    return results
+
+
+def _git_commit():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def append_history(path, record):
+    """把一次运行的结果追加到历史文件（先写临时文件再替换）"""
+    history = load_history(path)
+    history.append(record)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def format_row(row, baseline=None):
+    line = (f"{row['case']:<18} {row['size']:>5} {row['median_s'] * 1e3:>11.2f} {row['best_s'] * 1e3:>11.2f} "
+            f"{row['peak_bytes'] / 2 ** 20:>9.1f} {row['alloc_blocks']:>9}")
+    if baseline is not None:
+        line += f"  {baseline['median_s'] / row['median_s']:>6.2f}x"
+    return line
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m trading_strategy.bench', description='运行性能基准测试')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES), help='数据规模')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), help='测量项')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--max-bars', type=int, help='覆盖各测量项默认的最大K线数（逐行回测、T+7调整较慢）')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='结果历史文件')
+    parser.add_argument('--no-save', action='store_true', help='不写入历史文件')
+    parser.add_argument('--compare', action='store_true', help='与历史文件中上一次的结果对比（倍数 >1 表示变快）')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        history = load_history(args.history)
+        if history:
+            baseline = {(r['case'], r['size']): r for r in history[-1]['results']}
+            print(f"对比基准：{history[-1]['commit']} @ {history[-1]['time']}")
+
+    header = f"{'用例':<16} {'规模':>3} {'中位数(ms)':>8} {'最快(ms)':>9} {'峰值(MB)':>7} {'新增内存块':>5}"
+    print(header + ('  加速' if baseline else ''))
+
+    def report(row):
+        print(format_row(row, baseline.get((row['case'], row['size']))), flush=True)
+
+    results = run_benchmarks(args.sizes, args.cases, args.repeat, args.seed, args.max_bars, report)
+
+    if not args.no_save:
+        append_history(args.history, {
+            'commit': _git_commit(),
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'results': results,
+        })
+        print(f'结果已追加到 {args.history}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
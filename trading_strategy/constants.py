@@ -0,0 +1,53 @@
+"""策略常量
+
+界面和命令行直接使用的常量和参数取值，只依赖标准库。Streamlit 界面在首屏只从这里导入，
+不会因此加载 pandas；各计算模块也都从这里导入这些常量，不经由其他模块转手。
+"""
+import importlib.util
+import math
+
+# 锁定天数：拓展策略止盈只卖出持有满 LOCK_DAYS 天的仓位，也是 T+N 结算的默认 N
+LOCK_DAYS = 7
+# 第一根可以交易的K线（MA20 从第20根K线开始有值）
+FIRST_BAR = 19
+
+# 回测结果中的策略列及显示名称
+STRATEGY_NAMES = ['benchmark', 'basic', 'extended']
+STRATEGY_LABELS = {'benchmark': '大盘走势', 'basic': '5/20基本策略', 'extended': '5/20拓展策略'}
+
+# get_risk 返回的绩效指标名称
+METRIC_NAMES = ['总收益率', '年化收益', '波动率', 'Sharpe', '最大回撤', 'Calmar']
+# 界面上提供的滚动窗口（天）
+ROLLING_WINDOWS = [30, 90]
+
+# 参数扫描的参数名称
+PARAM_NAMES = ['k0', 'bias_th', 'sell_days', 'sell_drop_th']
+
+# 机器学习策略的可用模型：名称 -> 显示名称
+MODELS = {
+    'logistic': '逻辑回归',
+    'forest': '随机森林',
+    'gbdt': '梯度提升树',
+    'keras': 'TensorFlow 神经网络',
+}
+# 次日上涨概率不低于 BUY_THRESHOLD 时买入，不高于 SELL_THRESHOLD 时清仓
+BUY_THRESHOLD = 0.55
+SELL_THRESHOLD = 0.45
+
+
+def param_range(start, stop, step):
+    """闭区间 [start, stop] 上按 step 取值，step 为0时只取 start"""
+    if not step:
+        return [start]
+    count = int(math.floor((stop - start) / step + 1e-9)) + 1
+    return [round(start + step * i, 10) for i in range(max(count, 1))]
+
+
+def available_models():
+    """当前环境可用的模型"""
+    models = []
+    if importlib.util.find_spec('sklearn') is not None:
+        models += ['logistic', 'forest', 'gbdt']
+    if importlib.util.find_spec('tensorflow') is not None:
+        models.append('keras')
+    return models
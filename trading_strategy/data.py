@@ -0,0 +1,114 @@
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import perf
+from .fetch import KlineFetcher, sync_store
+from .indicators import INDICATOR_CACHE
+from .store import KlineStore
+
+
+def parse_date_range(start_date=None, end_date=None):
+    """把日期字符串转换为时间戳区间"""
+    end_ts = int(datetime.now().timestamp()) if end_date is None else int(datetime.strptime(end_date, '%Y-%m-%d').timestamp())
+    start_ts = 0 if start_date is None else int(datetime.strptime(start_date, '%Y-%m-%d').timestamp())
+    return start_ts, end_ts
+
+
+# 两个采样点之间最多只有一次时区偏移变化（夏令时切换间隔远大于一周）
+_OFFSET_PROBE = 7 * 86400
+
+
+def _utc_offset(ts):
+    return time.localtime(ts).tm_gmtoff
+
+
+def utc_offsets(ts):
+    """每个时间戳在本地时区相对 UTC 的偏移（秒）
+
+    只在时间范围内每周采样一次偏移，偏移变化处二分查找切换时刻，调用 localtime 的次数与K线数无关。
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    if len(ts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    lo, hi = int(ts.min()), int(ts.max())
+    starts = [lo]
+    offsets = [_utc_offset(lo)]
+    prev = lo
+    for probe in list(range(lo + _OFFSET_PROBE, hi, _OFFSET_PROBE)) + [hi]:
+        offset = _utc_offset(probe)
+        if offset != offsets[-1]:
+            # 在 (prev, probe] 内二分查找偏移切换的时刻
+            a, b = prev, probe
+            while b - a > 1:
+                m = (a + b) // 2
+                if _utc_offset(m) == offsets[-1]:
+                    a = m
+                else:
+                    b = m
+            starts.append(b)
+            offsets.append(offset)
+        prev = probe
+    return np.array(offsets, dtype=np.int64)[np.searchsorted(starts, ts, side='right') - 1]
+
+
+def local_datetimes(ts):
+    """时间戳数组转换为本地时间的日期索引，与逐个调用 datetime.fromtimestamp 的结果一致"""
+    ts = np.asarray(ts, dtype=np.int64)
+    return pd.DatetimeIndex((ts + utc_offsets(ts)).astype('datetime64[s]').astype('datetime64[ns]'), name='date')
+
+
+def compact_volume(volume):
+    """成交量都是 int32 范围内的整数时以 int32 保存（内存减半），否则保留浮点数"""
+    volume = np.asarray(volume, dtype=float)
+    limit = np.iinfo(np.int32).max
+    if np.all(np.isfinite(volume)) and np.all(np.abs(volume) <= limit) and np.array_equal(volume, np.trunc(volume)):
+        return volume.astype(np.int32)
+    return volume
+
+
+@perf.timed('dataframe.build')
+def kline_frame(arr, source=None):
+    """把存储中的K线结构化数组整理为以日期为索引的DataFrame
+
+    收盘价保留 float64，回测结果与逐行回测逐位一致；成交量尽量以 int32 保存。
+    """
+    if len(arr) == 0:
+        kline_df = pd.DataFrame(columns=['date', 'close', 'volume']).set_index('date')
+    else:
+        ts = arr['ts']
+        if np.any(ts[1:] < ts[:-1]):
+            arr = arr[np.argsort(ts, kind='stable')]
+        kline_df = pd.DataFrame(
+            {'close': arr['close'].astype(float), 'volume': compact_volume(arr['volume'])},
+            index=local_datetimes(arr['ts'])
+        )
+    # 记录数据源，指标缓存按数据源区分
+    kline_df.attrs['source'] = source
+    return kline_df
+
+
+def load_kline(store, url, start_ts=None, end_ts=None):
+    """从本地存储读取 [start_ts, end_ts] 内的K线"""
+    return kline_frame(store.read(url, start_ts, end_ts), url)
+
+
+def get_kline(url, start_date=None, end_date=None, store=None, fetcher=None):
+    """获取 [start_date, end_date] 内的K线（包含成交量），已下载的部分直接从本地存储读取
+
+    不依赖界面，下载出错时抛出 KlineFetchError（出错前已下载的K线仍会写入本地存储）。
+    """
+    store = KlineStore() if store is None else store
+    start_ts, end_ts = parse_date_range(start_date, end_date)
+    own_fetcher = fetcher is None
+    fetcher = KlineFetcher() if own_fetcher else fetcher
+    try:
+        errors = sync_store(store, fetcher, [url], start_ts, end_ts, on_update=INDICATOR_CACHE.invalidate)
+    finally:
+        if own_fetcher:
+            fetcher.close()
+    if errors:
+        raise errors[url]
+    return load_kline(store, url, start_ts, end_ts)
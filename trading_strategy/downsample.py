@@ -0,0 +1,74 @@
+"""长序列图表的降采样
+
+折线用 LTTB（Largest-Triangle-Three-Buckets）保留形状，柱状数据用分桶最小/最大值保留尖峰。
+只返回被选中的下标，调用方用下标同时取日期和数值。
+"""
+import numpy as np
+
+# 每条曲线最多绘制的点数，约等于图表的像素宽度
+MAX_POINTS = 2000
+
+
+def lttb_indices(x, y, n_out=MAX_POINTS):
+    """LTTB 降采样，返回保留点的下标（升序）；空值点不参与选择"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(np.isfinite(y))
+    if len(valid) <= n_out or n_out < 3:
+        return valid
+    xv, yv = x[valid], y[valid]
+    n = len(valid)
+    # 首尾两点固定，其余 n_out - 2 个桶均分中间的点
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    bucket_x = np.add.reduceat(xv[:n - 1], edges[:-1]) / np.diff(edges)
+    bucket_y = np.add.reduceat(yv[:n - 1], edges[:-1]) / np.diff(edges)
+    # 每个桶取与“上一个选中点、下一个桶的均值点”构成三角形面积最大的点
+    next_x = np.append(bucket_x[1:], xv[-1])
+    next_y = np.append(bucket_y[1:], yv[-1])
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = xv[a], yv[a]
+        area = np.abs((ax - next_x[i]) * (yv[lo:hi] - ay) - (ax - xv[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return valid[out]
+
+
+def minmax_indices(y, n_out=MAX_POINTS):
+    """分桶最小/最大值降采样，返回保留点的下标（升序），每个桶保留最小和最大的点"""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    n_buckets = max(n_out // 2, 1)
+    size = -(-n // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    lows = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highs = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    idx = np.unique(np.concatenate([[0, n - 1], lows, highs]))
+    return idx[idx < n]
+
+
+def downsample(series, n_out=MAX_POINTS, method='lttb'):
+    """对 Series 降采样，返回 (日期, 数值)；点数不超过 n_out 时原样返回
+
+    method: 'lttb' 适合折线，'minmax' 适合柱状数据
+    """
+    values = series.to_numpy(dtype=float)
+    if len(values) <= n_out:
+        return series.index, values
+    if method == 'lttb':
+        index = series.index
+        x = index.asi8 if hasattr(index, 'asi8') else np.arange(len(index))
+        idx = lttb_indices(x, values, n_out)
+    elif method == 'minmax':
+        idx = minmax_indices(values, n_out)
+    else:
+        raise ValueError(f'未知降采样方法: {method}')
+    return series.index[idx], values[idx]
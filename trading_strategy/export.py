@@ -0,0 +1,95 @@
+"""结果导出
+
+支持 CSV、Parquet 和 Arrow IPC 三种格式，以及把多张表打包为一个 zip 文件。
+CSV 按块写出，不在内存中拼出整张表的字符串；Parquet 和 Arrow IPC 保留列类型并用 zstd 压缩，
+需要安装 pyarrow，未安装时只提供 CSV。
+"""
+import importlib.util
+import io
+import os
+import zipfile
+
+# 导出格式：名称 -> (显示名称, 扩展名, MIME 类型)
+EXPORT_FORMATS = {
+    'csv': ('CSV', '.csv', 'text/csv'),
+    'parquet': ('Parquet', '.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('Arrow IPC', '.arrow', 'application/vnd.apache.arrow.file'),
+}
+# CSV 每块写出的行数，Arrow IPC 每个记录批的行数
+CHUNK_ROWS = 50_000
+
+
+def available_formats():
+    """当前环境可用的导出格式"""
+    if importlib.util.find_spec('pyarrow') is None:
+        return ['csv']
+    return list(EXPORT_FORMATS)
+
+
+def format_for_path(path):
+    """按扩展名确定导出格式，无法识别时为 CSV"""
+    ext = os.path.splitext(path)[1].lower()
+    for fmt, (_, fmt_ext, _) in EXPORT_FORMATS.items():
+        if ext == fmt_ext:
+            return fmt
+    return 'csv'
+
+
+def write_csv(df, f, chunk_rows=CHUNK_ROWS):
+    """把 df 按块以 UTF-8 写入二进制文件对象 f，内容与 df.to_csv() 相同，内存占用只与块大小有关"""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        f.write(df.iloc[start:start + chunk_rows].to_csv(header=start == 0).encode('utf-8'))
+
+
+def _arrow_table(df):
+    import pyarrow as pa
+
+    # Parquet / Arrow 要求列名为字符串
+    return pa.Table.from_pandas(df.rename(columns=str), preserve_index=True)
+
+
+def write_table(df, f, fmt='csv'):
+    """把 df 以 fmt 格式写入二进制文件对象 f"""
+    if fmt == 'csv':
+        write_csv(df, f)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        pq.write_table(_arrow_table(df), f, compression='zstd')
+    elif fmt == 'arrow':
+        import pyarrow as pa
+
+        table = _arrow_table(df)
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+        with pa.ipc.new_file(f, table.schema, options=options) as writer:
+            for batch in table.to_batches(max_chunksize=CHUNK_ROWS):
+                writer.write_batch(batch)
+    else:
+        raise ValueError(f'未知导出格式: {fmt}')
+
+
+def export_bytes(df, fmt='csv'):
+    """导出为 bytes，用于下载"""
+    buf = io.BytesIO()
+    write_table(df, buf, fmt)
+    return buf.getvalue()
+
+
+def export_bundle(tables, fmt='csv'):
+    """把 {文件名: DataFrame} 打包为 zip 并返回 bytes，每张表直接写入压缩包
+
+    Parquet / Arrow 已经压缩过，包内不再压缩；CSV 用 deflate 压缩。
+    """
+    compression = zipfile.ZIP_DEFLATED if fmt == 'csv' else zipfile.ZIP_STORED
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', compression=compression) as zf:
+        for name, df in tables.items():
+            with zf.open(name + EXPORT_FORMATS[fmt][1], 'w') as f:
+                write_table(df, f, fmt)
+    return buf.getvalue()
+
+
+def save_table(df, path):
+    """按扩展名选择格式，把 df 写入文件"""
+    with open(path, 'wb') as f:
+        write_table(df, f, format_for_path(path))
@@ -0,0 +1,213 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import perf
+from .store import pages_to_array, rows_to_array
+
+try:
+    # orjson 解析速度明显快于标准库，未安装时退回 json
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+DAY_SECONDS = 86400
+
+
+def decode_page(content):
+    """把接口响应直接解析为K线结构化数组"""
+    return rows_to_array(_loads(content)['data'])
+
+
+class KlineFetchError(Exception):
+    """K线下载失败，附带出错前已完整下载的部分（每页一个K线数组）"""
+
+    def __init__(self, message, pages=None, covered_lo=None):
+        super().__init__(message)
+        self.pages = pages or []
+        self.covered_lo = covered_lo
+
+
+class KlineFetcher:
+    """并发K线下载器
+
+    所有请求共用一个带连接池的 Session，同一数据源的多个分页窗口、多个数据源之间都可以并发下载。
+
+    参数：
+        max_concurrency: 同时进行的HTTP请求数上限
+        max_sources: 同时下载的数据源数上限
+        timeout: 单次请求超时（秒）
+        retries: 失败后的重试次数
+        backoff: 重试退避基数（秒），第 n 次重试等待 backoff * 2 ** n
+        rate_limit: 每秒最多发起的请求数，None 表示不限制
+    """
+
+    def __init__(self, max_concurrency=4, max_sources=4, timeout=10, retries=3, backoff=0.5,
+                 rate_limit=None, session=None):
+        self.max_concurrency = max_concurrency
+        self.max_sources = max_sources
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.rate_limit = rate_limit
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_sources, pool_maxsize=max_concurrency)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+        self._page_pool = ThreadPoolExecutor(max_concurrency, thread_name_prefix='kline-page')
+        self._rate_lock = threading.Lock()
+        self._next_request = 0.0
+        self.stats = {'requests': 0, 'retries': 0}
+
+    def close(self):
+        self._page_pool.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _wait_rate_limit(self):
+        if not self.rate_limit:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + 1.0 / self.rate_limit
+        if wait > 0:
+            time.sleep(wait)
+
+    def get_page(self, url, max_time):
+        """请求 max_time 及之前的一页K线，返回按时间升序的K线数组，失败时按指数退避重试"""
+        for attempt in range(self.retries + 1):
+            self._wait_rate_limit()
+            with self._rate_lock:
+                self.stats['requests'] += 1
+            try:
+                ts = int(time.time() * 1000)
+                with perf.span('http.page', max_time=max_time):
+                    response = self.session.get(url.format(ts, max_time), timeout=self.timeout)
+                perf.count('http.pages')
+                perf.count('http.bytes', len(response.content))
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.HTTPError(f'HTTP {response.status_code}', response=response)
+                response.raise_for_status()
+                with perf.span('json.decode'):
+                    return decode_page(response.content)
+            except (requests.RequestException, ValueError, KeyError, TypeError, IndexError) as e:
+                if attempt == self.retries:
+                    raise KlineFetchError(f'请求 {url.format("", max_time)} 失败: {e}') from e
+                with self._rate_lock:
+                    self.stats['retries'] += 1
+                perf.count('http.retries')
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _page_down(self, url, hi, lo, pages):
+        """从 hi 向前逐页下载直到越过 lo，返回已完整覆盖的起始时间戳"""
+        cursor = hi
+        while cursor >= lo:
+            try:
+                page = self.get_page(url, cursor)
+            except KlineFetchError as e:
+                raise KlineFetchError(str(e), pages, cursor + 1) from e
+            if len(page) == 0:
+                return lo
+            pages.append(page)
+            cursor = int(page['ts'][0]) - DAY_SECONDS
+        return lo
+
+    def fetch_range(self, url, start_ts, end_ts):
+        """下载 [start_ts, end_ts] 内的K线，返回 (各页K线数组列表, 已完整覆盖的起始时间戳)
+
+        先请求最新一页以得到每页跨度，之后把剩余区间切成若干窗口并发请求，越过 start_ts 后不再请求；
+        窗口之间若因数据缺失出现空隙，再逐页补齐。
+        """
+        pages = []
+        try:
+            first = self.get_page(url, end_ts)
+        except KlineFetchError as e:
+            raise KlineFetchError(str(e), pages, end_ts + 1) from e
+        if len(first) == 0:
+            return pages, start_ts
+        pages.append(first)
+        span = max(len(first), 1) * DAY_SECONDS
+        cursor = int(first['ts'][0]) - DAY_SECONDS
+
+        while cursor >= start_ts:
+            windows = []
+            hi = cursor
+            while hi >= start_ts and len(windows) < self.max_concurrency:
+                windows.append(hi)
+                hi -= span
+            futures = [self._page_pool.submit(self.get_page, url, w) for w in windows]
+
+            for i, future in enumerate(futures):
+                try:
+                    page = future.result()
+                except KlineFetchError as e:
+                    for f in futures[i + 1:]:
+                        f.cancel()
+                    raise KlineFetchError(str(e), pages, windows[i] + 1) from e
+                if len(page) == 0:
+                    # 更早的时间已没有数据
+                    for f in futures[i + 1:]:
+                        f.cancel()
+                    return pages, start_ts
+                pages.append(page)
+                cursor = int(page['ts'][0]) - DAY_SECONDS
+                # 补齐本窗口与下一个窗口之间的空隙
+                if i + 1 < len(windows) and cursor > windows[i + 1]:
+                    self._page_down(url, cursor, windows[i + 1] + 1, pages)
+                    cursor = windows[i + 1]
+
+        return pages, start_ts
+
+    def fetch_many(self, jobs):
+        """并发下载多个数据源，jobs 为 {名称: (url, start_ts, end_ts)}
+
+        返回 {名称: (各页K线数组列表, 已完整覆盖的起始时间戳) 或 KlineFetchError}
+        """
+        def run(job):
+            try:
+                return self.fetch_range(*job)
+            except KlineFetchError as e:
+                return e
+
+        with ThreadPoolExecutor(self.max_sources, thread_name_prefix='kline-source') as pool:
+            results = pool.map(run, jobs.values())
+            return dict(zip(jobs.keys(), results))
+
+
+def sync_store(store, fetcher, urls, start_ts, end_ts, on_update=None):
+    """把多个数据源在 [start_ts, end_ts] 内缺失的K线并发下载到本地存储
+
+    有新K线写入的数据源会调用 on_update(url)，例如用于清除该数据源的指标缓存。
+    返回 {url: KlineFetchError}，只包含下载出错的数据源。
+    """
+    jobs = {}
+    for url in urls:
+        for gap_lo, gap_hi in store.gaps(url, start_ts, end_ts):
+            jobs[(url, gap_lo, gap_hi)] = (url, gap_lo, gap_hi)
+
+    errors = {}
+    for (url, _, gap_hi), result in fetcher.fetch_many(jobs).items():
+        if isinstance(result, KlineFetchError):
+            errors[url] = result
+            pages, covered_lo = result.pages, result.covered_lo
+        else:
+            pages, covered_lo = result
+        store.write(url, pages_to_array(pages), covered_lo, gap_hi)
+        if pages and on_update is not None:
+            on_update(url)
+    return errors
@@ -0,0 +1,188 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import perf
+
+
+def data_fingerprint(kline_df):
+    """K线内容指纹：由日期索引、收盘价和成交量计算，K线有任何变化时指纹随之变化"""
+    h = hashlib.blake2b(digest_size=16)
+    index = kline_df.index
+    if isinstance(index, pd.DatetimeIndex):
+        h.update(index.asi8.tobytes())
+    else:
+        h.update(pd.util.hash_array(np.asarray(index)).tobytes())
+    for col in ('close', 'volume'):
+        if col in kline_df.columns:
+            h.update(np.ascontiguousarray(kline_df[col].to_numpy(dtype=float)).tobytes())
+    return h.hexdigest()
+
+
+# 指标注册表：名称 -> 计算函数 f(kline_df, window)，返回与K线等长的 Series 或数组
+INDICATORS = {}
+
+
+def register_indicator(name):
+    """注册指标的装饰器，注册后可在指标缓存和策略表达式中按名称使用"""
+    def decorator(func):
+        INDICATORS[name] = func
+        return func
+    return decorator
+
+
+@register_indicator('close')
+def _close(kline_df, window=None):
+    return kline_df['close']
+
+
+@register_indicator('volume')
+def _volume(kline_df, window=None):
+    return kline_df['volume']
+
+
+@register_indicator('ret')
+def _ret(kline_df, window=None):
+    return kline_df['close'].pct_change()
+
+
+@register_indicator('ma')
+def _ma(kline_df, window):
+    return kline_df['close'].rolling(window).mean()
+
+
+@register_indicator('ema')
+def _ema(kline_df, window):
+    return kline_df['close'].ewm(span=window, adjust=False).mean()
+
+
+@register_indicator('std')
+def _std(kline_df, window):
+    return kline_df['close'].rolling(window).std()
+
+
+@register_indicator('highest')
+def _highest(kline_df, window):
+    return kline_df['close'].rolling(window).max()
+
+
+@register_indicator('lowest')
+def _lowest(kline_df, window):
+    return kline_df['close'].rolling(window).min()
+
+
+@register_indicator('rsi')
+def _rsi(kline_df, window):
+    """Wilder RSI"""
+    delta = kline_df['close'].diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False).mean()
+    loss = (-delta).clip(lower=0).ewm(alpha=1 / window, adjust=False).mean()
+    return 100 - 100 / (1 + gain / loss)
+
+
+@register_indicator('vol_ma')
+def _vol_ma(kline_df, window):
+    return kline_df['volume'].astype(float).rolling(window).mean()
+
+
+def _pandas_ta(name):
+    """pandas-ta 中的同名指标（以收盘价和 length=window 调用），未安装 pandas-ta 或没有该指标时返回 None"""
+    try:
+        import pandas_ta
+    except ImportError:
+        return None
+    func = getattr(pandas_ta, name, None)
+    if not callable(func):
+        return None
+    return lambda kline_df, window: func(kline_df['close'], length=window)
+
+
+def _compute(kline_df, name, window):
+    func = INDICATORS.get(name) or _pandas_ta(name)
+    if func is None:
+        raise ValueError(f'未知指标: {name}')
+    return func(kline_df, window)
+
+
+class IndicatorCache:
+    """指标缓存，同一份K线上的均线等指标只计算一次
+
+    指标按名称从 INDICATORS 注册表中取计算函数。缓存键为 (数据源, K线内容指纹, 指标名, 窗口)，
+    按最近最少使用顺序在超出 max_bytes 时淘汰。
+    数据源有新K线写入时调用 invalidate(数据源) 清除该数据源的全部指标。
+    返回的数组为只读，使用方需要修改时请先复制。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, kline_df, specs, source=None):
+        """按 specs [(指标名, 窗口), ...] 顺序返回指标数组列表"""
+        if source is None:
+            source = kline_df.attrs.get('source')
+        fingerprint = data_fingerprint(kline_df)
+        results = []
+        for name, window in specs:
+            key = (source, fingerprint, name, window)
+            with self._lock:
+                values = self._entries.get(key)
+                if values is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+            if values is None:
+                with perf.span('indicator', indicator=name, window=window):
+                    values = np.array(_compute(kline_df, name, window), dtype=float)
+                values.flags.writeable = False
+                self._put(key, values)
+                perf.count('indicator.misses')
+            else:
+                perf.count('indicator.hits')
+            results.append(values)
+        return results
+
+    def get(self, kline_df, name, window=None, source=None):
+        """返回单个指标数组"""
+        return self.get_many(kline_df, [(name, window)], source)[0]
+
+    def _put(self, key, values):
+        with self._lock:
+            self.misses += 1
+            if key in self._entries:
+                return
+            self._entries[key] = values
+            self._nbytes += values.nbytes
+            while self._nbytes > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self._nbytes -= old.nbytes
+
+    def invalidate(self, source=None):
+        """清除某个数据源（默认全部）的缓存指标"""
+        with self._lock:
+            for key in [k for k in self._entries if source is None or k[0] == source]:
+                self._nbytes -= self._entries.pop(key).nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+
+# 进程内共享的默认指标缓存
+INDICATOR_CACHE = IndicatorCache()
+
+
+def moving_averages(kline_df, windows, cache=None):
+    """从指标缓存中取多个窗口的均线，返回与 windows 对应的 Series 列表"""
+    cache = INDICATOR_CACHE if cache is None else cache
+    arrays = cache.get_many(kline_df, [('ma', w) for w in windows])
+    return [pd.Series(a, index=kline_df.index, name='close') for a in arrays]
@@ -0,0 +1,275 @@
+"""机器学习策略
+
+由收盘价和成交量生成特征（滞后收益、均线比值、乖离率、成交量 z 分数），用 scikit-learn 模型
+（可选 TensorFlow，只用 CPU）预测次日涨跌，按滚动窗口定期重新训练。预测概率作为买入/清仓条件，
+与拓展策略共用同一个仓位账本，得到与 backtest() 格式相同的逐日 pos/ret/buy/sell。
+
+特征由滑动窗口视图批量计算，不逐行复制数据。训练好的模型按训练数据的内容指纹缓存，
+指定 disk_dir 后写入磁盘；K线追加新数据后，历史窗口的模型直接复用，只训练新窗口。
+scikit-learn 和 TensorFlow 只在训练时才导入。
+"""
+import hashlib
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import perf
+from .backtest import expand_trades, ledger_frame, trade_ledger
+from .constants import BUY_THRESHOLD, FIRST_BAR, SELL_THRESHOLD
+from .indicators import INDICATOR_CACHE, data_fingerprint
+from .store import _replace_file
+from .walkforward import make_windows
+
+# 滞后收益的天数：ret_0 为当日收益，ret_1 为前一日收益……
+LAGS = 5
+# 成交量 z 分数的窗口
+VOLUME_WINDOW = 20
+FEATURE_NAMES = [f'ret_{k}' for k in range(LAGS)] + [
+    'bias', 'close_ma10', 'close_ma30', 'ma5_ma20', 'ma10_ma30', 'volume_z'
+]
+# 计算全部特征需要的历史K线数
+FEATURE_WARMUP = 30
+# 特征或标签定义变化时加一，使缓存的旧模型失效
+ML_VERSION = 1
+# 模型缓存目录，设置环境变量 MODEL_CACHE_DIR 后启用，默认只缓存在内存中
+DEFAULT_MODEL_DIR = os.environ.get('MODEL_CACHE_DIR')
+
+
+def feature_matrix(kline_df, cache=None):
+    """(K线数 × 特征数) 的特征矩阵，列与 FEATURE_NAMES 对应；第 t 行只用到第 t 天及之前的数据，历史不足时为空"""
+    cache = INDICATOR_CACHE if cache is None else cache
+    ret, ma5, ma10, ma20, ma30 = cache.get_many(kline_df, [('ret', None), ('ma', 5), ('ma', 10), ('ma', 20), ('ma', 30)])
+    close = kline_df['close'].to_numpy(dtype=float)
+    volume = kline_df['volume'].to_numpy(dtype=float)
+    n = len(close)
+    out = np.full((n, len(FEATURE_NAMES)), np.nan)
+
+    # 滞后收益：长度为 LAGS 的滑动窗口视图倒序排列即为 ret_0..ret_{LAGS-1}
+    if n >= LAGS:
+        out[LAGS - 1:, :LAGS] = sliding_window_view(ret, LAGS)[:, ::-1]
+    out[:, LAGS] = close / ma5 - 1
+    out[:, LAGS + 1] = close / ma10 - 1
+    out[:, LAGS + 2] = close / ma30 - 1
+    out[:, LAGS + 3] = ma5 / ma20 - 1
+    out[:, LAGS + 4] = ma10 / ma30 - 1
+    # 成交量 z 分数：当日成交量相对最近 VOLUME_WINDOW 天（含当日）的偏离，成交量不变时为0
+    if n >= VOLUME_WINDOW:
+        windows = sliding_window_view(volume, VOLUME_WINDOW)
+        std = windows.std(axis=1, ddof=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[VOLUME_WINDOW - 1:, -1] = np.where(std > 0, (volume[VOLUME_WINDOW - 1:] - windows.mean(axis=1)) / std, 0.0)
+    return out
+
+
+def labels(kline_df, cache=None):
+    """第 t 行的标签：第 t+1 天是否上涨；最后一行没有标签，为空"""
+    ret = (INDICATOR_CACHE if cache is None else cache).get(kline_df, 'ret')
+    y = np.full(len(ret), np.nan)
+    y[:-1] = ret[1:] > 0
+    y[:-1][np.isnan(ret[1:])] = np.nan
+    return y
+
+
+class _ConstantModel:
+    """训练数据只有一个类别时使用：预测概率固定为训练集中上涨的比例"""
+
+    def __init__(self, p):
+        self.p = p
+
+    def predict_proba(self, x):
+        return np.column_stack([np.full(len(x), 1 - self.p), np.full(len(x), self.p)])
+
+
+class _KerasModel:
+    """TensorFlow 全连接网络，接口与 scikit-learn 分类器相同；只用 CPU，可以序列化"""
+
+    def __init__(self, epochs=20, batch_size=64):
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.weights = None
+        self.scale = None
+
+    def _build(self, n_features):
+        os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+        import tensorflow as tf
+
+        model = tf.keras.Sequential([
+            tf.keras.Input(shape=(n_features,)),
+            tf.keras.layers.Dense(32, activation='relu'),
+            tf.keras.layers.Dense(16, activation='relu'),
+            tf.keras.layers.Dense(1, activation='sigmoid'),
+        ])
+        model.compile(optimizer='adam', loss='binary_crossentropy')
+        return model
+
+    def fit(self, x, y):
+        self.scale = (x.mean(axis=0), x.std(axis=0) + 1e-12)
+        model = self._build(x.shape[1])
+        model.fit((x - self.scale[0]) / self.scale[1], y, epochs=self.epochs, batch_size=self.batch_size, verbose=0)
+        self.weights = model.get_weights()
+        return self
+
+    def predict_proba(self, x):
+        model = self._build(x.shape[1])
+        model.set_weights(self.weights)
+        p = model.predict((x - self.scale[0]) / self.scale[1], verbose=0)[:, 0]
+        return np.column_stack([1 - p, p])
+
+
+def make_model(name='logistic'):
+    """创建未训练的模型"""
+    if name == 'keras':
+        return _KerasModel()
+    if name == 'logistic':
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        return make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+    if name == 'forest':
+        from sklearn.ensemble import RandomForestClassifier
+
+        return RandomForestClassifier(n_estimators=200, min_samples_leaf=20, n_jobs=1, random_state=0)
+    if name == 'gbdt':
+        from sklearn.ensemble import HistGradientBoostingClassifier
+
+        return HistGradientBoostingClassifier(max_iter=200, learning_rate=0.05, random_state=0)
+    raise ValueError(f'未知模型: {name}')
+
+
+def fit_model(name, x, y):
+    """训练模型；训练数据只有一个类别时返回固定概率的模型"""
+    if len(np.unique(y)) < 2:
+        return _ConstantModel(float(y.mean()) if len(y) else 0.5)
+    return make_model(name).fit(x, y)
+
+
+class ModelStore:
+    """已训练模型的缓存，键为 (训练数据内容指纹, 训练区间, 模型名称, 特征版本)
+
+    内存中保留本进程训练或读取过的模型；指定 disk_dir 时同时写入磁盘，进程重启后仍可复用。
+    """
+
+    def __init__(self, disk_dir=None):
+        self.disk_dir = disk_dir
+        self._models = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        name = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.disk_dir, name + '.model.pkl')
+
+    def get(self, key):
+        """取缓存的模型，都没有时返回 None"""
+        with self._lock:
+            model = self._models.get(key)
+        if model is not None or self.disk_dir is None or not os.path.exists(self._path(key)):
+            return model
+        try:
+            with open(self._path(key), 'rb') as f:
+                stored_key, model = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError):
+            return None
+        if stored_key != key:
+            return None
+        with self._lock:
+            self._models[key] = model
+        return model
+
+    def put(self, key, model):
+        with self._lock:
+            self._models[key] = model
+        if self.disk_dir is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            # 多个会话可能同时训练同一个窗口，各自使用独立的临时文件
+            _replace_file(self._path(key), lambda f: pickle.dump((key, model), f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def get_or_fit(self, key, name, x, y):
+        """返回缓存的模型，没有时训练并写入缓存"""
+        model = self.get(key)
+        if model is not None:
+            self.hits += 1
+            perf.count('model_cache.hits')
+            return model
+        self.misses += 1
+        perf.count('model_cache.misses')
+        with perf.span('ml.fit', model=name, rows=len(y)):
+            model = fit_model(name, x, y)
+        self.put(key, model)
+        return model
+
+    def __len__(self):
+        return len(self._models)
+
+
+# 进程内共享的默认模型缓存
+MODEL_STORE = ModelStore(DEFAULT_MODEL_DIR)
+
+
+@perf.timed('ml.predict')
+def walk_forward_predict(kline_df, model='logistic', train_bars=365, test_bars=90, store=None, cache=None):
+    """滚动训练并预测，返回每根K线收盘后预测的次日上涨概率（第一个测试窗口之前为空）
+
+    每个窗口用 [训练起点, 测试起点) 内已知标签的K线训练，预测测试窗口内每天的次日涨跌：
+    第 t 天的预测只用到第 t 天及之前的数据。
+    """
+    store = MODEL_STORE if store is None else store
+    x = feature_matrix(kline_df, cache)
+    y = labels(kline_df, cache)
+    valid = np.isfinite(x).all(axis=1)
+    proba = np.full(len(x), np.nan)
+
+    for start, test_start, end in make_windows(len(x), train_bars, test_bars):
+        # 训练行的标签（次日涨跌）必须在测试起点之前已知
+        rows = np.arange(start, test_start - 1)
+        rows = rows[valid[rows] & ~np.isnan(y[rows])]
+        # 模型由训练数据决定：以训练所用K线（含特征需要的历史）的内容指纹，以及训练区间在这段K线中的位置为键。
+        # 训练起点不足 FEATURE_WARMUP 时这段K线从第一根开始，同一段K线可能对应不同的训练区间，只用指纹会误用其他窗口的模型
+        lo = max(start - FEATURE_WARMUP, 0)
+        history = kline_df.iloc[lo:test_start]
+        key = (data_fingerprint(history), start - lo, test_start - lo, model, tuple(FEATURE_NAMES), ML_VERSION)
+        fitted = store.get_or_fit(key, model, x[rows], y[rows].astype(int))
+
+        # 测试窗口 [test_start, end) 的持仓由前一天收盘后的预测决定
+        pred_rows = np.arange(test_start - 1, end - 1)
+        pred_rows = pred_rows[valid[pred_rows]]
+        if len(pred_rows):
+            proba[pred_rows] = fitted.predict_proba(x[pred_rows])[:, 1]
+    return proba
+
+
+def ml_signals(proba, buy_threshold=BUY_THRESHOLD, sell_threshold=SELL_THRESHOLD):
+    """由次日上涨概率得到账本的 (买入, 止盈, 清仓) 条件：第 t 天按第 t-1 天收盘后的预测交易"""
+    prev = np.full(len(proba), np.nan)
+    prev[1:] = proba[:-1]
+    entry = prev >= buy_threshold
+    liquidate = prev <= sell_threshold
+    return entry, np.zeros(len(proba), dtype=bool), liquidate
+
+
+def ml_backtest(kline_df, model='logistic', train_bars=365, test_bars=90, buy_threshold=BUY_THRESHOLD,
+                sell_threshold=SELL_THRESHOLD, t_plus=None, store=None, cache=None):
+    """机器学习策略回测，返回与 backtest() 格式相同的逐日 pos/ret/buy/sell
+
+    预测概率作为买入和清仓条件，按拓展策略的仓位账本分批建仓和卖出（不使用止盈条件）；
+    概率介于两个阈值之间时与拓展策略不满足买入条件时相同，每天卖出一笔已满锁定期的仓位。
+    """
+    proba = walk_forward_predict(kline_df, model, train_bars, test_bars, store, cache)
+    entry, take_profit, liquidate = ml_signals(proba, buy_threshold, sell_threshold)
+    ret = (INDICATOR_CACHE if cache is None else cache).get(kline_df, 'ret')
+    trades = trade_ledger(entry, take_profit, liquidate, 0.0, t_plus)
+    return ledger_frame(kline_df, *expand_trades(trades, ret))
+
+
+def ml_returns(kline_df, model='logistic', train_bars=365, test_bars=90, t_plus=None, store=None):
+    """与K线等长的机器学习策略日收益 Series，与 run_strategies 的 extended 列对齐"""
+    bt_df = ml_backtest(kline_df, model, train_bars, test_bars, t_plus=t_plus, store=store)
+    full = np.full(len(kline_df), np.nan)
+    full[FIRST_BAR:] = bt_df['ret'].to_numpy(dtype=float)
+    return pd.Series(full, index=kline_df.index, name=f'ML-{model}')
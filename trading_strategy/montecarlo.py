@@ -0,0 +1,158 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from .backtest import run_ledger_panel, strategy_arrays
+from .constants import FIRST_BAR, STRATEGY_NAMES
+from .risk import risk_matrix
+
+# 稳健性检验关注的指标
+MC_METRICS = ['Sharpe', '最大回撤', 'Calmar']
+
+
+def block_bootstrap(ret, n_paths, block_size, rng):
+    """循环块自助法重采样日收益，返回 (日期 × 路径) 的收益矩阵，第一行为空（与 pct_change 一致）
+
+    每条路径由若干段长度为 block_size 的连续收益拼接而成，段的起点随机，越过末尾时回到开头，
+    保留了块内的波动聚集和自相关。
+    """
+    ret = np.asarray(ret, dtype=float)
+    sample = ret[1:][np.isfinite(ret[1:])]
+    n = len(ret)
+    if len(sample) == 0:
+        raise ValueError('没有可用于重采样的收益数据')
+    block_size = max(1, min(int(block_size), len(sample)))
+    n_blocks = -(-(n - 1) // block_size)
+    starts = rng.integers(0, len(sample), size=(n_blocks, n_paths))
+    offsets = np.arange(block_size)
+    # (块, 块内位置, 路径) -> 样本下标，展平后截取 n-1 天
+    idx = (starts[:, None, :] + offsets[None, :, None]) % len(sample)
+    out = np.empty((n, n_paths))
+    out[0] = np.nan
+    out[1:] = sample[idx.reshape(-1, n_paths)[:n - 1]]
+    return out
+
+
+def simulate_paths(close0, path_ret, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05,
+                   trade_noise=0.0, rng=None):
+    """在一批收益路径（日期 × 路径）上同时执行三种策略，返回 {策略: (日期 × 路径) 日收益}
+
+    trade_noise > 0 时，在仓位变化的日子按换手量加入标准差为 trade_noise 的随机收益扰动，模拟进出场价格的偶然偏差。
+    """
+    n, n_paths = path_ret.shape
+    growth = np.nan_to_num(path_ret, nan=0.0) + 1
+    close = close0 * np.cumprod(growth, axis=0)
+    frame = pd.DataFrame(close)
+    ma5, ma10, ma20 = (frame.rolling(win).mean().to_numpy() for win in (5, 10, 20))
+
+    # ma5/20基本策略
+    flag = ((ma5 > ma20) & (close > ma10)).astype(float)
+    flag = np.vstack([np.full((1, n_paths), np.nan), flag[:-1]])
+    basic = path_ret * flag
+
+    # ma5/20拓展策略
+    extended = np.full((n, n_paths), np.nan)
+    _, ext_ret, buy, sell = run_ledger_panel(close, path_ret, ma5, ma10, ma20, k0, bias_th, sell_days, sell_drop_th)
+    extended[FIRST_BAR:] = ext_ret
+
+    if trade_noise > 0:
+        rng = np.random.default_rng() if rng is None else rng
+        basic_turnover = np.abs(np.diff(np.nan_to_num(flag), axis=0, prepend=0))
+        basic = basic + basic_turnover * rng.normal(0, trade_noise, basic.shape)
+        extended[FIRST_BAR:] += (buy + sell) * rng.normal(0, trade_noise, ext_ret.shape)
+
+    return {'benchmark': path_ret, 'basic': basic, 'extended': extended}
+
+
+def _simulate_chunk(close0, ret, n_paths, block_size, params, trade_noise, seed):
+    """生成一批路径并返回各策略在每条路径上的指标 {策略: {指标: 数组}}"""
+    rng = np.random.default_rng(seed)
+    path_ret = block_bootstrap(ret, n_paths, block_size, rng)
+    returns = simulate_paths(close0, path_ret, *params, trade_noise=trade_noise, rng=rng)
+    result = {}
+    for name, values in returns.items():
+        metrics = risk_matrix(values)
+        result[name] = {metric: metrics[metric].to_numpy() for metric in MC_METRICS}
+    return result
+
+
+def monte_carlo(kline_df, n_paths=1000, block_size=20, trade_noise=0.0, k0=6.7, bias_th=0.07, sell_days=3,
+                sell_drop_th=-0.05, confidence=0.95, chunk_size=500, max_workers=None, seed=0,
+                progress=None, cancel=None):
+    """蒙特卡洛稳健性检验：对日收益做块自助重采样，在全部路径上批量执行三种策略
+
+    路径按 chunk_size 分批生成和计算，内存占用只与批大小有关；各批在进程池中并行。
+    每批的随机种子由 seed 派生，结果与进程数无关，可以复现。
+
+    返回 dict：
+        distributions: {策略: 路径 × 指标 的表}，指标为 Sharpe、最大回撤、Calmar
+        summary: (策略, 指标) × [实际值, 均值, 中位数, 下限, 上限] 的表，上下限为 confidence 置信区间
+        paths: 完成的路径数（取消时小于 n_paths）
+    """
+    close, ret = strategy_arrays(kline_df)[:2]
+    if len(close) <= FIRST_BAR + 1:
+        raise ValueError(f'K线数据不足：至少需要 {FIRST_BAR + 2} 根K线')
+    params = (k0, bias_th, int(sell_days), sell_drop_th)
+    sizes = [min(chunk_size, n_paths - i) for i in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(close[0], ret, size, block_size, params, trade_noise, s) for size, s in zip(sizes, seeds)]
+    max_workers = max_workers or os.cpu_count() or 1
+    chunks = {}
+
+    if max_workers == 1:
+        for i, job in enumerate(jobs):
+            if cancel is not None and cancel.is_set():
+                break
+            chunks[i] = _simulate_chunk(*job)
+            if progress:
+                progress(sum(sizes[j] for j in chunks), n_paths)
+    else:
+        pool = ProcessPoolExecutor(min(max_workers, len(jobs)))
+        pending = {pool.submit(_simulate_chunk, *job): i for i, job in enumerate(jobs)}
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunks[pending.pop(future)] = future.result()
+                if done and progress:
+                    progress(sum(sizes[j] for j in chunks), n_paths)
+                if cancel is not None and cancel.is_set():
+                    break
+        finally:
+            # 取消或出错（包括界面重跑中断）时丢弃尚未开始的批次，也不等待正在执行的批次完成
+            pool.shutdown(wait=not pending, cancel_futures=bool(pending))
+
+    # 按批次顺序拼接，保证结果与完成顺序无关
+    order = sorted(chunks)
+    distributions = {
+        name: pd.DataFrame({metric: np.concatenate([chunks[i][name][metric] for i in order]) if order else []
+                            for metric in MC_METRICS})
+        for name in STRATEGY_NAMES
+    }
+
+    # 实际路径上的指标作为参照
+    actual_ret = np.asarray(ret, dtype=float)[:, None]
+    actual = simulate_paths(close[0], actual_ret, *params)
+    lower_q, upper_q = (1 - confidence) / 2, 1 - (1 - confidence) / 2
+    rows = {}
+    for name in STRATEGY_NAMES:
+        actual_metrics = risk_matrix(actual[name]).iloc[0]
+        dist = distributions[name]
+        for metric in MC_METRICS:
+            values = dist[metric].to_numpy(dtype=float)
+            values = values[np.isfinite(values)]
+            rows[(name, metric)] = {
+                '实际值': actual_metrics[metric],
+                '均值': values.mean() if len(values) else np.nan,
+                '中位数': np.median(values) if len(values) else np.nan,
+                '下限': np.quantile(values, lower_q) if len(values) else np.nan,
+                '上限': np.quantile(values, upper_q) if len(values) else np.nan,
+            }
+
+    return {
+        'distributions': distributions,
+        'summary': pd.DataFrame.from_dict(rows, orient='index'),
+        'paths': sum(sizes[i] for i in order),
+    }
@@ -0,0 +1,180 @@
+"""运行耗时与计数统计
+
+核心函数通过 span()/count()/timed() 记录各阶段耗时和计数。只有在 recording() 期间才会真正记录，
+其余时候只多一次判断，几乎没有开销。记录结果可以汇总成表，也可以导出为 Chrome trace
+（在 chrome://tracing 或 https://ui.perfetto.dev 中打开）。
+
+    with recording(profile=True) as recorder:
+        kline_df = get_kline(url)
+        backtest(kline_df)
+    recorder.summary()
+    recorder.save_trace('trace.json')
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# 阶段名称及界面显示名称
+SPAN_LABELS = {
+    'http.page': 'HTTP请求',
+    'json.decode': 'JSON解析',
+    'dataframe.build': '构造DataFrame',
+    'indicator': '指标计算',
+    'backtest': '拓展策略回测',
+    'analyze_positions': '仓位信号分析',
+    'get_risk': '绩效指标',
+    'figure': '图表构建',
+    'result_cache.load': '读取缓存结果',
+    'scan': '全市场扫描',
+    'scan.load': '读取扫描K线',
+    'ml.fit': '模型训练',
+    'ml.predict': '滚动训练预测',
+}
+COUNTER_LABELS = {
+    'http.pages': 'HTTP页数',
+    'http.bytes': '接收字节数',
+    'http.retries': 'HTTP重试次数',
+    'indicator.hits': '指标缓存命中',
+    'indicator.misses': '指标缓存未命中',
+    'result_cache.hits': '结果缓存命中',
+    'result_cache.misses': '结果缓存未命中',
+    'model_cache.hits': '模型缓存命中',
+    'model_cache.misses': '模型缓存未命中',
+}
+
+
+class Recorder:
+    """记录各阶段的耗时区间和计数，可在多个线程中同时使用"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        # (名称, 开始时间, 耗时, 线程号, 附加参数)，时间单位为秒，开始时间相对 origin
+        self.spans = []
+        self.counters = {}
+        # (名称, 时间, 累计值)，用于在 trace 中画出计数曲线
+        self.counter_events = []
+        self.thread_names = {}
+        self.profile_text = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, args)
+
+    def add_span(self, name, start, duration, args=None):
+        thread = threading.current_thread()
+        with self._lock:
+            self.thread_names.setdefault(thread.ident, thread.name)
+            self.spans.append((name, start - self.origin, duration, thread.ident, args or {}))
+
+    def count(self, name, value=1):
+        with self._lock:
+            total = self.counters.get(name, 0) + value
+            self.counters[name] = total
+            self.counter_events.append((name, time.perf_counter() - self.origin, total))
+
+    def summary(self):
+        """按阶段汇总：[{name, calls, total_ms, mean_ms, max_ms}, ...]，按首次出现顺序"""
+        stats = {}
+        with self._lock:
+            spans = list(self.spans)
+        for name, _, duration, _, _ in sorted(spans, key=lambda s: s[1]):
+            calls, total, longest = stats.get(name, (0, 0.0, 0.0))
+            stats[name] = (calls + 1, total + duration, max(longest, duration))
+        return [
+            {'name': name, 'calls': calls, 'total_ms': total * 1e3, 'mean_ms': total * 1e3 / calls,
+             'max_ms': longest * 1e3}
+            for name, (calls, total, longest) in stats.items()
+        ]
+
+    def chrome_trace(self):
+        """导出为 Chrome trace 事件格式"""
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                for tid, name in self.thread_names.items()
+            ]
+            events += [
+                {'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+                 'ts': start * 1e6, 'dur': duration * 1e6, 'args': args}
+                for name, start, duration, tid, args in self.spans
+            ]
+            events += [
+                {'name': name, 'ph': 'C', 'pid': pid, 'ts': t * 1e6, 'args': {name: value}}
+                for name, t, value in self.counter_events
+            ]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'counters': dict(self.counters)}}
+
+    def trace_json(self):
+        return json.dumps(self.chrome_trace(), ensure_ascii=False, default=str)
+
+    def save_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.trace_json())
+
+
+# 当前正在记录的 Recorder；下载线程池中的线程也会记录到这里，因此不使用线程局部变量
+_active = None
+
+
+@contextmanager
+def recording(recorder=None, profile=False, profile_limit=30):
+    """在 with 块内把 span()/count() 记录到 recorder（默认新建一个）
+
+    profile=True 时同时用 cProfile 分析当前线程，按累计耗时排序的前 profile_limit 项写入 recorder.profile_text。
+    """
+    global _active
+    recorder = Recorder() if recorder is None else recorder
+    previous, _active = _active, recorder
+    profiler = cProfile.Profile() if profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield recorder
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(profile_limit)
+            recorder.profile_text = out.getvalue()
+        _active = previous
+
+
+def span(name, **args):
+    """记录一个阶段的耗时，未在记录时什么也不做"""
+    recorder = _active
+    if recorder is None:
+        return nullcontext()
+    return recorder.span(name, **args)
+
+
+def count(name, value=1):
+    """累加计数，未在记录时什么也不做"""
+    recorder = _active
+    if recorder is not None:
+        recorder.count(name, value)
+
+
+def timed(name):
+    """装饰器：把函数的每次调用记录为一个阶段"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _active
+            if recorder is None:
+                return func(*args, **kwargs)
+            with recorder.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
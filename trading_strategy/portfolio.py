@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from .backtest import run_ledger_panel
+from .constants import FIRST_BAR, STRATEGY_NAMES
+from .risk import get_risk, risk_matrix
+
+
+def align_closes(kline_dfs):
+    """把多个数据源的K线按日期对齐为 (日期 × 资产) 收盘价表
+
+    中途缺失的日期沿用前一日收盘价，资产上市前保持为空。
+    """
+    prices = pd.concat({name: df['close'] for name, df in kline_dfs.items()}, axis=1).sort_index()
+    return prices.ffill()
+
+
+def normalize_weights(assets, weights=None):
+    """资金权重归一化，未指定时等权"""
+    if weights is None:
+        w = np.ones(len(assets))
+    else:
+        w = np.array([float(weights.get(a, 0)) for a in assets])
+    total = w.sum()
+    if total <= 0:
+        raise ValueError('资金权重之和必须大于0')
+    return w / total
+
+
+def combine_returns(asset_ret, w):
+    """按资金权重合并各资产收益，未上市或尚无收益的资产视为持有现金；全部为空的日期保持为空"""
+    combined = np.nansum(asset_ret * w, axis=1)
+    return np.where(np.isnan(asset_ret).all(axis=1), np.nan, combined)
+
+
+def backtest_portfolio(prices, weights=None, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
+    """多资产组合回测，所有资产在同一次向量化计算中完成
+
+    参数：
+        prices: align_closes 返回的 (日期 × 资产) 收盘价表
+        weights: {资产: 资金权重}，默认等权
+
+    返回 dict：
+        returns: 组合的 benchmark/basic/extended 日收益
+        asset_returns: {策略: (日期 × 资产) 日收益}
+        metrics: 组合的 get_risk 指标
+        asset_metrics: {策略: 资产 × 指标 的 get_risk 指标表}
+    """
+    assets = list(prices.columns)
+    w = normalize_weights(assets, weights)
+
+    close = prices.to_numpy(dtype=float)
+    ret = close / np.vstack([np.full((1, len(assets)), np.nan), close[:-1]]) - 1
+    ma5, ma10, ma20 = (prices.rolling(win).mean().to_numpy(dtype=float) for win in (5, 10, 20))
+
+    # ma5/20基本策略
+    flag = ((ma5 > ma20) & (close > ma10)).astype(float)
+    flag = np.vstack([np.full((1, len(assets)), np.nan), flag[:-1]])
+    basic = ret * flag
+
+    # ma5/20拓展策略
+    extended = np.full_like(close, np.nan)
+    extended[FIRST_BAR:] = run_ledger_panel(close, ret, ma5, ma10, ma20, k0, bias_th, sell_days, sell_drop_th)[1]
+
+    asset_returns = {
+        name: pd.DataFrame(values, index=prices.index, columns=assets)
+        for name, values in zip(STRATEGY_NAMES, (ret, basic, extended))
+    }
+    returns = pd.DataFrame(
+        {name: combine_returns(df.to_numpy(), w) for name, df in asset_returns.items()},
+        index=prices.index
+    )
+    asset_metrics = {
+        name: risk_matrix(df)
+        for name, df in asset_returns.items()
+    }
+
+    return {
+        'returns': returns,
+        'asset_returns': asset_returns,
+        'weights': pd.Series(w, index=assets),
+        'metrics': get_risk(returns),
+        'asset_metrics': asset_metrics,
+    }
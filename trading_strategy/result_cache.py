@@ -0,0 +1,144 @@
+"""回测结果缓存
+
+同一份K线、同一组参数的回测只计算一次。缓存键为
+(数据源, K线内容指纹, k0, bias_th, sell_days, sell_drop_th, T+N 天数, 策略版本)，
+缓存内容为三种策略的日收益、累积收益、拓展策略逐日明细、仓位建议和绩效指标。
+内存中按最近最少使用顺序淘汰；指定 disk_dir 时同时写入磁盘，进程重启后仍可命中。
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from . import perf
+from .backtest import STRATEGY_VERSION, run_strategies
+from .indicators import data_fingerprint
+from .risk import get_risk
+from .signals import analyze_positions
+from .store import _replace_file
+
+# 磁盘缓存目录，设置环境变量 RESULT_CACHE_DIR 后启用，默认只缓存在内存中
+DEFAULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR')
+
+
+def result_key(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, source=None, t_plus=None):
+    """回测结果的缓存键；两个回测引擎的结果逐位相同，引擎不计入键"""
+    if source is None:
+        source = kline_df.attrs.get('source')
+    return (source, data_fingerprint(kline_df), float(k0), float(bias_th), int(sell_days), float(sell_drop_th),
+            None if t_plus is None else int(t_plus), STRATEGY_VERSION)
+
+
+def compute_result(kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, engine='fast', t_plus=None):
+    """执行一次完整回测
+
+    返回 dict：
+        returns: 三种策略的日收益
+        cumulative: 累积收益
+        backtest: 拓展策略的逐日仓位和买卖明细
+        positions: analyze_positions 的仓位建议
+        metrics: get_risk 指标
+    """
+    ret_df, bt_df = run_strategies(kline_df, k0, bias_th, sell_days, sell_drop_th, engine, t_plus)
+    return {
+        'returns': ret_df,
+        'cumulative': (ret_df + 1).cumprod() - 1,
+        'backtest': bt_df,
+        'positions': analyze_positions(kline_df),
+        'metrics': get_risk(ret_df),
+    }
+
+
+def _nbytes(result):
+    return sum(int(v.memory_usage(deep=True).sum()) for v in result.values() if isinstance(v, pd.DataFrame))
+
+
+class ResultCache:
+    """回测结果缓存，按最近最少使用顺序在超出 max_bytes 时淘汰
+
+    返回的结果在多次调用之间共享，使用方需要修改时请先复制。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        name = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.disk_dir, name + '.pkl')
+
+    def get(self, key):
+        """取缓存结果，内存中没有时再查磁盘，都没有时返回 None"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                return result
+        if self.disk_dir is None or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with perf.span('result_cache.load'), open(self._path(key), 'rb') as f:
+                stored_key, result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if stored_key != key:
+            return None
+        self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        self._remember(key, result)
+        if self.disk_dir is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            # 多个会话可能同时写入同一个键，各自使用独立的临时文件
+            _replace_file(self._path(key), lambda f: pickle.dump((key, result), f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _remember(self, key, result):
+        size = _nbytes(result)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = result
+            self._sizes[key] = size
+            self._nbytes += size
+            while self._nbytes > self.max_bytes and len(self._entries) > 1:
+                old_key, _ = self._entries.popitem(last=False)
+                self._nbytes -= self._sizes.pop(old_key)
+
+    def get_or_compute(self, kline_df, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05, engine='fast',
+                       source=None, t_plus=None):
+        """返回 (key, 结果, 是否命中缓存)，未命中时执行 compute_result 并写入缓存"""
+        key = result_key(kline_df, k0, bias_th, sell_days, sell_drop_th, source, t_plus)
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            perf.count('result_cache.hits')
+            return key, result, True
+        self.misses += 1
+        perf.count('result_cache.misses')
+        result = compute_result(kline_df, k0, bias_th, sell_days, sell_drop_th, engine, t_plus)
+        self.put(key, result)
+        return key, result, False
+
+    def clear(self):
+        """清空内存中的缓存结果（磁盘上的文件保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
@@ -0,0 +1,98 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .data import local_datetimes
+from .store import DEFAULT_RESULT_DIR, _replace_file, source_key
+
+BACKTEST_DTYPE = np.dtype([('ts', '<i8'), ('pos', '<f8'), ('ret', '<f8'), ('buy', '<f8'), ('sell', '<f8')])
+SIGNAL_DTYPE = np.dtype([('ts', '<i8'), ('close', '<f8'), ('position_signal', '<i8'), ('code', '<i1')])
+
+
+def _timestamps(index):
+    """本地时间的日期索引转换为时间戳，与 kline_frame 的转换互逆"""
+    return np.array([int(pd.Timestamp(d).to_pydatetime().timestamp()) for d in index], dtype=np.int64)
+
+
+class ResultStore:
+    """后台任务预计算结果的存储
+
+    每个数据源保存：拓展策略逐日结果(.backtest.npy)、仓位建议信号(.signals.npy)、
+    增量回测状态(.state.json) 和元信息(.meta.json)。界面的后台监控表只读取这些文件；
+    交互回测的日期区间和参数由用户选择，与后台任务的固定参数不同，仍在界面中计算（结果缓存见 result_cache）。
+    """
+
+    def __init__(self, root=DEFAULT_RESULT_DIR):
+        self.root = root
+
+    def path(self, url, suffix):
+        return os.path.join(self.root, source_key(url) + suffix)
+
+    def _append(self, url, suffix, rows, dtype):
+        """只追加时间戳晚于已有最后一行的记录
+
+        后台任务在追加之后、保存回测状态之前退出时，下次会重放同一批K线，已写入的行在这里跳过，不会重复。
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(url, suffix)
+        old = np.load(path) if os.path.exists(path) else np.empty(0, dtype=dtype)
+        rows = np.asarray(rows, dtype=dtype)
+        if len(old):
+            rows = rows[rows['ts'] > old['ts'][-1]]
+        if len(rows) == 0:
+            return
+        combined = np.concatenate([old, rows])
+        _replace_file(path, lambda f: np.save(f, combined))
+
+    def append_backtest(self, url, bt_df):
+        """追加拓展策略逐日结果"""
+        rows = np.empty(len(bt_df), dtype=BACKTEST_DTYPE)
+        rows['ts'] = _timestamps(bt_df.index)
+        for col in ('pos', 'ret', 'buy', 'sell'):
+            rows[col] = bt_df[col].to_numpy(dtype=float)
+        self._append(url, '.backtest.npy', rows, BACKTEST_DTYPE)
+
+    def append_signals(self, url, signal_df, codes):
+        """追加仓位建议信号"""
+        rows = np.empty(len(signal_df), dtype=SIGNAL_DTYPE)
+        rows['ts'] = _timestamps(signal_df.index)
+        rows['close'] = signal_df['close'].to_numpy(dtype=float)
+        rows['position_signal'] = signal_df['position_signal'].to_numpy()
+        rows['code'] = codes
+        self._append(url, '.signals.npy', rows, SIGNAL_DTYPE)
+
+    def reset(self, url):
+        """删除某数据源的全部预计算结果"""
+        for suffix in ('.backtest.npy', '.signals.npy', '.state.json', '.meta.json'):
+            if os.path.exists(self.path(url, suffix)):
+                os.remove(self.path(url, suffix))
+
+    def _read(self, url, suffix, dtype):
+        path = self.path(url, suffix)
+        return np.load(path) if os.path.exists(path) else np.empty(0, dtype=dtype)
+
+    def backtest(self, url):
+        """读取拓展策略逐日结果，返回与 backtest() 相同列的DataFrame"""
+        arr = self._read(url, '.backtest.npy', BACKTEST_DTYPE)
+        index = local_datetimes(arr['ts'])
+        return pd.DataFrame({col: arr[col] for col in ('pos', 'ret', 'buy', 'sell')}, index=index)
+
+    def signals(self, url):
+        """读取仓位建议信号"""
+        return self._read(url, '.signals.npy', SIGNAL_DTYPE)
+
+    def meta(self, url):
+        path = self.path(url, '.meta.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_meta(self, url, meta):
+        os.makedirs(self.root, exist_ok=True)
+        meta = dict(meta, updated_at=int(time.time()))
+        _replace_file(self.path(url, '.meta.json'),
+                      lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8')))
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from . import perf
+from .constants import METRIC_NAMES
+
+# rolling_risk 返回的滚动指标名称
+ROLLING_METRIC_NAMES = ['年化收益', '波动率', 'Sharpe', '回撤']
+# 批量计算时每批处理的列数，中间数组的内存只与 日期 × 批大小 有关
+CHUNK_COLUMNS = 256
+
+
+def get_risk(df, num=365):
+    """计算策略收益情况"""
+    table = risk_matrix(df, num)
+    return {name: table[name].tolist() for name in METRIC_NAMES}
+
+
+def _as_matrix(returns):
+    """把 DataFrame / Series / 数组统一为 (日期 × N) 的浮点矩阵，同时返回列名"""
+    if isinstance(returns, pd.DataFrame):
+        return returns.to_numpy(dtype=float), returns.columns
+    if isinstance(returns, pd.Series):
+        return returns.to_numpy(dtype=float)[:, None], pd.Index([returns.name])
+    values = np.asarray(returns, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    return values, pd.RangeIndex(values.shape[1])
+
+
+def _risk_block(x, num):
+    """x 为 (列 × 日期) 的数组，逐行计算 get_risk 的全部指标，返回 (列 × 指标) 数组
+
+    空值的处理与 pandas 一致：累乘、标准差、回撤都跳过空值，年化时的天数包含空值行；
+    最后一天收益为空时总收益率和年化收益为空。
+    """
+    n = x.shape[1]
+    mask = np.isnan(x)
+    value = np.cumprod(np.where(mask, 1.0, 1 + x), axis=1)
+    last = np.where(mask[:, -1], np.nan, value[:, -1])
+    annual_ret = last ** (num / n) - 1
+
+    # 两遍法求样本标准差，与 pandas 的 std() 相同
+    count = n - mask.sum(axis=1)
+    filled = np.where(mask, 0.0, x)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = filled.sum(axis=1) / count
+        sqr = (avg[:, None] - filled) ** 2
+        sqr[mask] = 0
+        var = sqr.sum(axis=1) / np.where(count > 1, count - 1, np.nan)
+        vol = np.sqrt(var) * np.sqrt(num)
+        sharpe = annual_ret / vol
+
+        # 回撤：空值处不参与历史高点，也不计入最大值
+        peak = np.maximum.accumulate(np.where(mask, -np.inf, value), axis=1)
+        drawdown = np.where(mask, -np.inf, 1 - value / peak)
+        max_dd = np.where(count > 0, drawdown.max(axis=1), np.nan)
+        calmar = annual_ret / max_dd
+
+    return np.column_stack([last - 1, annual_ret, vol, sharpe, max_dd, calmar])
+
+
+@perf.timed('get_risk')
+def risk_matrix(returns, num=365, chunk_size=CHUNK_COLUMNS):
+    """批量计算 (日期 × N) 收益矩阵每一列的绩效指标，返回 列 × 指标 的表，结果与 get_risk 相同
+
+    所有列在一次向量化计算中完成，不逐列循环；列数很多时按 chunk_size 分批，限制中间数组的内存。
+    """
+    values, columns = _as_matrix(returns)
+    out = np.empty((values.shape[1], len(METRIC_NAMES)))
+    if len(values):
+        for lo in range(0, values.shape[1], chunk_size):
+            out[lo:lo + chunk_size] = _risk_block(values[:, lo:lo + chunk_size].T, num)
+    else:
+        out[:] = np.nan
+    return pd.DataFrame(out, index=columns, columns=METRIC_NAMES)
+
+
+def rolling_risk(returns, window, num=365, chunk_size=CHUNK_COLUMNS):
+    """滚动窗口指标：返回 {指标: (日期 × N) 的表}，指标为年化收益、波动率、Sharpe 和回撤
+
+    每个日期取最近 window 天（不足 window 个有效收益时为空），年化方式与 get_risk 相同；
+    回撤为当日净值相对窗口内最高净值的回撤。滚动和、标准差、最大值都用 pandas 的滑动窗口增量更新，
+    不对每个窗口重新切片计算。
+    """
+    values, columns = _as_matrix(returns)
+    index = returns.index if isinstance(returns, (pd.DataFrame, pd.Series)) else None
+    pieces = {name: [] for name in ROLLING_METRIC_NAMES}
+    for lo in range(0, values.shape[1], chunk_size):
+        block = values[:, lo:lo + chunk_size]
+        mask = np.isnan(block)
+        log_growth = pd.DataFrame(np.log1p(block))
+        value = pd.DataFrame(np.where(mask, np.nan, np.cumprod(np.where(mask, 1.0, 1 + block), axis=0)))
+
+        annual_ret = np.expm1(log_growth.rolling(window).sum() * (num / window))
+        vol = pd.DataFrame(block).rolling(window).std() * np.sqrt(num)
+        drawdown = 1 - value / value.rolling(window, min_periods=1).max()
+        for name, frame in zip(ROLLING_METRIC_NAMES, (annual_ret, vol, annual_ret / vol, drawdown)):
+            pieces[name].append(frame.to_numpy())
+
+    return {
+        name: pd.DataFrame(np.hstack(arrays) if arrays else np.empty((len(values), 0)),
+                           index=index, columns=columns)
+        for name, arrays in pieces.items()
+    }
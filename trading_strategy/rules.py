@@ -0,0 +1,255 @@
+"""声明式策略
+
+策略由基于指标的规则组成，规则写成表达式字符串，例如 'ma(5) > ma(20) and close > ma(10)'。
+表达式中可以使用：
+    指标：INDICATORS 注册表中的名称，带窗口时写成调用形式，如 ma(5)、rsi(14)；close、volume、ret 直接写名称。
+          可用 register_indicator 注册新指标，安装 pandas-ta 后也可以直接使用其中的同名指标
+    参数和变量：spec['params'] 中的参数、spec['vars'] 中定义的中间变量
+    运算：+ - * / ** %、比较、and / or / not（或 & | ~）
+    函数：shift(x, n)、abs、log、exp、sqrt、maximum、minimum、where
+布林带等组合指标直接写成表达式，如 'close > ma(20) + 2 * std(20)'。
+
+编译时参数代入为常数，不含数组的部分（如止盈比例）直接算出；相同的子表达式只计算一次，
+指标数组来自指标缓存。同一份K线上的多组参数共用一份计算结果，只有依赖参数的部分重新计算。
+
+策略类型：
+    flag: hold 为持仓条件，当日满足时次日持有（5/20基本策略）
+    ledger: entry / take_profit / liquidate 为买入、止盈、清仓条件，按拓展策略的仓位账本分批建仓和卖出，
+            take_profit_ratio 为每次止盈卖出的持仓比例（5/20拓展策略）
+"""
+import ast
+import operator
+
+import numpy as np
+import pandas as pd
+
+from .backtest import expand_trades, ledger_frame, settle_flags, trade_ledger
+from .constants import FIRST_BAR
+from .indicators import INDICATOR_CACHE
+from .signals import shift
+
+# 5/20基本策略：前一日 MA5>MA20 且收盘价站上MA10 时持有
+BASIC_SPEC = {
+    'name': '5/20基本策略',
+    'type': 'flag',
+    'hold': 'ma(5) > ma(20) and close > ma(10)',
+}
+# 5/20拓展策略：与 backtest() 相同的买入、止盈、清仓条件
+EXTENDED_SPEC = {
+    'name': '5/20拓展策略',
+    'type': 'ledger',
+    'params': {'k0': 6.7, 'bias_th': 0.07, 'sell_days': 3, 'sell_drop_th': -0.05},
+    'vars': {'bias': 'close / ma(5) - 1'},
+    'entry': 'ma(5) > ma(20) and close > ma(10) and bias < bias_th',
+    'take_profit': 'bias >= bias_th',
+    'liquidate': 'close / shift(close, sell_days) - 1 < sell_drop_th and close < ma(10)',
+    'take_profit_ratio': '1 - exp(-k0 * bias_th)',
+}
+# 各策略类型需要的规则
+SPEC_RULES = {
+    'flag': ['hold'],
+    'ledger': ['entry', 'take_profit', 'liquidate', 'take_profit_ratio'],
+}
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+    ast.Mod: operator.mod,
+    ast.BitAnd: np.logical_and,
+    ast.BitOr: np.logical_or,
+}
+_UNARY_OPS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Not: np.logical_not,
+    ast.Invert: np.logical_not,
+}
+_COMPARE_OPS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+_FUNCTIONS = {
+    'abs': np.abs,
+    'log': np.log,
+    'exp': np.exp,
+    'sqrt': np.sqrt,
+    'maximum': np.maximum,
+    'minimum': np.minimum,
+    'where': np.where,
+}
+
+
+def _const(node):
+    return node[0] == 'const'
+
+
+def _apply(func, args):
+    """args 全部为常数时直接算出结果（常量折叠），否则生成运算节点"""
+    if all(_const(a) for a in args):
+        value = func(*(a[1] for a in args))
+        return ('const', value.item() if isinstance(value, np.ndarray) else value)
+    return ('op', func, *args)
+
+
+class _Compiler:
+    """把表达式编译为节点元组：('const', 值)、('ind', 指标名, 窗口)、('shift', 子节点, n)、('op', 函数, 子节点...)
+
+    节点元组可以哈希，结构相同的子表达式得到相同的节点，计算时只算一次。
+    """
+
+    def __init__(self, names):
+        self.names = names
+
+    def compile(self, text):
+        try:
+            tree = ast.parse(str(text).strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f'表达式语法错误: {text}') from e
+        return self.build(tree.body)
+
+    def build(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, bool)):
+            return ('const', node.value)
+        if isinstance(node, ast.Name):
+            if node.id in self.names:
+                return self.names[node.id]
+            return ('ind', node.id, None)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            return _apply(_BINARY_OPS[type(node.op)], [self.build(node.left), self.build(node.right)])
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return _apply(_UNARY_OPS[type(node.op)], [self.build(node.operand)])
+        if isinstance(node, ast.BoolOp):
+            func = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            result = self.build(node.values[0])
+            for value in node.values[1:]:
+                result = _apply(func, [result, self.build(value)])
+            return result
+        if isinstance(node, ast.Compare):
+            # a < b < c 按 (a < b) and (b < c) 计算
+            operands = [self.build(node.left)] + [self.build(c) for c in node.comparators]
+            result = None
+            for op, left, right in zip(node.ops, operands, operands[1:]):
+                if type(op) not in _COMPARE_OPS:
+                    break
+                pair = _apply(_COMPARE_OPS[type(op)], [left, right])
+                result = pair if result is None else _apply(np.logical_and, [result, pair])
+            else:
+                return result
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return self.call(node.func.id, [self.build(a) for a in node.args])
+        raise ValueError(f'不支持的表达式: {ast.unparse(node)}')
+
+    def call(self, name, args):
+        if name == 'shift':
+            if len(args) != 2 or not _const(args[1]) or int(args[1][1]) < 0:
+                raise ValueError('shift(x, n) 的 n 必须为非负整数常数')
+            if _const(args[0]) or int(args[1][1]) == 0:
+                return args[0]
+            return ('shift', args[0], int(args[1][1]))
+        if name in _FUNCTIONS:
+            return _apply(_FUNCTIONS[name], args)
+        # 其余名称为指标，参数为窗口
+        if len(args) > 1 or not all(_const(a) for a in args):
+            raise ValueError(f'指标 {name} 只接受一个常数窗口参数')
+        return ('ind', name, args[0][1] if args else None)
+
+
+class _Evaluator:
+    """在一份K线上计算节点，结果按节点缓存，多个规则、多组参数之间共用"""
+
+    def __init__(self, kline_df, cache):
+        self.kline_df = kline_df
+        self.cache = cache
+        self.values = {}
+
+    def __call__(self, node):
+        if _const(node):
+            return node[1]
+        value = self.values.get(node)
+        if value is None:
+            if node[0] == 'ind':
+                value = self.cache.get(self.kline_df, node[1], node[2])
+            elif node[0] == 'shift':
+                value = shift(np.asarray(self(node[1]), dtype=float), node[2])
+            else:
+                value = node[1](*(self(child) for child in node[2:]))
+            self.values[node] = value
+        return value
+
+    def array(self, node, dtype=float):
+        """计算结果为与K线等长的数组（常数结果会展开）"""
+        return np.broadcast_to(np.asarray(self(node), dtype=dtype), len(self.kline_df))
+
+
+class Strategy:
+    """编译后的声明式策略
+
+    spec 为 dict：name（名称）、type（'flag' 或 'ledger'）、params（参数默认值）、vars（中间变量）
+    以及该类型需要的规则（见 SPEC_RULES）；params 覆盖 spec 中的参数默认值。
+    """
+
+    def __init__(self, spec, params=None):
+        self.name = spec.get('name', '自定义策略')
+        self.type = spec.get('type', 'flag')
+        if self.type not in SPEC_RULES:
+            raise ValueError(f'未知策略类型: {self.type}')
+        self.params = dict(spec.get('params', {}))
+        unknown = set(params or {}) - set(self.params)
+        if unknown:
+            raise ValueError(f"未知策略参数: {', '.join(sorted(unknown))}")
+        self.params.update(params or {})
+
+        compiler = _Compiler({name: ('const', value) for name, value in self.params.items()})
+        for name, text in spec.get('vars', {}).items():
+            compiler.names[name] = compiler.compile(text)
+        missing = [rule for rule in SPEC_RULES[self.type] if rule not in spec]
+        if missing:
+            raise ValueError(f"{self.type} 策略缺少规则: {', '.join(missing)}")
+        self.rules = {rule: compiler.compile(spec[rule]) for rule in SPEC_RULES[self.type]}
+
+    def backtest(self, kline_df, t_plus=None, cache=None, evaluator=None):
+        """执行回测
+
+        flag 策略返回与K线等长的 (pos, ret) 表；ledger 策略返回与 backtest() 格式相同的逐日明细。
+        t_plus=N 时按 T+N 结算（见 settle_flags / trade_ledger）。
+        """
+        ev = evaluator or _Evaluator(kline_df, INDICATOR_CACHE if cache is None else cache)
+        ret = ev.array(('ind', 'ret', None))
+        if self.type == 'flag':
+            flag = shift(ev.array(self.rules['hold']))
+            if t_plus is not None:
+                flag = settle_flags(flag, t_plus)
+            return pd.DataFrame({'pos': flag, 'ret': ret * flag}, index=kline_df.index)
+
+        ratio = self.rules['take_profit_ratio']
+        if not _const(ratio):
+            raise ValueError('take_profit_ratio 必须由参数和常数组成')
+        trades = trade_ledger(ev.array(self.rules['entry'], bool), ev.array(self.rules['take_profit'], bool),
+                              ev.array(self.rules['liquidate'], bool), ratio[1], t_plus)
+        return ledger_frame(kline_df, *expand_trades(trades, ret))
+
+    def returns(self, kline_df, t_plus=None, cache=None, evaluator=None):
+        """与K线等长的日收益 Series，与 run_strategies 的 basic / extended 列一致"""
+        result = self.backtest(kline_df, t_plus, cache, evaluator)['ret']
+        if self.type == 'ledger':
+            full = np.full(len(kline_df), np.nan)
+            full[FIRST_BAR:] = result.to_numpy(dtype=float)
+            return pd.Series(full, index=kline_df.index, name=self.name)
+        return result.rename(self.name)
+
+
+def run_variants(kline_df, spec, variants, t_plus=None, cache=None):
+    """在同一份K线上执行一个策略的多组参数，返回 (日期 × 参数组) 的日收益表，列与 variants 顺序对应
+
+    所有参数组共用一个计算缓存：指标数组和不依赖参数的子表达式只计算一次。
+    """
+    ev = _Evaluator(kline_df, INDICATOR_CACHE if cache is None else cache)
+    columns = [Strategy(spec, params).returns(kline_df, t_plus, evaluator=ev).to_numpy() for params in variants]
+    return pd.DataFrame(np.column_stack(columns) if columns else np.empty((len(kline_df), 0)), index=kline_df.index)
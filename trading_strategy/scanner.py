@@ -0,0 +1,143 @@
+"""全市场扫描
+
+从本地K线存储读取清单中每个饰品最近的K线，在一次批量数组计算中得到所有饰品最新一根K线的
+仓位建议信号（与 analyze_positions 相同）和拓展策略的买入条件（与 backtest 相同），
+按信号强度、乖离率和成交量排序。
+
+用法：
+    python -m trading_strategy.scanner --items data/items.json --top 50
+    python -m trading_strategy.scanner --sync --output scan.csv
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import perf
+from .data import local_datetimes
+from .export import save_table
+from .fetch import KlineFetcher, sync_store
+from .indicators import INDICATOR_CACHE
+from .signals import SIGNAL_LABELS, SIGNAL_POSITIONS, signal_codes
+from .sources import DEFAULT_ITEMS_FILE, load_sources
+from .store import DEFAULT_STORE_DIR, KlineStore, day_start
+
+# 扫描读取的最近K线数：MA30 及其斜率需要31根，与后台刷新任务的 SIGNAL_LOOKBACK 相同
+SCAN_BARS = 31
+# 量比：最新成交量相对最近 VOLUME_WINDOW 根K线平均成交量的倍数
+VOLUME_WINDOW = 5
+# 扫描结果列名 -> 界面显示名称
+SCAN_LABELS = {
+    'date': '日期',
+    'close': '收盘价',
+    'change': '涨跌幅',
+    'position_signal': '建议仓位',
+    'signal_type': '信号类型',
+    'entry': '拓展策略买入',
+    'bias': '乖离率',
+    'volume': '成交量',
+    'volume_ratio': '量比',
+}
+# 默认排序：信号强度从强到弱，乖离率从低到高，成交量从大到小
+SCAN_SORT = ['position_signal', 'bias', 'volume']
+SCAN_ASCENDING = [False, True, False]
+
+
+@perf.timed('scan.load')
+def load_tails(store, urls, bars=SCAN_BARS, end_ts=None):
+    """读取每个数据源截至 end_ts 的最近 bars 根K线
+
+    返回 (ts, close, volume) 三个 (bars × 数据源) 矩阵，各数据源的最新一根K线对齐在最后一行，
+    K线不足 bars 根时上方补空值（ts 补0）。只从内存映射中取出末尾几行，不读取全部历史。
+    """
+    ts = np.zeros((bars, len(urls)), dtype=np.int64)
+    close = np.full((bars, len(urls)), np.nan)
+    volume = np.full((bars, len(urls)), np.nan)
+    for j, url in enumerate(urls):
+        arr = store.load(url)
+        hi = len(arr) if end_ts is None else int(np.searchsorted(arr['ts'], end_ts, side='right'))
+        tail = arr[max(hi - bars, 0):hi]
+        if len(tail):
+            ts[bars - len(tail):, j] = tail['ts']
+            close[bars - len(tail):, j] = tail['close']
+            volume[bars - len(tail):, j] = tail['volume']
+    return ts, close, volume
+
+
+@perf.timed('scan')
+def scan(store, sources, bias_th=0.07, end_ts=None, bars=SCAN_BARS):
+    """扫描 {名称: 接口地址} 中的全部饰品，返回按 SCAN_SORT 排序的表（索引为名称）
+
+    列：最新K线日期、收盘价、涨跌幅、建议仓位、信号类型、拓展策略买入条件、乖离率、成交量、量比。
+    与后台刷新任务相同，均线在最近 bars 根K线上计算，所有饰品在同一次矩阵计算中完成；
+    本地存储中没有K线的饰品不出现在结果中。
+    """
+    names = list(sources)
+    ts, close, volume = load_tails(store, list(sources.values()), bars, end_ts)
+    has_data = ts[-1] > 0
+
+    # 各列的滑动均值彼此独立，结果与对单个饰品调用 analyze_positions 逐位一致
+    prices = pd.DataFrame(close)
+    ma5, ma10, ma20, ma30 = (prices.rolling(w).mean().to_numpy() for w in (5, 10, 20, 30))
+    codes = signal_codes(ma5, ma10, ma20, ma30)[-1]
+
+    last = close[-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bias = last / ma5[-1] - 1
+        volume_ratio = volume[-1] / volume[-VOLUME_WINDOW:].mean(axis=0)
+    table = pd.DataFrame({
+        'date': local_datetimes(ts[-1][has_data]),
+        'close': last[has_data],
+        'change': (last / close[-2] - 1)[has_data],
+        'position_signal': SIGNAL_POSITIONS[codes[has_data]],
+        'signal_type': pd.Categorical.from_codes(codes[has_data], categories=SIGNAL_LABELS),
+        # 拓展策略的买入条件：MA5>MA20、收盘价站上MA10且乖离率低于止盈阈值
+        'entry': ((ma5[-1] > ma20[-1]) & (last > ma10[-1]) & (bias < bias_th))[has_data],
+        'bias': bias[has_data],
+        'volume': volume[-1][has_data],
+        'volume_ratio': volume_ratio[has_data],
+    }, index=pd.Index(np.array(names, dtype=object)[has_data], name='name'))
+    return table.sort_values(SCAN_SORT, ascending=SCAN_ASCENDING, kind='stable')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m trading_strategy.scanner', description='扫描全部饰品的最新仓位建议信号')
+    parser.add_argument('--items', default=DEFAULT_ITEMS_FILE,
+                        help='饰品清单 JSON 文件 {名称: 接口地址或饰品编号}，不存在时扫描内置数据源')
+    parser.add_argument('--store-dir', default=DEFAULT_STORE_DIR, help='K线存储目录')
+    parser.add_argument('--bias-th', type=float, default=0.07, help='拓展策略的止盈阈值')
+    parser.add_argument('--closed', action='store_true', help='只使用已收盘的K线（不含今天）')
+    parser.add_argument('--sync', action='store_true', help='扫描前先下载最近缺失的K线')
+    parser.add_argument('--sync-days', type=int, default=60, help='--sync 时下载的历史天数，默认 60')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时进行的HTTP请求数')
+    parser.add_argument('--top', type=int, help='只输出排名前 N 的饰品')
+    parser.add_argument('--output', help='把扫描结果写入文件，按扩展名选择 .csv、.parquet 或 .arrow')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sources = load_sources(args.items)
+    store = KlineStore(args.store_dir)
+
+    if args.sync:
+        now = int(time.time())
+        with KlineFetcher(max_concurrency=args.concurrency) as fetcher:
+            errors = sync_store(store, fetcher, list(sources.values()), now - args.sync_days * 86400, now,
+                                on_update=INDICATOR_CACHE.invalidate)
+        for url, e in errors.items():
+            print(f'获取数据出错 {url}: {e}')
+
+    table = scan(store, sources, args.bias_th, day_start() - 1 if args.closed else None)
+    if args.top is not None:
+        table = table.head(args.top)
+    if args.output:
+        save_table(table, args.output)
+    else:
+        print(f'共扫描 {len(sources)} 个饰品，{len(table)} 个有K线数据')
+        print(table.rename(columns=SCAN_LABELS).to_string(float_format=lambda x: f'{x:.4g}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from . import perf
+from .indicators import INDICATOR_CACHE
+
+# 仓位建议信号：信号代码 -> 建议仓位
+SIGNAL_NONE = 0
+SIGNAL_MA5_CROSS_MA10 = 1
+SIGNAL_MA5_CROSS_MA20 = 2
+SIGNAL_POSITIONS = np.array([0, 2, 4], dtype=np.int8)
+SIGNAL_LABELS = ['', 'MA5上穿MA10，建议买入2仓', 'MA5上穿MA20，建议买入4仓']
+
+
+def shift(values, periods=1):
+    """数组沿第一维整体后移 periods 位，前面补 NaN；二维数组按列（每列一个数据源）后移"""
+    shifted = np.full(np.shape(values), np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[:len(values) - periods]
+    return shifted
+
+
+def cross_above(fast, slow):
+    """fast 当日上穿 slow：当日 fast > slow 且前一日 fast <= slow"""
+    return (fast > slow) & (shift(fast) <= shift(slow))
+
+
+def signal_codes(ma5, ma10, ma20, ma30):
+    """计算每日信号代码，MA30 向上时 MA5上穿MA20 优先于 MA5上穿MA10
+
+    输入可以是一维数组，也可以是 (日期 × 数据源) 的二维数组。
+    """
+    ma30_trend_up = ma30 > shift(ma30)
+    return np.select(
+        [ma30_trend_up & cross_above(ma5, ma20), ma30_trend_up & cross_above(ma5, ma10)],
+        [SIGNAL_MA5_CROSS_MA20, SIGNAL_MA5_CROSS_MA10],
+        SIGNAL_NONE
+    )
+
+
+@perf.timed('analyze_positions')
+def analyze_positions(kline_df):
+    """分析MA趋势及交叉，提供仓位建议
+
+    返回新的DataFrame（不修改也不复制 kline_df）：收盘价、成交量、建议仓位（int8）、
+    信号类型（分类编码，每种描述只存一份）及用于画图的 MA5/10/20/30（float32）。
+    """
+    # 从指标缓存中取移动平均线，信号按 float64 计算
+    ma5, ma10, ma20, ma30 = INDICATOR_CACHE.get_many(kline_df, [('ma', 5), ('ma', 10), ('ma', 20), ('ma', 30)])
+    codes = signal_codes(ma5, ma10, ma20, ma30)
+
+    columns = {col: kline_df[col] for col in ('close', 'volume') if col in kline_df.columns}
+    columns['position_signal'] = SIGNAL_POSITIONS[codes]
+    columns['signal_type'] = pd.Categorical.from_codes(codes, categories=SIGNAL_LABELS)
+    # MA列只用于显示，float32 足够
+    for name, values in (('ma5', ma5), ('ma10', ma10), ('ma20', ma20), ('ma30', ma30)):
+        columns[name] = values.astype(np.float32)
+    return pd.DataFrame(columns, index=kline_df.index)
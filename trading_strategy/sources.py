@@ -0,0 +1,45 @@
+import json
+import os
+
+# 数据源库
+DATA_SOURCES = {
+    "AK47 | 血腥运动": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553370749&platform=YOUPIN&specialStyle",
+    "蝴蝶刀": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=22779&platform=YOUPIN&specialStyle",
+    "流浪者匕首op": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=553486392&platform=YOUPIN&specialStyle",
+    "树篱迷宫": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=525873303&platform=YOUPIN&specialStyle",
+    "水栽竹": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=24283&platform=YOUPIN&specialStyle",
+    "怪兽在b": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315999843394654208&platform=YOUPIN&specialStyle",
+    "金刚犬": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315844312734502912&platform=YOUPIN&specialStyle",
+    "tyloo": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=925497374167523328&platform=YOUPIN&specialStyle",
+    "克拉考": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=1315936965627445248&platform=YOUPIN&specialStyle",
+    "迈阿密人士": "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={};&type=2&maxTime={}&typeVal=808805648347430912&platform=YOUPIN&specialStyle",
+}
+
+# 饰品K线接口地址模板，typeVal 为饰品编号
+KLINE_URL_TEMPLATE = "https://sdt-api.ok-skins.com/user/steam/category/v1/kline?timestamp={{}};&type=2&maxTime={{}}&typeVal={type_val}&platform=YOUPIN&specialStyle"
+
+# 扫描用的饰品清单文件，可通过环境变量 SCAN_ITEMS_FILE 修改；文件不存在时使用 DATA_SOURCES
+DEFAULT_ITEMS_FILE = os.environ.get(
+    'SCAN_ITEMS_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'items.json')
+)
+
+
+def item_url(type_val):
+    """饰品编号对应的K线接口地址"""
+    return KLINE_URL_TEMPLATE.format(type_val=type_val)
+
+
+def load_sources(path=DEFAULT_ITEMS_FILE):
+    """从 JSON 文件读取饰品清单，返回 {名称: K线接口地址}
+
+    文件内容为 {名称: 接口地址或饰品编号}，不含 {} 占位符的值视为饰品编号（typeVal）。
+    path 为 None 或文件不存在时返回 DATA_SOURCES。
+    """
+    if path is None or not os.path.exists(path):
+        return dict(DATA_SOURCES)
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    if not isinstance(items, dict):
+        raise ValueError(f'饰品清单格式错误，应为 {{名称: 接口地址或饰品编号}}: {path}')
+    return {str(name): value if '{}' in str(value) else item_url(value) for name, value in items.items()}
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from operator import itemgetter
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 fcntl，改用 msvcrt 锁定锁文件的第一个字节
+    fcntl = None
+    import msvcrt
+
+# 本地K线存储的记录格式：时间戳(秒)、收盘价、成交量
+KLINE_DTYPE = np.dtype([('ts', '<i8'), ('close', '<f8'), ('volume', '<f8')])
+
+# 默认存储目录，可通过环境变量 KLINE_STORE_DIR 修改
+DEFAULT_STORE_DIR = os.environ.get(
+    'KLINE_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'kline')
+)
+# 后台预计算结果的默认目录，可通过环境变量 RESULT_STORE_DIR 修改（ResultStore 使用）
+DEFAULT_RESULT_DIR = os.environ.get(
+    'RESULT_STORE_DIR', os.path.join(os.path.dirname(DEFAULT_STORE_DIR), 'results')
+)
+
+
+def _replace_file(path, write):
+    """用 write(f) 写入同目录下的临时文件，再原子地替换 path
+
+    临时文件名由 mkstemp 生成、各不相同，后台任务和界面同时写入同一数据源时不会互相覆盖临时文件。
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path):
+    """在锁文件 path 上加进程间的独占锁，退出时释放
+
+    后台任务和界面会同时写入同一数据源，读取-合并-替换的整个过程都要在锁内进行，否则后写入的一方会丢掉另一方刚写入的数据。
+    """
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def day_start(ts=None):
+    """返回给定时间戳所在自然日(本地时间)的零点时间戳"""
+    t = time.localtime(time.time() if ts is None else ts)
+    return int(time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1)))
+
+
+def _merge_intervals(intervals):
+    """合并重叠或相邻的区间"""
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def source_key(url):
+    """数据源在本地文件名中使用的键"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+def rows_to_array(rows):
+    """将接口返回的K线行([时间戳, _, 收盘价, _, _, 成交量, ...])转换为结构化数组"""
+    # 按列解码，每列用 np.fromiter 直接写入，不为每一行构造元组
+    out = np.empty(len(rows), dtype=KLINE_DTYPE)
+    for name, col, conv in (('ts', 0, int), ('close', 2, float), ('volume', 5, float)):
+        out[name] = np.fromiter(map(conv, map(itemgetter(col), rows)), dtype=out.dtype[name], count=len(rows))
+    return out
+
+
+def pages_to_array(pages):
+    """把多页K线数组合并为一个数组，按总K线数一次性分配"""
+    out = np.empty(sum(len(page) for page in pages), dtype=KLINE_DTYPE)
+    pos = 0
+    for page in pages:
+        out[pos:pos + len(page)] = page
+        pos += len(page)
+    return out
+
+
+class KlineStore:
+    """按数据源持久化的K线存储
+
+    每个数据源对应一个内存映射的 NumPy 文件(.npy)，以及一个记录已下载时间区间的 .json 文件。
+    当天的K线仍在变化，因此已覆盖区间不会包含今天，下次读取时会重新拉取最新一页。
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def _paths(self, url):
+        key = source_key(url)
+        return os.path.join(self.root, key + '.npy'), os.path.join(self.root, key + '.json')
+
+    def _lock_path(self, url):
+        return os.path.join(self.root, source_key(url) + '.lock')
+
+    def _meta(self, url):
+        meta_path = self._paths(url)[1]
+        if not os.path.exists(meta_path):
+            return {'url': url, 'intervals': []}
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self, url):
+        """读取某数据源的全部K线（只读内存映射）"""
+        data_path = self._paths(url)[0]
+        if not os.path.exists(data_path):
+            return np.empty(0, dtype=KLINE_DTYPE)
+        return np.load(data_path, mmap_mode='r')
+
+    def read(self, url, start_ts=None, end_ts=None):
+        """读取 [start_ts, end_ts] 区间内的K线，按时间升序"""
+        arr = self.load(url)
+        lo = 0 if start_ts is None else np.searchsorted(arr['ts'], start_ts, side='left')
+        hi = len(arr) if end_ts is None else np.searchsorted(arr['ts'], end_ts, side='right')
+        return np.array(arr[lo:hi])
+
+    def gaps(self, url, start_ts, end_ts):
+        """返回请求区间内尚未下载的子区间列表 [(lo, hi), ...]"""
+        missing = []
+        cursor = start_ts
+        for lo, hi in self._meta(url)['intervals']:
+            if hi < cursor:
+                continue
+            if lo > end_ts:
+                break
+            if lo > cursor:
+                missing.append((cursor, lo - 1))
+            cursor = max(cursor, hi + 1)
+        if cursor <= end_ts:
+            missing.append((cursor, end_ts))
+        return missing
+
+    def write(self, url, arr, covered_lo, covered_hi):
+        """合并新下载的K线，并将 [covered_lo, covered_hi] 标记为已完整下载
+
+        与已有数据时间戳重复时以新数据为准。
+        """
+        os.makedirs(self.root, exist_ok=True)
+        data_path, meta_path = self._paths(url)
+
+        # 其他进程可能同时写入同一数据源，加锁后再读取已有数据，保证合并基于最新的文件
+        with file_lock(self._lock_path(url)):
+            combined = np.concatenate([np.asarray(arr, dtype=KLINE_DTYPE), self.load(url)])
+            _, idx = np.unique(combined['ts'], return_index=True)
+            combined = combined[idx]
+
+            meta = self._meta(url)
+            # 当天K线尚未收盘，不计入已覆盖区间
+            covered_hi = min(covered_hi, day_start() - 1)
+            if covered_lo <= covered_hi:
+                meta['intervals'] = _merge_intervals(meta['intervals'] + [[covered_lo, covered_hi]])
+            meta['updated_at'] = int(time.time())
+
+            # 先写临时文件再替换，避免读取到写了一半的文件
+            _replace_file(data_path, lambda f: np.save(f, combined))
+            _replace_file(meta_path, lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8')))
@@ -0,0 +1,237 @@
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from .backtest import ADD_LOT, ENTRY_LOT, MAX_LOTS, _ledger_sums
+from .constants import FIRST_BAR, LOCK_DAYS
+from .store import _replace_file
+
+STATE_VERSION = 1
+WITH_ENTRY, ADD_ONLY = _ledger_sums(MAX_LOTS)
+
+
+class RollingMean:
+    """滚动均值累加器
+
+    与 pandas rolling(window).mean() 的算法一致（Kahan 求和、加减分别补偿、连续相同值处理），
+    逐根K线更新得到的均线与对整段序列计算的结果逐位相同。
+    """
+
+    FIELDS = ('window', 'nobs', 'sum_x', 'neg_ct', 'comp_add', 'comp_remove', 'same_ct', 'prev_value')
+
+    def __init__(self, window):
+        self.window = window
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.neg_ct = 0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same_ct = 0
+        self.prev_value = None
+
+    def _add(self, val):
+        if val != val:
+            return
+        self.nobs += 1
+        y = val - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        if val == self.prev_value:
+            self.same_ct += 1
+        else:
+            self.same_ct = 1
+        self.prev_value = val
+
+    def _remove(self, val):
+        if val != val:
+            return
+        self.nobs -= 1
+        y = -val - self.comp_remove
+        t = self.sum_x + y
+        self.comp_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def update(self, val, dropped=None, first=False):
+        """加入新值 val，dropped 为移出窗口的值；first 表示序列的第一个值"""
+        if first or self.window == 1:
+            # 窗口不与上一个窗口重叠时从头累计
+            self.__init__(self.window)
+            self.prev_value = val
+            self.same_ct = 0
+        elif dropped is not None:
+            self._remove(dropped)
+        self._add(val)
+        return self.value
+
+    @property
+    def value(self):
+        if self.nobs < self.window or self.nobs == 0:
+            return math.nan
+        result = self.sum_x / self.nobs
+        if self.same_ct >= self.nobs:
+            return self.prev_value
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data['window'])
+        for f in cls.FIELDS:
+            setattr(obj, f, data[f])
+        return obj
+
+
+class StrategyState:
+    """拓展策略的增量回测状态
+
+    保存均线累加器、最近若干根收盘价和仓位账本，每来一根新K线调用 update() 即可在 O(1) 时间内
+    得到当日的 pos/ret/buy/sell，结果与对全部历史调用 backtest() 一致。状态可以保存到磁盘，
+    进程重启后 load() 即可继续，无需重放历史。
+    """
+
+    def __init__(self, k0=6.7, bias_th=0.07, sell_days=3, sell_drop_th=-0.05):
+        self.k0 = k0
+        self.bias_th = bias_th
+        self.sell_days = int(sell_days)
+        self.sell_drop_th = sell_drop_th
+
+        self.i = -1
+        self.last_date = None
+        self.closes = deque(maxlen=max(20, self.sell_days + 1))
+        self.mas = {w: RollingMean(w) for w in (5, 10, 20)}
+        # 仓位账本：每笔仓位的买入日序号（从早到晚），has_entry 表示最早一笔是否为0.3建仓
+        self.lots = deque()
+        self.has_entry = False
+
+    @property
+    def current_pos(self):
+        """当前持仓合计，与 sum(list(pos.values())) 逐位一致"""
+        count = len(self.lots)
+        if count == 0:
+            return 0
+        return WITH_ENTRY[count - 1] if self.has_entry else ADD_ONLY[count]
+
+    def update(self, date, close):
+        """推进一根K线，返回当日 {'date', 'pos', 'ret', 'buy', 'sell'}；前19根K线只积累指标，返回 None"""
+        if self.last_date is not None and pd.Timestamp(date) <= pd.Timestamp(self.last_date):
+            raise ValueError(f'K线日期 {date} 不晚于上一根K线 {self.last_date}')
+        close = float(close)
+        if math.isinf(close):
+            # pandas 计算滚动均值前会把 inf 视为空值
+            ma_input = math.nan
+        else:
+            ma_input = close
+        self.i += 1
+        i = self.i
+        first = i == 0
+        prev_close = self.closes[-1] if self.closes else math.nan
+
+        mas = {}
+        for w, acc in self.mas.items():
+            dropped = self.closes[-w] if len(self.closes) >= w else None
+            if dropped is not None and math.isinf(dropped):
+                dropped = math.nan
+            mas[w] = acc.update(ma_input, dropped, first)
+        drop_ref = self.closes[-self.sell_days] if 0 < self.sell_days <= len(self.closes) else close
+        self.closes.append(close)
+        self.last_date = date
+
+        if i < FIRST_BAR:
+            return None
+
+        ret = close / prev_close - 1
+        ma5, ma10, ma20 = mas[5], mas[10], mas[20]
+        bias = close / ma5 - 1
+        price_drop = close / drop_ref - 1 if i >= self.sell_days else 0
+        ma10_break = close < ma10 if i >= self.sell_days else False
+
+        current_pos = self.current_pos
+        buy = 0
+        sell = 0
+
+        if ma5 > ma20 and close > ma10 and bias < self.bias_th:
+            if not self.lots:
+                self.lots.append(i)
+                self.has_entry = True
+                buy = ENTRY_LOT
+            elif current_pos < 1:
+                self.lots.append(i)
+                buy = ADD_LOT
+        elif self.lots:
+            if i >= self.sell_days and price_drop < self.sell_drop_th and ma10_break:
+                sell = current_pos
+                self.lots.clear()
+                self.has_entry = False
+            else:
+                sell_pos = current_pos * (1 - np.exp(-self.k0 * self.bias_th)) if bias >= self.bias_th else 0
+                sold = 0
+                while self.lots and i - self.lots[0] >= LOCK_DAYS:
+                    sold = sold + (ENTRY_LOT if self.has_entry else ADD_LOT)
+                    self.has_entry = False
+                    self.lots.popleft()
+                    if sold >= sell_pos:
+                        break
+                sell = sold
+
+        pos = current_pos + buy - sell
+        return {'date': date, 'pos': pos, 'ret': pos * ret, 'buy': buy, 'sell': sell}
+
+    def replay(self, kline_df):
+        """依次推进 kline_df 中的全部K线，返回新产生的 pos/ret/buy/sell 表"""
+        rows = []
+        for date, close in zip(kline_df.index, kline_df['close'].to_numpy(dtype=float)):
+            row = self.update(date, close)
+            if row is not None:
+                rows.append(row)
+        return pd.DataFrame(rows, columns=['date', 'pos', 'ret', 'buy', 'sell']).set_index('date')
+
+    def to_dict(self):
+        return {
+            'version': STATE_VERSION,
+            'params': {'k0': self.k0, 'bias_th': self.bias_th, 'sell_days': self.sell_days,
+                       'sell_drop_th': self.sell_drop_th},
+            'i': self.i,
+            'last_date': None if self.last_date is None else pd.Timestamp(self.last_date).isoformat(),
+            'closes': list(self.closes),
+            'mas': [acc.to_dict() for acc in self.mas.values()],
+            'lots': list(self.lots),
+            'has_entry': self.has_entry,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != STATE_VERSION:
+            raise ValueError(f"不支持的状态版本: {data.get('version')}")
+        state = cls(**data['params'])
+        state.i = data['i']
+        state.last_date = None if data['last_date'] is None else pd.Timestamp(data['last_date'])
+        state.closes.extend(data['closes'])
+        state.mas = {d['window']: RollingMean.from_dict(d) for d in data['mas']}
+        state.lots = deque(data['lots'])
+        state.has_entry = data['has_entry']
+        return state
+
+    def save(self, path):
+        """保存状态到 JSON 文件（先写临时文件再替换）"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        _replace_file(path, lambda f: f.write(json.dumps(self.to_dict()).encode('utf-8')))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
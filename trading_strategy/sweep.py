@@ -0,0 +1,101 @@
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .backtest import run_ledger, strategy_arrays
+from .constants import FIRST_BAR, METRIC_NAMES, PARAM_NAMES
+from .risk import risk_matrix
+
+# 工作进程中挂载的共享内存数组
+_worker_state = {}
+
+
+def param_grid(k0_values, bias_th_values, sell_days_values, sell_drop_th_values):
+    """四个参数取值的笛卡尔积"""
+    return list(itertools.product(k0_values, bias_th_values, [int(d) for d in sell_days_values],
+                                  sell_drop_th_values))
+
+
+def evaluate(arrays, k0, bias_th, sell_days, sell_drop_th):
+    """对一组参数执行拓展策略回测，返回绩效指标"""
+    ret_arr = run_ledger(*arrays, k0, bias_th, sell_days, sell_drop_th)[1]
+    # 与界面上 ret_df 的拓展策略列一致：前 FIRST_BAR 根K线收益为空
+    extended = np.full(len(arrays[0]), np.nan)
+    extended[FIRST_BAR:] = ret_arr
+    row = dict(zip(PARAM_NAMES, (k0, bias_th, sell_days, sell_drop_th)))
+    row.update(risk_matrix(extended).iloc[0].to_dict())
+    return row
+
+
+def _init_worker(shm_name, shape):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    arrays.flags.writeable = False
+    _worker_state['shm'] = shm
+    _worker_state['arrays'] = tuple(arrays)
+
+
+def _run_chunk(combos):
+    arrays = _worker_state['arrays']
+    return [evaluate(arrays, *combo) for combo in combos]
+
+
+def run_sweep(kline_df, grid, max_workers=None, chunk_size=None, progress=None, cancel=None):
+    """在进程池上对参数网格执行拓展策略回测
+
+    K线及均线数组只计算一次，放入共享内存供各工作进程只读访问，任务只传递参数组合。
+
+    参数：
+        grid: param_grid 返回的参数组合列表
+        max_workers: 进程数，默认为CPU核数；为1时在当前进程内执行
+        progress: 回调 progress(已完成数, 总数)
+        cancel: threading.Event 等带 is_set() 的对象，置位后取消未开始的任务并立即返回，不等待正在执行的任务
+
+    返回每组参数一行的绩效指标表；被取消时只包含已完成的组合。
+    """
+    arrays = np.ascontiguousarray(np.vstack(strategy_arrays(kline_df)))
+    total = len(grid)
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, min(64, total // (max_workers * 4) or 1))
+    chunks = [grid[i:i + chunk_size] for i in range(0, total, chunk_size)]
+    rows = []
+
+    if max_workers == 1:
+        for chunk in chunks:
+            if cancel is not None and cancel.is_set():
+                break
+            rows += [evaluate(tuple(arrays), *combo) for combo in chunk]
+            if progress:
+                progress(len(rows), total)
+        return _result_table(rows)
+
+    shm = shared_memory.SharedMemory(create=True, size=arrays.nbytes)
+    try:
+        np.ndarray(arrays.shape, dtype=np.float64, buffer=shm.buf)[:] = arrays
+        pool = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(shm.name, arrays.shape))
+        pending = {pool.submit(_run_chunk, chunk) for chunk in chunks}
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows += future.result()
+                if done and progress:
+                    progress(len(rows), total)
+                if cancel is not None and cancel.is_set():
+                    break
+        finally:
+            # 取消或出错（包括界面重跑中断）时丢弃尚未开始的任务，也不等待正在执行的任务完成
+            pool.shutdown(wait=not pending, cancel_futures=bool(pending))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return _result_table(rows)
+
+
+def _result_table(rows):
+    return pd.DataFrame(rows, columns=PARAM_NAMES + METRIC_NAMES).sort_values(PARAM_NAMES, ignore_index=True)
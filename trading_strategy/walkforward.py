@@ -0,0 +1,167 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .backtest import expand_trades, ledger_signals, strategy_arrays, trade_ledger
+from .constants import FIRST_BAR, METRIC_NAMES, PARAM_NAMES
+from .risk import get_risk, risk_matrix
+from .sweep import _init_worker, _worker_state
+
+# 越小越好的指标
+MINIMIZE_METRICS = {'波动率', '最大回撤'}
+
+
+def make_windows(n, train_bars, test_bars, step=None):
+    """把 n 根K线切分为滚动的训练/测试窗口，返回 [(训练起点, 测试起点, 测试终点), ...]（终点不含）
+
+    每个窗口向后滚动 step 根K线（默认等于 test_bars，测试区间首尾相接）；最后一个测试窗口可以不足 test_bars。
+    """
+    if train_bars <= FIRST_BAR:
+        raise ValueError(f'训练窗口至少需要 {FIRST_BAR + 1} 根K线')
+    if test_bars < 1:
+        raise ValueError('测试窗口至少需要1根K线')
+    step = step or test_bars
+    if step < test_bars:
+        raise ValueError('滚动步长不能小于测试窗口，否则测试区间会重叠')
+    windows = []
+    start = 0
+    while start + train_bars < n:
+        windows.append((start, start + train_bars, min(start + train_bars + test_bars, n)))
+        start += step
+    return windows
+
+
+def window_returns(arrays, start, end, k0, bias_th, sell_days, sell_drop_th):
+    """在 [start, end) 上从空仓开始执行拓展策略，返回该区间的日收益
+
+    均线取自全部历史，区间之前的 FIRST_BAR 根K线只用于对齐账本的起点，不产生交易；
+    区间从第一根K线开始时，前 FIRST_BAR 根K线没有均线，收益为空，与整段回测一致。
+    清仓条件比较 sell_days 天前的收盘价，信号在多取 sell_days 根历史的区间上计算，
+    sell_days 大于 FIRST_BAR 时区间开头的清仓判断也与整段回测一致。
+    """
+    lo = max(start - FIRST_BAR, 0)
+    look = max(lo - int(sell_days), 0)
+    close, ret, ma5, ma10, ma20 = (a[look:end] for a in arrays)
+    signals = ledger_signals(close, ma5, ma10, ma20, bias_th, sell_days, sell_drop_th)
+    trades = trade_ledger(*(s[lo - look:] for s in signals), 1 - np.exp(-k0 * bias_th))
+    ret_arr = expand_trades(trades, ret[lo - look:])[1]
+    out = np.full(end - start, np.nan)
+    out[len(out) - len(ret_arr):] = ret_arr
+    return out
+
+
+def optimize_window(arrays, start, end, grid, objective='Sharpe'):
+    """在 [start, end) 上评估全部参数组合，返回 (最优参数组合, 最优指标值)
+
+    所有组合的日收益放在同一张表中，一次 risk_matrix 算出全部指标。
+    """
+    rets = np.column_stack([window_returns(arrays, start, end, *combo) for combo in grid])
+    score = risk_matrix(rets)[objective].to_numpy()
+    key = -score if objective in MINIMIZE_METRICS else score
+    best = int(np.argmax(np.where(np.isnan(key), -np.inf, key)))
+    return grid[best], float(score[best])
+
+
+def run_window(arrays, window, grid, objective='Sharpe'):
+    """训练窗口上选参数，在随后的测试窗口上检验"""
+    train_start, test_start, test_end = window
+    params, train_score = optimize_window(arrays, train_start, test_start, grid, objective)
+    test_ret = window_returns(arrays, test_start, test_end, *params)
+    return window, params, train_score, test_ret
+
+
+def _run_window_task(window, grid, objective):
+    return run_window(_worker_state['arrays'], window, grid, objective)
+
+
+def walk_forward(kline_df, grid, train_bars, test_bars, step=None, objective='Sharpe',
+                 max_workers=None, progress=None, cancel=None):
+    """滚动优化（walk-forward）：在每个训练窗口上选出最优参数，在随后的测试窗口上检验
+
+    K线及均线数组只计算一次（取自指标缓存），放入共享内存供各工作进程只读访问；各窗口互相独立，并行执行。
+    每个测试窗口都从空仓开始。
+
+    参数：
+        grid: param_grid 返回的参数组合列表
+        train_bars / test_bars / step: 训练窗口、测试窗口的K线数及每次滚动的K线数
+        objective: 训练窗口上选参数所用的 get_risk 指标
+        max_workers: 进程数，默认为CPU核数；为1时在当前进程内执行
+        progress: 回调 progress(已完成窗口数, 总窗口数)
+        cancel: threading.Event 等带 is_set() 的对象，置位后丢弃未开始的窗口并立即返回，不等待正在执行的窗口
+
+    返回 dict：
+        windows: 每个窗口的起止日期、最优参数、训练指标及测试窗口的绩效指标
+        returns: 拼接后的样本外日收益（benchmark 与 extended 两列）
+        metrics: 样本外日收益的 get_risk 指标
+    """
+    if objective not in METRIC_NAMES:
+        raise ValueError(f'未知指标: {objective}')
+    if not grid:
+        raise ValueError('参数组合不能为空')
+    arrays = np.ascontiguousarray(np.vstack(strategy_arrays(kline_df)))
+    windows = make_windows(arrays.shape[1], train_bars, test_bars, step)
+    if not windows:
+        raise ValueError(f'K线数据不足：共 {arrays.shape[1]} 根，训练窗口需要 {train_bars} 根以上')
+    max_workers = max_workers or os.cpu_count() or 1
+    results = []
+
+    if max_workers == 1:
+        for window in windows:
+            if cancel is not None and cancel.is_set():
+                break
+            results.append(run_window(tuple(arrays), window, grid, objective))
+            if progress:
+                progress(len(results), len(windows))
+        return _assemble(kline_df, arrays, results, objective)
+
+    shm = shared_memory.SharedMemory(create=True, size=arrays.nbytes)
+    try:
+        np.ndarray(arrays.shape, dtype=np.float64, buffer=shm.buf)[:] = arrays
+        pool = ProcessPoolExecutor(min(max_workers, len(windows)), initializer=_init_worker,
+                                   initargs=(shm.name, arrays.shape))
+        pending = {pool.submit(_run_window_task, window, grid, objective) for window in windows}
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                results += [future.result() for future in done]
+                if done and progress:
+                    progress(len(results), len(windows))
+                if cancel is not None and cancel.is_set():
+                    break
+        finally:
+            # 取消或出错（包括界面重跑中断）时丢弃尚未开始的窗口，也不等待正在执行的窗口完成
+            pool.shutdown(wait=not pending, cancel_futures=bool(pending))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return _assemble(kline_df, arrays, results, objective)
+
+
+def _assemble(kline_df, arrays, results, objective):
+    """按时间顺序拼接各测试窗口的收益，整理窗口明细"""
+    results = sorted(results, key=lambda r: r[0])
+    index = kline_df.index
+    rows = []
+    pieces = []
+    for (train_start, test_start, test_end), params, train_score, test_ret in results:
+        test_index = index[test_start:test_end]
+        test_metrics = risk_matrix(test_ret).iloc[0]
+        row = {'训练开始': index[train_start], '训练结束': index[test_start - 1],
+               '测试开始': index[test_start], '测试结束': index[test_end - 1]}
+        row.update(dict(zip(PARAM_NAMES, params)))
+        row[f'训练{objective}'] = train_score
+        row.update({f'测试{name}': value for name, value in test_metrics.items()})
+        rows.append(row)
+        pieces.append(pd.DataFrame({'benchmark': arrays[1][test_start:test_end], 'extended': test_ret},
+                                   index=test_index))
+
+    returns = pd.concat(pieces) if pieces else pd.DataFrame(columns=['benchmark', 'extended'], dtype=float)
+    return {
+        'windows': pd.DataFrame(rows),
+        'returns': returns,
+        'metrics': get_risk(returns) if len(returns) else None,
+    }
@@ -0,0 +1,231 @@
+"""后台刷新任务
+
+按计划刷新全部数据源的K线，增量推进拓展策略回测、检测仓位建议信号，并把结果写入本地结果存储，
+界面的后台监控表直接读取预计算结果。新出现的 MA5上穿MA20 / MA5上穿MA10 信号会推送到文件或本地 webhook，
+webhook 推送失败的信号保存下来，下一轮刷新时重新推送。
+
+用法：
+    python -m trading_strategy.worker --interval 3600 --signal-file data/signals.jsonl
+    python -m trading_strategy.worker --once --webhook http://127.0.0.1:9000/signals
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+import requests
+
+from .data import load_kline
+from .fetch import KlineFetcher, sync_store
+from .indicators import INDICATOR_CACHE
+from .results import DEFAULT_RESULT_DIR, ResultStore
+from .signals import analyze_positions
+from .sources import DATA_SOURCES
+from .store import DEFAULT_STORE_DIR, KlineStore, _replace_file, day_start
+from .streaming import StrategyState
+
+logger = logging.getLogger(__name__)
+
+# 计算MA30斜率及交叉信号所需的历史K线数
+SIGNAL_LOOKBACK = 31
+
+
+class FileSink:
+    """把信号以 JSON Lines 格式追加到文件"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, events):
+        if not events:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+
+class WebhookSink:
+    """把信号以 JSON 形式 POST 到 webhook
+
+    失败时按指数退避重试，仍然失败的信号保存在 pending（指定 pending_path 时同时写入该文件），
+    下一次 send 时与新信号一起重新推送，进程重启（例如 cron 方式的 --once）后也不会丢失。
+    """
+
+    def __init__(self, url, timeout=10, retries=3, backoff=1.0, pending_path=None):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pending_path = pending_path
+        self.pending = []
+        if pending_path and os.path.exists(pending_path):
+            with open(pending_path, encoding='utf-8') as f:
+                self.pending = json.load(f)
+
+    def _save_pending(self, events):
+        self.pending = events
+        if not self.pending_path:
+            return
+        if events:
+            os.makedirs(os.path.dirname(os.path.abspath(self.pending_path)), exist_ok=True)
+            _replace_file(self.pending_path, lambda f: f.write(json.dumps(events, ensure_ascii=False).encode('utf-8')))
+        elif os.path.exists(self.pending_path):
+            os.remove(self.pending_path)
+
+    def send(self, events):
+        events = self.pending + list(events)
+        if not events:
+            return
+        for attempt in range(self.retries + 1):
+            try:
+                response = requests.post(self.url, json={'signals': events}, timeout=self.timeout)
+                response.raise_for_status()
+                break
+            except requests.RequestException:
+                if attempt == self.retries:
+                    self._save_pending(events)
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+        self._save_pending([])
+
+
+def process_source(name, url, kline_store, result_store, params, start_ts=0):
+    """对一个数据源增量更新回测结果和仓位建议信号，返回新产生的信号列表
+
+    只处理已收盘的K线；策略参数变化时丢弃旧状态，从 start_ts 起重新计算，重新计算出的历史信号不推送。
+    """
+    kline_df = load_kline(kline_store, url, start_ts, day_start() - 1)
+    if kline_df.empty:
+        return []
+
+    meta = result_store.meta(url)
+    state_path = result_store.path(url, '.state.json')
+    if meta is None or meta.get('params') != params or not os.path.exists(state_path):
+        result_store.reset(url)
+        state = StrategyState(**params)
+        rebuilt = True
+    else:
+        state = StrategyState.load(state_path)
+        rebuilt = False
+
+    new_bars = len(kline_df) if state.last_date is None else int((kline_df.index > state.last_date).sum())
+    if new_bars == 0:
+        return []
+
+    # 拓展策略：只推进新K线。结果先于状态写入，中途退出时下次从旧状态重放同一批K线，
+    # 已写入的行由 ResultStore 按时间戳跳过
+    bt_df = state.replay(kline_df.iloc[-new_bars:])
+    result_store.append_backtest(url, bt_df)
+
+    # 仓位建议信号：只在新K线及其所需的历史窗口上计算
+    tail_df = kline_df.iloc[-(new_bars + SIGNAL_LOOKBACK):]
+    position_df = analyze_positions(tail_df).iloc[-new_bars:]
+    signal_df = position_df[position_df['position_signal'] > 0]
+    result_store.append_signals(url, signal_df, signal_df['signal_type'].cat.codes.to_numpy())
+
+    state.save(state_path)
+    last_pos = float(bt_df['pos'].iloc[-1]) if len(bt_df) else 0.0
+    result_store.write_meta(url, {
+        'name': name,
+        'url': url,
+        'params': params,
+        'last_bar': state.last_date.isoformat(),
+        'pos': last_pos,
+    })
+
+    if rebuilt:
+        return []
+    return [
+        {
+            'source': name,
+            'date': date.strftime('%Y-%m-%d'),
+            'close': float(row['close']),
+            'position_signal': int(row['position_signal']),
+            'signal_type': str(row['signal_type']),
+        }
+        for date, row in signal_df.iterrows()
+    ]
+
+
+def run_cycle(sources, kline_store, result_store, fetcher, params, history_days=None, sinks=()):
+    """执行一轮刷新：下载缺失K线、更新每个数据源的结果并推送新信号"""
+    now = int(time.time())
+    start_ts = 0 if history_days is None else now - int(history_days) * 86400
+    errors = sync_store(kline_store, fetcher, list(sources.values()), start_ts, now,
+                        on_update=INDICATOR_CACHE.invalidate)
+    for url, e in errors.items():
+        logger.warning('刷新K线失败 %s: %s', url, e)
+
+    events = []
+    for name, url in sources.items():
+        try:
+            events += process_source(name, url, kline_store, result_store, params, start_ts)
+        except Exception:
+            logger.exception('更新 %s 的回测结果失败', name)
+
+    for sink in sinks:
+        try:
+            sink.send(events)
+        except Exception:
+            logger.exception('推送信号失败: %s', sink)
+    logger.info('本轮刷新完成：%d 个数据源，%d 个新信号', len(sources), len(events))
+    return events
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m trading_strategy.worker', description='后台刷新K线并推送仓位建议信号')
+    parser.add_argument('--interval', type=float, default=3600, help='刷新间隔（秒），默认 3600')
+    parser.add_argument('--once', action='store_true', help='只执行一轮后退出（适合 cron）')
+    parser.add_argument('--sources', nargs='*', help='只刷新指定名称的数据源，默认全部')
+    parser.add_argument('--history-days', type=int, default=365, help='回测使用的历史天数，默认 365')
+    parser.add_argument('--k0', type=float, default=6.7)
+    parser.add_argument('--bias-th', type=float, default=0.07)
+    parser.add_argument('--sell-days', type=int, default=3)
+    parser.add_argument('--sell-drop-th', type=float, default=-0.05)
+    parser.add_argument('--store-dir', default=DEFAULT_STORE_DIR, help='K线存储目录')
+    parser.add_argument('--result-dir', default=DEFAULT_RESULT_DIR, help='预计算结果目录')
+    parser.add_argument('--signal-file', help='把新信号追加写入该 JSON Lines 文件')
+    parser.add_argument('--webhook', help='把新信号 POST 到该地址')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时进行的HTTP请求数')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    sources = DATA_SOURCES
+    if args.sources:
+        unknown = set(args.sources) - set(DATA_SOURCES)
+        if unknown:
+            raise SystemExit(f"未知数据源: {', '.join(sorted(unknown))}")
+        sources = {name: DATA_SOURCES[name] for name in args.sources}
+
+    params = {'k0': args.k0, 'bias_th': args.bias_th, 'sell_days': args.sell_days,
+              'sell_drop_th': args.sell_drop_th}
+    sinks = []
+    if args.signal_file:
+        sinks.append(FileSink(args.signal_file))
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook, pending_path=os.path.join(args.result_dir, 'webhook_pending.json')))
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    with KlineFetcher(max_concurrency=args.concurrency) as fetcher:
+        kline_store = KlineStore(args.store_dir)
+        result_store = ResultStore(args.result_dir)
+        while not stop.is_set():
+            run_cycle(sources, kline_store, result_store, fetcher, params, args.history_days, sinks)
+            if args.once:
+                break
+            stop.wait(args.interval)
+
+
+if __name__ == '__main__':
+    main()